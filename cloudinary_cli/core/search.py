@@ -147,27 +147,57 @@ def handle_auto_pagination(res, expression, force, fields_to_keep, result_field=
     if 'next_cursor' not in res:
         return res
 
-    if not force:
-        if not confirm_action(
-                f"{res['total_count']} total results. "
-                f"{res.rate_limit_remaining + 1} Admin API rate limit remaining.\n"
-                f"Running this query will use {res['total_count'] // DEFAULT_MAX_RESULTS + 1} Admin API calls. "
-                f"Continue? (y/N)"):
-            logger.info("Stopping. Please run again without -A.")
-
-            return res
-        else:
-            logger.info("Continuing. You may use the -F flag to force auto_pagination.")
+    if not confirm_auto_pagination(res, force):
+        logger.info("Stopping. Please run again without -A.")
+
+        return res
 
     all_results = res
+    for page in iter_next_pages(res, expression, fields_to_keep, result_field):
+        all_results[result_field] += page[result_field]
+        all_results['time'] += page['time']
+
+    all_results.pop('next_cursor', None)  # it is empty by now
+
+    return all_results
+
+
+def confirm_auto_pagination(res, force):
+    """
+    Asks the user to confirm fetching all the pages of the results, unless forced.
+
+    :param res: The first page of the results.
+    :param force: Whether to skip the confirmation.
+    :return: True when confirmed.
+    """
+    if force:
+        return True
+
+    if not confirm_action(
+            f"{res['total_count']} total results. "
+            f"{res.rate_limit_remaining + 1} Admin API rate limit remaining.\n"
+            f"Running this query will use {res['total_count'] // DEFAULT_MAX_RESULTS + 1} Admin API calls. "
+            f"Continue? (y/N)"):
+        return False
+
+    logger.info("Continuing. You may use the -F flag to force auto_pagination.")
+
+    return True
+
+
+def iter_next_pages(res, expression, fields_to_keep, result_field='resources'):
+    """
+    Fetches the pages of the results following the given one, lazily, one page at a time.
+
+    :param res: The current page of the results.
+    :param expression: The search expression.
+    :param fields_to_keep: The fields to keep in the results.
+    :param result_field: The field of the results in the response.
+    :return: generator of the next pages.
+    """
     while 'next_cursor' in res.keys():
         expression.next_cursor(res['next_cursor'])
 
         res = execute_single_request(expression, fields_to_keep, result_field)
 
-        all_results[result_field] += res[result_field]
-        all_results['time'] += res['time']
-
-    all_results.pop('next_cursor', None)  # it is empty by now
-
-    return all_results
+        yield res
@@ -119,6 +119,15 @@ OAUTH_CALLBACK_TIMEOUT_SECONDS = 300
 OAUTH_EXPIRY_SKEW_SECONDS = 30
 OAUTH_HTTP_TIMEOUT_SECONDS = 30
 
+# Timeouts of plain HTTP requests (downloads, delivery URL probes). The read timeout applies between bytes received.
+HTTP_CONNECT_TIMEOUT_SECONDS = 10
+HTTP_READ_TIMEOUT_SECONDS = 60
+
+# Requests failing with a transient error are retried up to this number of attempts, as long as the retries do not
+# exceed this share of the requests of the run (see RetryPolicy).
+RETRY_MAX_ATTEMPTS = int(os.environ.get('CLOUDINARY_RETRY_MAX_ATTEMPTS', 4))
+RETRY_BUDGET_RATIO = float(os.environ.get('CLOUDINARY_RETRY_BUDGET_RATIO', 0.1))
+
 TEMPLATE_FOLDER_NAME = 'templates'
 CLOUDINARY_CLI_ROOT = dirname(__file__)
 TEMPLATE_FOLDER = path_join(CLOUDINARY_CLI_ROOT, TEMPLATE_FOLDER_NAME)
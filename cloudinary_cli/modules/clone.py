@@ -1,17 +1,25 @@
 from click import command, option, style, argument
+from cloudinary_cli.utils.concurrency_utils import CONCURRENCY, max_workers, report_task_size
 from cloudinary_cli.utils.utils import normalize_list_params, print_help_and_exit
 import cloudinary
 from cloudinary.auth_token import _digest
 from cloudinary_cli.utils.utils import run_tasks_concurrently
-from cloudinary_cli.utils.api_utils import upload_file
+from cloudinary_cli.utils.api_utils import upload_file, iter_cld_assets_by_etags
+from cloudinary_cli.utils.http_utils import configure_sdk_pool
 from cloudinary_cli.utils.config_resolver import get_cloudinary_config, config_to_api_kwargs
 from cloudinary_cli.defaults import logger
-from cloudinary_cli.core.search import execute_single_request, handle_auto_pagination
+from cloudinary_cli.utils.journal_utils import Journal
+from cloudinary_cli.core.search import execute_single_request, confirm_auto_pagination, iter_next_pages
+from collections import Counter
+from functools import partial
+import itertools
 import time
 import re
 
 DEFAULT_MAX_RESULTS = 500
 ALLOWED_TYPE_VALUES = ("upload", "private", "authenticated")
+# The checkpoint of the copied assets, in the current directory, removed once the clone succeeds.
+_CLONE_JOURNAL_FILE = ".cld-clone-journal-{source}-{target}"
 
 
 @command("clone",
@@ -32,13 +40,19 @@ Example 2 (Copy all assets with a specific tag via a search expression using a s
         help="Skip confirmation.")
 @option("-ow", "--overwrite", is_flag=True, default=False,
         help="Specify whether to overwrite existing assets.")
-@option("-w", "--concurrent_workers", type=int, default=30,
-        help="Specify the number of concurrent network threads.")
+@option("-w", "--concurrent_workers", type=CONCURRENCY, default=30,
+        help="Specify the number of concurrent network threads, "
+             "or 'auto' to adapt it to the observed latency, errors and rate limits.")
 @option("-fi", "--fields", multiple=True,
         help=("Specify whether to copy tags and/or context. "
               "Valid options: `tags,context`."))
 @option("-se", "--search_exp", default="",
         help="Define a search expression to filter the assets to clone.")
+@option("--resume", is_flag=True,
+        help="Resume an interrupted clone: assets copied by the previous run (and not modified since) are skipped.")
+@option("--skip-existing", is_flag=True,
+        help="Skip assets that already exist in the target product environment with the same public ID and content. "
+             "The target is looked up with a Search API call per 100 assets.")
 @option("--async", "async_", is_flag=True, default=False,
         help="Clone the assets asynchronously.")
 @option("-nu", "--notification_url",
@@ -50,28 +64,52 @@ Example 2 (Copy all assets with a specific tag via a search expression using a s
               "a private download URL is generated which may incur additional "
               "bandwidth costs."))
 def clone(target, force, overwrite, concurrent_workers, fields,
-          search_exp, async_, notification_url, url_expiry):
+          search_exp, resume, skip_existing, async_, notification_url, url_expiry):
     target_config, auth_token = _validate_clone_inputs(target)
     if not target_config:
         return False
 
-    source_assets = search_assets(search_exp, force)
-    if not source_assets:
+    search_res = search_assets(search_exp, force)
+    if not search_res:
         return False
-    if not isinstance(source_assets, dict) or not source_assets.get('resources'):
+
+    asset_count, source_pages = search_res
+    if not asset_count:
         logger.error(style(f"No asset(s) found in {cloudinary.config().cloud_name}", fg="red"))
         return False
 
-    upload_list = _prepare_upload_list(
-        source_assets, target_config, overwrite, async_,
-        notification_url, auth_token, url_expiry, fields
-    )
-
-    logger.info(style(f"Copying {len(upload_list)} asset(s) from "
+    logger.info(style(f"Copying {asset_count} asset(s) from "
                       f"{cloudinary.config().cloud_name} to "
                       f"{target_config.cloud_name}", fg="blue"))
 
-    run_tasks_concurrently(upload_file, upload_list, concurrent_workers)
+    source_cloud_name = cloudinary.config().cloud_name
+    journal = Journal(_CLONE_JOURNAL_FILE.format(source=source_cloud_name, target=target_config.cloud_name),
+                      {"source": source_cloud_name, "target": target_config.cloud_name, "search_exp": search_exp})
+    copied_assets = _replay_journal(journal) if resume else {}
+    skipped = Counter()
+    failed = {}
+
+    # The pages of the search are fetched while the assets of the previous pages are being copied.
+    source_pages = _iter_pages_to_copy(source_pages, copied_assets, skip_existing, target_config, skipped)
+    upload_tasks = _iter_upload_tasks(
+        source_pages, target_config, overwrite, async_,
+        notification_url, auth_token, url_expiry, fields, failed, journal
+    )
+
+    configure_sdk_pool(max_workers(concurrent_workers))
+    completed = False
+    journal.open(append=resume)
+    try:
+        run_tasks_concurrently(_copy_asset, upload_tasks, concurrent_workers)
+        completed = not failed
+    finally:
+        journal.close(remove=completed)
+
+    if skipped["copied"]:
+        logger.info(style(f"{skipped['copied']} asset(s) skipped, they were copied by the previous run", fg="blue"))
+    if skipped["existing"]:
+        logger.info(style(f"{skipped['existing']} asset(s) skipped, they already exist in "
+                          f"{target_config.cloud_name}", fg="blue"))
 
     return True
 
@@ -120,20 +158,123 @@ def _prepare_upload_list(source_assets, target_config, overwrite, async_,
     return upload_list
 
 
+def _iter_upload_tasks(source_pages, target_config, overwrite, async_,
+                       notification_url, auth_token, url_expiry, fields, failed, journal):
+    for source_assets in source_pages:
+        upload_list = _prepare_upload_list(source_assets, target_config, overwrite, async_,
+                                           notification_url, auth_token, url_expiry, fields)
+        for asset, (asset_url, options) in zip(source_assets['resources'], upload_list):
+            yield asset.get('bytes'), asset_url, options, None, failed, partial(_record_copied_asset, journal, asset)
+
+
+def _copy_asset(asset_size, asset_url, options, uploaded, failed, on_success):
+    if asset_size:
+        report_task_size(asset_size)
+    upload_file(asset_url, options, uploaded, failed, on_success)
+
+
+def _iter_pages_to_copy(source_pages, copied_assets, skip_existing, target_config, skipped):
+    """
+    Drops the assets copied by the interrupted clone, and the assets that already exist in the target, from the pages.
+
+    :param source_pages:    iterable of the pages of the source assets.
+    :param copied_assets:   dict of the assets copied by the interrupted clone to their etags.
+    :param skip_existing:   Whether to drop the assets that already exist in the target.
+    :param target_config:   The config of the target product environment.
+    :param skipped:         Counter of the dropped assets, by reason.
+    :return: generator of the pages.
+    """
+    for source_assets in source_pages:
+        resources = source_assets['resources']
+        if copied_assets:
+            resources = [r for r in resources if copied_assets.get(_asset_key(r)) != r.get('etag')]
+            skipped["copied"] += len(source_assets['resources']) - len(resources)
+
+        if skip_existing and resources:
+            existing_assets = _query_existing_assets(resources, target_config)
+            not_existing = [r for r in resources if (_asset_key(r), r.get('etag')) not in existing_assets]
+            skipped["existing"] += len(resources) - len(not_existing)
+            resources = not_existing
+
+        yield {**source_assets, 'resources': resources}
+
+
+def _query_existing_assets(resources, target_config):
+    """
+    Looks up the target assets having the content of the source assets.
+
+    Assets are looked up by etag rather than by public ID, which would need escaping in the search expression.
+
+    :param resources:       list of the source assets.
+    :param target_config:   The config of the target product environment.
+    :return: set of (asset key, etag) of the target assets.
+    """
+    etags = {r['etag'] for r in resources if r.get('etag')}
+    if not etags:
+        return set()
+
+    return {(_asset_key(asset), asset['etag'])
+            for asset in iter_cld_assets_by_etags(etags, **config_to_api_kwargs(target_config))}
+
+
+def _asset_key(asset):
+    return f"{asset.get('resource_type')}/{asset.get('type')}/{asset.get('public_id')}"
+
+
+def _replay_journal(journal):
+    """
+    Replays the journal of the interrupted clone.
+
+    :param journal: The journal.
+    :return: dict of the copied assets to their etags.
+    """
+    copied_assets = {entry["asset"]: entry["etag"] for entry in journal.replay()}
+    if copied_assets:
+        logger.info(f"Resuming interrupted clone, {len(copied_assets)} asset(s) were already copied")
+
+    return copied_assets
+
+
+def _record_copied_asset(journal, asset, _, result):
+    if "batch_id" in result:
+        return  # an asynchronous upload is not known to succeed
+
+    journal.record({"asset": _asset_key(asset), "etag": asset.get('etag')})
+
+
 def search_assets(search_exp, force):
+    """
+    Searches the assets to clone.
+
+    Only the first page of the results is fetched right away, the next pages are fetched while iterating over the
+    pages, so the assets of a page can be copied before the search is over, and the assets are not all held in memory.
+
+    :param search_exp: The search expression.
+    :param force: Whether to skip the confirmation of the auto pagination.
+    :return: The number of assets found and an iterator over the pages of the results, or False.
+    """
     search_exp = _normalize_search_expression(search_exp)
     if not search_exp:
         return False
 
     search = cloudinary.search.Search().expression(search_exp)
     search.fields(['tags', 'context', 'access_control',
-                   'secure_url', 'display_name', 'format'])
+                   'secure_url', 'display_name', 'format', 'etag', 'bytes'])
     search.max_results(DEFAULT_MAX_RESULTS)
 
     res = execute_single_request(search, fields_to_keep="")
-    res = handle_auto_pagination(res, search, force, fields_to_keep="")
+    if not isinstance(res, dict) or not res.get('resources'):
+        return 0, iter(())
+
+    if 'next_cursor' not in res:
+        return len(res['resources']), iter((res,))
+
+    if not confirm_auto_pagination(res, force):
+        logger.info(f"Stopping. Cloning only the first {len(res['resources'])} of {res['total_count']} assets, "
+                    f"please run again with -F to clone all of them.")
+        return len(res['resources']), iter((res,))
 
-    return res
+    return res['total_count'], itertools.chain((res,), iter_next_pages(res, search, fields_to_keep=""))
 
 
 def _normalize_search_expression(search_exp):
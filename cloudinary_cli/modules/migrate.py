@@ -4,9 +4,9 @@ from click import command, argument, option
 from cloudinary import api
 from cloudinary.exceptions import Error
 from cloudinary.utils import cloudinary_url
-from requests import head
 
 from cloudinary_cli.utils.api_utils import call_api
+from cloudinary_cli.utils.http_utils import http_head
 from cloudinary_cli.utils.utils import logger, log_exception
 
 
@@ -45,10 +45,11 @@ def migrate(upload_mapping, file, delimiter, verbose):
             exit_status = False
             continue
 
-        migration_urls.append(cloudinary_url('/'.join([mapping['folder'], migration_file[len(mapping['template']):]])))
+        migration_urls.append(
+            cloudinary_url('/'.join([mapping['folder'], migration_file[len(mapping['template']):]]))[0])
 
     for migration_url in migration_urls:
-        res = head(migration_url)
+        res = http_head(migration_url)
         if res.status_code != 200:
             logger.error(f"Failed uploading {migration_url}: {res.__dict__['headers']['X-Cld-Error']}")
         elif verbose:
@@ -1,6 +1,8 @@
 from click import command, argument, option
+from cloudinary_cli.utils.concurrency_utils import CONCURRENCY, max_workers
 from cloudinary_cli.utils.utils import print_help_and_exit
 from cloudinary_cli.utils.api_utils import handle_api_command, regen_derived_version
+from cloudinary_cli.utils.http_utils import configure_sdk_pool
 from cloudinary import api
 from cloudinary_cli.utils.utils import confirm_action, run_tasks_concurrently
 from cloudinary_cli.defaults import logger
@@ -28,8 +30,9 @@ e.g. cld regen_derived t_named -A -ea -enu http://mywebhook.com
 @option("-n", "--max_results", nargs=1, default=10,
         help="""The maximum number of results to return.
               Default: 10, maximum: 500.""")
-@option("-w", "--concurrent_workers", type=int, default=30,
-        help="Specify the number of concurrent network threads.")
+@option("-w", "--concurrent_workers", type=CONCURRENCY, default=30,
+        help="Specify the number of concurrent network threads, "
+             "or 'auto' to adapt it to the observed latency, errors and rate limits.")
 def regen_derived(trans_str, eager_notification_url,
                   eager_async, auto_paginate, force,
                   max_results, concurrent_workers):
@@ -87,6 +90,7 @@ def regen_derived(trans_str, eager_notification_url,
                                 eager_trans, eager_async,
                                 eager_notification_url))
 
+    configure_sdk_pool(max_workers(concurrent_workers))
     run_tasks_concurrently(regen_derived_version, regen_conc_list,
                            concurrent_workers)
     complete_msg = ('Regeneration in progress'
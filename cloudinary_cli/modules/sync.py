@@ -1,26 +1,63 @@
-import logging
 import os.path
-import re
+import shutil
+import time
 from collections import Counter
+from datetime import datetime, timedelta, timezone
 from itertools import groupby
-from os import path, remove
+from multiprocessing import pool
+from operator import itemgetter
+from os import path, remove, makedirs
 
-from click import command, argument, option, style, UsageError, Choice
+from click import command, argument, option, style, UsageError, Choice, IntRange
 import cloudinary
 from cloudinary import api
 
-from cloudinary_cli.utils.api_utils import query_cld_folder, upload_file, download_file, get_folder_mode, \
-    get_default_upload_options, get_destination_folder_options, cld_folder_exists, call_api
+from cloudinary_cli.utils.api_utils import query_cld_folder, iter_cld_folder, query_cld_subtrees, \
+    list_cld_subtree_names, upload_file, download_file, get_folder_mode, get_default_upload_options, \
+    get_destination_folder_options, cld_folder_exists, call_api, RateLimitThrottle, rename_asset, RemoteFile, \
+    PARTIAL_DOWNLOAD_SUFFIX, PARTIAL_DOWNLOAD_JOURNAL_SUFFIX
 from cloudinary_cli.utils.file_utils import (walk_dir, delete_empty_dirs, normalize_file_extension, posix_rel_path,
-                                             populate_duplicate_name)
+                                             populate_duplicate_name, read_hash_cache, write_hash_cache,
+                                             populate_etags, strip_duplicate_name_index, file_signature, iter_dir,
+                                             iter_hash_cache)
+from cloudinary_cli.utils.diff_store import SyncDiffStore
+from cloudinary_cli.utils.http_utils import configure_http_pool, configure_sdk_pool
+from cloudinary_cli.utils.journal_utils import Journal
 from cloudinary_cli.utils.json_utils import print_json, read_json_from_file, write_json_to_file
-from cloudinary_cli.utils.utils import logger, run_tasks_concurrently, get_user_action, invert_dict, chunker, \
-    group_params, parse_option_value, duplicate_values, should_dump_responses
-
-_DEFAULT_DELETION_BATCH_SIZE = 30
+from cloudinary_cli.utils.concurrency_utils import CONCURRENCY, max_workers
+from cloudinary_cli.utils.utils import logger, run_tasks_concurrently, iter_tasks_concurrently, get_user_action, \
+    invert_dict, chunker, group_params, parse_option_value, duplicate_values, should_dump_responses, parse_timestamp, Record, \
+    iter_chunks
+
+_DEFAULT_DELETION_BATCH_SIZE = 100
+# delete_resources accepts up to 100 public IDs per call.
+_MAX_DELETION_BATCH_SIZE = 100
 _DEFAULT_CONCURRENT_WORKERS = 30
+_DEFAULT_HASH_WORKERS = os.cpu_count() or 1
 
 _SYNC_META_FILE = '.cld-sync'
+_SYNC_HASH_CACHE_FILE = '.cld-sync-hashes'
+_SYNC_REMOTE_MANIFEST_FILE = '.cld-sync-remote'
+_SYNC_JOURNAL_FILE = '.cld-sync-journal'
+
+# Sync bookkeeping files are never synced themselves, even when hidden files are included.
+_SYNC_INTERNAL_FILES = (_SYNC_META_FILE, _SYNC_HASH_CACHE_FILE, _SYNC_REMOTE_MANIFEST_FILE, _SYNC_JOURNAL_FILE)
+
+_REMOTE_MANIFEST_VERSION = 1
+# Incremental listing cannot see remote deletions, so the whole folder is listed again once in a while.
+_REMOTE_MANIFEST_MAX_AGE = timedelta(days=7)
+# Search index is updated asynchronously, assets changed shortly before the previous listing might have been missed.
+_REMOTE_MANIFEST_WATERMARK_MARGIN = timedelta(minutes=10)
+
+_DEFAULT_WATCH_INTERVAL = 2.0
+
+_DEFAULT_RANGED_DOWNLOAD_THRESHOLD_MB = 100
+
+# Number of files compared and transferred at a time by --external-diff.
+_EXTERNAL_DIFF_CHUNK_SIZE = 1000
+
+# Number of subtrees listed by a single search in --pipeline mode.
+_PIPELINE_SUBTREES_PER_SHARD = 10
 
 
 @command("sync",
@@ -31,12 +68,26 @@ _SYNC_META_FILE = '.cld-sync'
 @option("--push", help="Push changes from your local folder to your Cloudinary folder.", is_flag=True)
 @option("--pull", help="Pull changes from your Cloudinary folder to your local folder.", is_flag=True)
 @option("-H", "--include-hidden", is_flag=True, help="Include hidden files in sync.")
-@option("-w", "--concurrent_workers", type=int, default=_DEFAULT_CONCURRENT_WORKERS,
-        help="Specify the number of concurrent network threads.")
+@option("-w", "--concurrent_workers", type=CONCURRENCY, default=_DEFAULT_CONCURRENT_WORKERS,
+        help="Specify the number of concurrent network threads, "
+             "or 'auto' to adapt it to the observed latency, errors and rate limits.")
+@option("-lw", "--listing-workers", type=int, default=1,
+        help="Specify the number of concurrent search requests used for listing the Cloudinary folder. "
+             "When greater than 1, the folder is listed in shards (by subfolders and resource types).")
+@option("-hw", "--hash-workers", type=int, default=_DEFAULT_HASH_WORKERS,
+        help="Specify the number of threads used for hashing local files. Default: number of CPUs.")
+@option("-rt", "--ranged-download-threshold", type=int, default=_DEFAULT_RANGED_DOWNLOAD_THRESHOLD_MB,
+        help="Download files larger than this size (in MB) in concurrent ranges, resuming interrupted downloads. "
+             "Set to 0 to disable.")
+@option("--detect-renames/--no-detect-renames", default=True, show_default=True,
+        help="Detect renamed and moved files by their content. Renamed files are renamed in the destination, "
+             "instead of being deleted and transferred again. Their previous names count as deletions, when "
+             "they are kept, or when upload options are passed, the files are transferred instead.")
 @option("-F", "--force", is_flag=True, help="Skip confirmation when deleting files.")
 @option("-K", "--keep-unique", is_flag=True, help="Keep unique files in the destination folder.")
-@option("-D", "--deletion-batch-size", type=int, default=_DEFAULT_DELETION_BATCH_SIZE,
-        help="Specify the batch size for deleting remote assets.")
+@option("-D", "--deletion-batch-size", type=IntRange(1, _MAX_DELETION_BATCH_SIZE, clamp=True),
+        default=_DEFAULT_DELETION_BATCH_SIZE,
+        help=f"Specify the batch size for deleting remote assets (up to {_MAX_DELETION_BATCH_SIZE}).")
 @option("-fm", "--folder-mode", type=Choice(['fixed', 'dynamic'], case_sensitive=False),
         help="Specify folder mode explicitly. By default uses cloud mode configured in your cloud.", hidden=True)
 @option("-st", "--status", type=Choice(['all', 'active', 'pending'], case_sensitive=False),
@@ -45,16 +96,61 @@ _SYNC_META_FILE = '.cld-sync'
 @option("-O", "--optional_parameter_parsed", multiple=True, nargs=2,
         help="Pass optional parameters as interpreted strings.")
 @option("--dry-run", is_flag=True, help="Simulate the sync operation without making any changes.")
-def sync(local_folder, cloudinary_folder, push, pull, include_hidden, concurrent_workers, force, keep_unique,
-         deletion_batch_size, folder_mode, status, optional_parameter, optional_parameter_parsed, dry_run):
+@option("-I", "--incremental-listing", is_flag=True,
+        help="List only Cloudinary assets changed since the previous sync, using the remote manifest kept in the "
+             "local folder.")
+@option("--full-reconcile", is_flag=True,
+        help="List the whole Cloudinary folder and rebuild the remote manifest, to catch remote deletions. "
+             "Implies --incremental-listing.")
+@option("--resume", is_flag=True,
+        help="Resume an interrupted sync: files transferred by the previous run (and not modified since) are skipped.")
+@option("--external-diff", is_flag=True,
+        help="Spill the local and the Cloudinary file lists to a temporary on-disk database and compare them there, "
+             "for folders too large to be compared in memory. Renamed files are not detected in this mode.")
+@option("--pipeline", is_flag=True,
+        help="Push each subtree (immediate subfolder) as soon as it is listed, instead of after the whole "
+             "Cloudinary folder is listed and compared. Renamed files are not detected in this mode, and remote "
+             "files of deleted local files are deleted after the uploads.")
+@option("--watch", is_flag=True,
+        help="Keep watching the local folder after the push, and push changed files as they happen. "
+             "Press Ctrl+C to stop. Remote files of deleted local files are deleted only with --force.")
+@option("--watch-interval", type=float, default=_DEFAULT_WATCH_INTERVAL,
+        help="Specify the polling interval of --watch in seconds. "
+             "A changed file is pushed once it stays unchanged for a whole interval.")
+def sync(local_folder, cloudinary_folder, push, pull, include_hidden, concurrent_workers, listing_workers, hash_workers,
+         ranged_download_threshold, detect_renames, force, keep_unique, deletion_batch_size, folder_mode, status,
+         optional_parameter, optional_parameter_parsed, dry_run, incremental_listing, full_reconcile, resume,
+         external_diff, pipeline, watch, watch_interval):
     if push == pull:
         raise UsageError("Please use either the '--push' OR '--pull' options")
 
-    sync_dir = SyncDir(local_folder, cloudinary_folder, include_hidden, concurrent_workers, force, keep_unique,
-                       deletion_batch_size, folder_mode, status, optional_parameter, optional_parameter_parsed, dry_run)
+    if external_diff and (incremental_listing or full_reconcile or resume or watch or listing_workers > 1):
+        raise UsageError("The '--external-diff' option cannot be used with '--incremental-listing', "
+                         "'--full-reconcile', '--resume', '--watch' or '--listing-workers'")
+
+    if pipeline and (pull or external_diff or incremental_listing or full_reconcile):
+        raise UsageError("The '--pipeline' option can only be used with '--push', without '--external-diff', "
+                         "'--incremental-listing' or '--full-reconcile'")
+
+    if watch and (pull or dry_run):
+        raise UsageError("The '--watch' option can only be used with '--push', without '--dry-run'")
+
+    # Listing, uploads and deletions share the SDK connection pool.
+    configure_sdk_pool(max(max_workers(concurrent_workers), listing_workers))
+    sync_dir_class = ExternalSyncDir if external_diff else PipelinedSyncDir if pipeline else SyncDir
+    sync_dir = sync_dir_class(local_folder, cloudinary_folder, include_hidden, concurrent_workers, force, keep_unique,
+                              deletion_batch_size, folder_mode, status, optional_parameter, optional_parameter_parsed,
+                              dry_run,
+                              hash_workers=hash_workers, listing_workers=listing_workers,
+                              incremental_listing=incremental_listing or full_reconcile,
+                              full_reconcile=full_reconcile, resume=resume,
+                              ranged_download_threshold=ranged_download_threshold * 1024 * 1024,
+                              detect_renames=detect_renames and not external_diff and not pipeline)
     result = True
     if push:
         result = sync_dir.push()
+        if watch and result is not False:
+            result = sync_dir.watch(watch_interval)
     elif pull:
         result = sync_dir.pull()
 
@@ -66,7 +162,9 @@ def sync(local_folder, cloudinary_folder, push, pull, include_hidden, concurrent
 
 class SyncDir:
     def __init__(self, local_dir, remote_dir, include_hidden, concurrent_workers, force, keep_deleted,
-                 deletion_batch_size, folder_mode, status, optional_parameter, optional_parameter_parsed, dry_run):
+                 deletion_batch_size, folder_mode, status, optional_parameter, optional_parameter_parsed, dry_run,
+                 hash_workers=1, listing_workers=1, incremental_listing=False, full_reconcile=False, resume=False,
+                 ranged_download_threshold=None, detect_renames=False):
         self.local_dir = local_dir
         self.remote_dir = remote_dir.strip('/')
         self.user_friendly_remote_dir = self.remote_dir if self.remote_dir else '/'
@@ -74,8 +172,18 @@ class SyncDir:
         self.concurrent_workers = concurrent_workers
         self.force = force
         self.keep_unique = keep_deleted
-        self.deletion_batch_size = deletion_batch_size
+        self.deletion_batch_size = min(deletion_batch_size, _MAX_DELETION_BATCH_SIZE)
         self.dry_run = dry_run
+        self.hash_workers = hash_workers
+        self.listing_workers = listing_workers
+        self.incremental_listing = incremental_listing
+        self.full_reconcile = full_reconcile
+        self.resume = resume
+        self.ranged_download_threshold = ranged_download_threshold
+        self.detect_renames = detect_renames
+        # Renamed files are kept under their previous names, unless their deletion is confirmed.
+        self.keep_renamed_sources = True
+        self.status = status
 
         self.folder_mode = folder_mode or get_folder_mode()
 
@@ -83,41 +191,26 @@ class SyncDir:
         self.optional_parameter_parsed = optional_parameter_parsed
 
         self.sync_meta_file = path.join(self.local_dir, _SYNC_META_FILE)
+        self.hash_cache_file = path.join(self.local_dir, _SYNC_HASH_CACHE_FILE)
+        self.remote_manifest_file = path.join(self.local_dir, _SYNC_REMOTE_MANIFEST_FILE)
+        self.remote_manifest = None
+        self.journal = Journal(path.join(self.local_dir, _SYNC_JOURNAL_FILE),
+                               {"remote_folder": self.remote_dir, "folder_mode": self.folder_mode})
 
         self.verbose = should_dump_responses()
 
-        self.local_files = {}
-        self.local_folder_exists = os.path.isdir(path.abspath(self.local_dir))
-        if not self.local_folder_exists:
-            logger.info(f"Local folder '{self.local_dir}' does not exist.")
-        else:
-            self.local_files = walk_dir(path.abspath(self.local_dir), include_hidden)
-            if len(self.local_files):
-                logger.info(f"Found {len(self.local_files)} items in local folder '{self.local_dir}'")
-            else:
-                logger.info(f"Local folder '{self.local_dir}' is empty.")
+        self._compare()
 
-        raw_remote_files = {}
-        self.cld_folder_exists = cld_folder_exists(self.remote_dir)
-        if not self.cld_folder_exists:
-            logger.info(f"Cloudinary folder '{self.user_friendly_remote_dir}' does not exist "
-                           f"({self.folder_mode} folder mode).")
-        else:
-            raw_remote_files = query_cld_folder(self.remote_dir, self.folder_mode, status)
-            if len(raw_remote_files):
-                logger.info(
-                    f"Found {len(raw_remote_files)} items in Cloudinary folder '{self.user_friendly_remote_dir}' "
-                    f"({self.folder_mode} folder mode).")
-            else:
-                logger.info(f"Cloudinary folder '{self.user_friendly_remote_dir}' is empty. "
-                            f"({self.folder_mode} folder mode)")
-
-        self.remote_files = self._normalize_remote_file_names(raw_remote_files, self.local_files)
-        self.remote_duplicate_names = duplicate_values(self.remote_files, "normalized_path", "asset_id")
-        self._print_duplicate_file_names()
+    def _compare(self):
+        """
+        Lists the local and the remote files and finds the differences between them.
+        """
+        # The Cloudinary folder is listed in the background, while the local folder is walked.
+        with pool.ThreadPool(1) as listing_pool:
+            remote_listing = listing_pool.apply_async(self._list_remote_files)
+            self._walk_local_dir()
+            raw_remote_files = remote_listing.get()
 
-        local_file_names = self.local_files.keys()
-        remote_file_names = self.remote_files.keys()
         """
         Cloudinary is a very permissive service. When uploading files that contain invalid characters,
         unicode characters, etc, Cloudinary does the best effort to store those files.
@@ -133,27 +226,113 @@ class SyncDir:
         """
 
         # handle fixed folder mode public_id differences
-        diverse_file_names = read_json_from_file(self.sync_meta_file, does_not_exist_ok=True)
-        self.diverse_file_names = dict(
-            (normalize_file_extension(k), normalize_file_extension(v)) for k, v in diverse_file_names.items())
-        inverted_diverse_file_names = invert_dict(self.diverse_file_names)
+        self.diverse_file_names = self._read_sync_meta_file()
+        self.resumed_files = self._replay_journal() if self.resume else {}
+
+        self._init_diff()
+        self._diff(self.local_files.keys(), raw_remote_files)
+        self._print_duplicate_file_names()
+
+        # Renamed (or moved) files are unique on both sides, those are matched by content.
+        self.renamed_file_names = self._get_renamed_file_names() if self.detect_renames else {}
+        self.unique_local_file_names -= self.renamed_file_names.keys()
+        self.unique_remote_file_names -= set(self.renamed_file_names.values())
+
+        if self.local_folder_exists:
+            self._save_hash_cache()
+            self._save_remote_manifest()
 
+        if self.synced_files_count:
+            logger.info(f"Skipping {self.synced_files_count} items")
+
+    def _walk_local_dir(self):
+        self.local_files = {}
+        self.hash_cache = {}
+        self.local_folder_exists = os.path.isdir(path.abspath(self.local_dir))
+        if not self.local_folder_exists:
+            logger.info(f"Local folder '{self.local_dir}' does not exist.")
+            return
+
+        # Local etags are calculated lazily, only for files that need to be compared with the remote ones.
+        # Unchanged files are not hashed again, their etags are taken from the local hash cache.
+        self.hash_cache = read_hash_cache(self.hash_cache_file)
+        self.local_files = walk_dir(path.abspath(self.local_dir), self.include_hidden, self.hash_cache,
+                                    lazy_etags=True)
+        for internal_file in _internal_file_names(self.local_files.keys() | self.hash_cache.keys()):
+            self.local_files.pop(internal_file, None)
+            self.hash_cache.pop(internal_file, None)
+        if len(self.local_files):
+            logger.info(f"Found {len(self.local_files)} items in local folder '{self.local_dir}'")
+        else:
+            logger.info(f"Local folder '{self.local_dir}' is empty.")
+
+    def _list_remote_files(self):
+        self.cld_folder_exists = cld_folder_exists(self.remote_dir)
+        if not self.cld_folder_exists:
+            logger.info(f"Cloudinary folder '{self.user_friendly_remote_dir}' does not exist "
+                        f"({self.folder_mode} folder mode).")
+            return {}
+
+        raw_remote_files = self._query_remote_files()
+        if len(raw_remote_files):
+            logger.info(
+                f"Found {len(raw_remote_files)} items in Cloudinary folder '{self.user_friendly_remote_dir}' "
+                f"({self.folder_mode} folder mode).")
+        else:
+            logger.info(f"Cloudinary folder '{self.user_friendly_remote_dir}' is empty. "
+                        f"({self.folder_mode} folder mode)")
+
+        return raw_remote_files
+
+    def _init_diff(self):
+        self.remote_files = {}
+        self.remote_duplicate_names = {}
+        self.recovered_remote_files = {}
+        self.unique_remote_file_names = set()
+        self.unique_local_file_names = set()
+        self.out_of_sync_local_file_names = set()
+        self.out_of_sync_remote_file_names = set()
+        self.synced_files_count = 0
+
+    def _diff(self, local_file_names, raw_remote_files):
+        """
+        Compares the local files with the remote files and adds the differences to the sync state.
+
+        The whole folder is compared at once, or subtree by subtree (see PipelinedSyncDir). The local files of a
+        subtree are the ones synced with the remote files of the subtree (by their diverse names).
+
+        :param local_file_names: Local file names.
+        :param raw_remote_files: dict of asset ids to remote files, as returned by query_cld_folder.
+        :return: set of local file names to push, unique or out of sync.
+        """
+        remote_files = self._normalize_remote_file_names(raw_remote_files, self.local_files)
+        self.remote_files.update(remote_files)
+        self.remote_duplicate_names.update(duplicate_values(remote_files, "normalized_path", "asset_id"))
+
+        inverted_diverse_file_names = invert_dict(self.diverse_file_names)
         cloudinarized_local_file_names = [self.diverse_file_names.get(f, f) for f in local_file_names]
-        self.recovered_remote_files = {inverted_diverse_file_names.get(f, f): dt for f, dt in self.remote_files.items()}
+        recovered_remote_files = {inverted_diverse_file_names.get(f, f): dt for f, dt in remote_files.items()}
+        self.recovered_remote_files.update(recovered_remote_files)
 
-        self.unique_remote_file_names = remote_file_names - cloudinarized_local_file_names
-        self.unique_local_file_names = local_file_names - self.recovered_remote_files.keys()
+        unique_remote_file_names = remote_files.keys() - cloudinarized_local_file_names
+        unique_local_file_names = local_file_names - recovered_remote_files.keys()
 
-        common_file_names = local_file_names - self.unique_local_file_names
+        common_file_names = local_file_names - unique_local_file_names
 
-        self.out_of_sync_local_file_names = self._get_out_of_sync_file_names(common_file_names)
-        self.out_of_sync_remote_file_names = set(self.diverse_file_names.get(f, f) for f in
-                                                 self.out_of_sync_local_file_names)
+        # Files uploaded by the interrupted run might not be searchable yet, those are not uploaded again.
+        unique_local_file_names -= {f for f, entry in self.resumed_files.items() if entry["op"] == "upload"}
+        resumed_common_file_names = {f for f in common_file_names & self.resumed_files.keys()
+                                     if self.resumed_files[f]["etag"] == recovered_remote_files[f]["etag"]}
 
-        self.synced_files_count = len(common_file_names) - len(self.out_of_sync_local_file_names)
+        out_of_sync_file_names = self._get_out_of_sync_file_names(common_file_names - resumed_common_file_names)
 
-        if self.synced_files_count:
-            logger.info(f"Skipping {self.synced_files_count} items")
+        self.unique_remote_file_names |= unique_remote_file_names
+        self.unique_local_file_names |= unique_local_file_names
+        self.out_of_sync_local_file_names |= out_of_sync_file_names
+        self.out_of_sync_remote_file_names |= set(self.diverse_file_names.get(f, f) for f in out_of_sync_file_names)
+        self.synced_files_count += len(common_file_names) - len(out_of_sync_file_names)
+
+        return unique_local_file_names | out_of_sync_file_names
 
     def push(self):
         """
@@ -168,8 +347,12 @@ class SyncDir:
             logger.info("Aborting...")
             return False
 
-        files_to_push = self.unique_local_file_names | self.out_of_sync_local_file_names
+        # Files that could not be renamed are uploaded instead.
+        files_to_push = self.unique_local_file_names | self.out_of_sync_local_file_names | self._push_renames()
         if not files_to_push:
+            if self.resumed_files and not self.dry_run:
+                self._save_sync_meta_file(self._resumed_upload_results())
+            self._finish_resumed_sync()
             return True
 
         if self.dry_run:
@@ -181,30 +364,134 @@ class SyncDir:
         logger.info(f"Uploading {len(files_to_push)} items to Cloudinary folder '{self.user_friendly_remote_dir}' "
                     f"in cloud '{cloudinary.config().cloud_name}'")
 
-        options = {
-            **get_default_upload_options(self.folder_mode),
-            **group_params(
-                self.optional_parameter,
-                ((k, parse_option_value(v)) for k, v in self.optional_parameter_parsed))
-        }
+        _, upload_errors = self._upload_files(files_to_push, self._resumed_upload_results())
+
+        if upload_errors:
+            raise Exception("Sync did not finish successfully")
 
-        upload_results = {}
+    def _upload_files(self, files_to_push, resumed_upload_results=None):
+        """
+        Uploads local files to the Cloudinary folder and updates the sync meta file.
+
+        :param files_to_push: Local file names.
+        :param resumed_upload_results: Upload results of the interrupted sync, to be kept in the sync meta file.
+        :return: tuple of upload results and upload errors.
+        """
+        options = self._upload_options()
+
+        upload_results = self._upload_results = {}
         upload_errors = {}
         uploads = []
+        self._upload_file_names = {}
         for file in files_to_push:
             folder_options = get_destination_folder_options(file, self.remote_dir, self.folder_mode)
+            self._upload_file_names[self.local_files[file]['path']] = file
 
-            uploads.append(
-                (self.local_files[file]['path'], {**options, **folder_options}, upload_results, upload_errors))
+            uploads.append((self.local_files[file]['path'], {**options, **folder_options}, upload_results,
+                            upload_errors, self._on_file_uploaded))
 
+        completed = False
+        self.journal.open(append=self.resume)
         try:
             run_tasks_concurrently(upload_file, uploads, self.concurrent_workers)
+            completed = not upload_errors
         finally:
-            self._print_sync_status(upload_results, upload_errors)
-            self._save_sync_meta_file(upload_results)
+            self.journal.close(remove=completed)
+            self._print_sync_status(len(upload_results), len(upload_errors))
+            self._save_sync_meta_file({**(resumed_upload_results or {}), **upload_results})
 
-        if upload_errors:
-            raise Exception("Sync did not finish successfully")
+        return upload_results, upload_errors
+
+    def _has_upload_options(self):
+        return bool(self.optional_parameter or self.optional_parameter_parsed)
+
+    def _upload_options(self):
+        return {
+            **get_default_upload_options(self.folder_mode),
+            **group_params(
+                self.optional_parameter,
+                ((k, parse_option_value(v)) for k, v in self.optional_parameter_parsed))
+        }
+
+    def watch(self, interval=_DEFAULT_WATCH_INTERVAL):
+        """
+        Watches the local folder and pushes changes until interrupted.
+
+        The local folder is polled (stat only, no hashing) each interval. A changed file is pushed once it stays
+        unchanged for a whole interval, so files that are still being written are not uploaded half-way.
+        All the files that settled in the same interval are pushed in a single batch.
+        The sync meta file and the remote files are kept in memory between the batches.
+
+        :param interval: Polling interval in seconds.
+        :return: True when stopped by the user.
+        """
+        if not self.force and not self.keep_unique:
+            logger.warning("Remote files of deleted local files are kept, use --force to delete them")
+
+        logger.info(f"Watching local folder '{self.local_dir}' for changes. Press Ctrl+C to stop.")
+        self._start_watch()
+        try:
+            while True:
+                time.sleep(interval)
+                self._watch_step()
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")
+        finally:
+            self._save_hash_cache()
+            self._save_remote_manifest()
+
+        return True
+
+    def _start_watch(self):
+        # the state of the local files as pushed, and the files changed since, by their state in the last poll
+        self._watched_files = {f: _file_state(dt) for f, dt in self.local_files.items()}
+        self._pending_files = {}
+
+    def _watch_step(self):
+        local_files = walk_dir(path.abspath(self.local_dir), self.include_hidden, self.hash_cache, lazy_etags=True)
+        for internal_file in _internal_file_names(local_files.keys()):
+            local_files.pop(internal_file, None)
+        current_files = {f: _file_state(dt) for f, dt in local_files.items()}
+
+        changed_files = {f for f, state in current_files.items() if self._watched_files.get(f) != state}
+        settled_files = {f for f in changed_files if self._pending_files.get(f) == current_files[f]}
+        self._pending_files = {f: current_files[f] for f in changed_files - settled_files}
+        deleted_files = self._watched_files.keys() - current_files.keys()
+
+        if not settled_files and not deleted_files:
+            return
+
+        self.local_files = local_files
+        for f in deleted_files:
+            self._watched_files.pop(f)
+        self._push_watched_deletions(deleted_files)
+
+        files_to_push = (settled_files - self.recovered_remote_files.keys()) | self._get_out_of_sync_file_names(
+            settled_files & self.recovered_remote_files.keys())
+        for f in settled_files - files_to_push:
+            logger.debug(f"'{f}' is in sync")
+            self._watched_files[f] = current_files[f]
+
+        if files_to_push:
+            logger.info(f"Uploading {len(files_to_push)} changed items to Cloudinary folder "
+                        f"'{self.user_friendly_remote_dir}'")
+            self.synced_files_count = 0
+            upload_results, _ = self._upload_files(files_to_push)
+            for f in files_to_push:
+                # failed uploads are retried once the file is polled again
+                if self.local_files[f]["path"] in upload_results:
+                    self._watched_files[f] = current_files[f]
+
+        self._save_hash_cache()
+
+    def _push_watched_deletions(self, deleted_files):
+        files_to_delete = [self.recovered_remote_files.pop(f) for f in deleted_files
+                           if f in self.recovered_remote_files]
+        if not files_to_delete or self.keep_unique or not self.force:
+            return
+
+        self._delete_remote_files(files_to_delete)
+        self._save_remote_manifest()
 
     def pull(self):
         """
@@ -221,9 +508,11 @@ class SyncDir:
         if not self._handle_unique_local_files():
             return False
 
-        files_to_pull = self.unique_remote_file_names | self.out_of_sync_remote_file_names
+        # Files that could not be moved are downloaded instead.
+        files_to_pull = self.unique_remote_file_names | self.out_of_sync_remote_file_names | self._pull_renames()
 
         if not files_to_pull:
+            self._finish_resumed_sync()
             return True
 
         logger.info(f"Preparing to download {len(files_to_pull)} items from Cloudinary folder ")
@@ -240,16 +529,263 @@ class SyncDir:
             remote_file = self.remote_files[file]
             local_path = path.abspath(path.join(self.local_dir, file))
 
-            downloads.append((remote_file, local_path, download_results, download_errors))
+            downloads.append((remote_file, local_path, download_results, download_errors, self._on_file_downloaded,
+                              self.ranged_download_threshold))
 
+        completed = False
+        makedirs(self.local_dir, exist_ok=True)
+        configure_http_pool(max_workers(self.concurrent_workers))
+        self.journal.open(append=self.resume)
         try:
             run_tasks_concurrently(download_file, downloads, self.concurrent_workers)
+            completed = not download_errors
         finally:
-            self._print_sync_status(download_results, download_errors)
+            self.journal.close(remove=completed)
+            self._print_sync_status(len(download_results), len(download_errors))
+            self._save_hash_cache()
+            self._save_remote_manifest()
 
         if download_errors:
             raise Exception("Sync did not finish successfully")
 
+    def _get_renamed_file_names(self):
+        """
+        Matches unique local files to unique remote files of the same size and etag.
+
+        Only local files of the same size as one of the unique remote files are hashed.
+
+        :return: dict of local file names to remote file names.
+        """
+        remote_file_names_by_content = {}
+        for f in self.unique_remote_file_names:
+            remote_file = self.remote_files[f]
+            if remote_file.get("bytes") is not None and remote_file.get("etag"):
+                remote_file_names_by_content.setdefault((remote_file["bytes"], remote_file["etag"]), []).append(f)
+
+        remote_sizes = {size for size, _ in remote_file_names_by_content.keys()}
+        candidates = sorted(f for f in self.unique_local_file_names if self.local_files[f]["size"] in remote_sizes)
+        self._populate_local_etags(candidates)
+
+        renamed_file_names = {}
+        for f in candidates:
+            remote_file_names = remote_file_names_by_content.get((self.local_files[f]["size"],
+                                                                  self.local_files[f]["etag"]))
+            if remote_file_names:
+                renamed_file_names[f] = remote_file_names.pop()
+                logger.debug(f"'{f}' is renamed from '{renamed_file_names[f]}'")
+
+        if renamed_file_names:
+            logger.info(f"Found {len(renamed_file_names)} renamed items")
+
+        return renamed_file_names
+
+    def _push_renames(self):
+        """
+        Renames the remote files of the renamed local files.
+
+        :return: set of local file names that were not renamed and need to be uploaded.
+        """
+        if not self.renamed_file_names or self.keep_renamed_sources or self._has_upload_options():
+            # Renaming would neither keep the remote file under its previous name, nor apply the upload options.
+            return set(self.renamed_file_names.keys())
+
+        if self.dry_run:
+            logger.info("Dry run mode enabled. The following files would be renamed:")
+            for file, remote_file_name in self.renamed_file_names.items():
+                logger.info(f"{remote_file_name} -> {file}")
+            return set()
+
+        rename_results = {}
+        rename_errors = {}
+        renames = []
+        for file, remote_file_name in self.renamed_file_names.items():
+            folder_options = get_destination_folder_options(file, self.remote_dir, self.folder_mode)
+            renames.append((self.remote_files[remote_file_name], self.local_files[file]['path'], folder_options,
+                            self.folder_mode, rename_results, rename_errors))
+
+        try:
+            run_tasks_concurrently(rename_asset, renames, self.concurrent_workers)
+        finally:
+            self._save_sync_meta_file(rename_results)
+
+        return {f for f in self.renamed_file_names.keys() if self.local_files[f]['path'] in rename_errors}
+
+    def _pull_renames(self):
+        """
+        Moves the renamed local files to the names of their remote files, or links them when they are kept.
+
+        :return: set of remote file names that were not moved and need to be downloaded.
+        """
+        if self.dry_run:
+            if self.renamed_file_names:
+                logger.info("Dry run mode enabled. The following files would be moved:")
+            for file, remote_file_name in self.renamed_file_names.items():
+                logger.info(f"{file} -> {remote_file_name}")
+            return set()
+
+        failed_file_names = set()
+        for file, remote_file_name in self.renamed_file_names.items():
+            local_path = self.local_files[file]['path']
+            new_local_path = path.abspath(path.join(self.local_dir, remote_file_name))
+            try:
+                makedirs(path.dirname(new_local_path), exist_ok=True)
+                if self.keep_renamed_sources:
+                    _link_or_copy(local_path, new_local_path)
+                else:
+                    os.replace(local_path, new_local_path)
+                if file in self.hash_cache and file_signature(new_local_path) == self.hash_cache[file][:3]:
+                    self.hash_cache[remote_file_name] = self.hash_cache[file]
+                logger.info(style(f"Moved '{local_path}' to '{new_local_path}'", fg="green"))
+            except OSError as e:
+                logger.error(f"Failed moving '{local_path}' to '{new_local_path}': {e}")
+                failed_file_names.add(remote_file_name)
+
+        if self.renamed_file_names and not self.keep_renamed_sources:
+            delete_empty_dirs(self.local_dir)
+
+        return failed_file_names
+
+    def _replay_journal(self):
+        """
+        Replays the journal of the interrupted sync.
+
+        :return: dict of local file names to journal entries, for the files that were not modified since transferred.
+        """
+        resumed_files = {}
+        for entry in self.journal.replay():
+            local_file = self.local_files.get(entry["path"])
+            if local_file is not None and (local_file["size"], local_file["mtime_ns"]) == (entry["size"],
+                                                                                           entry["mtime_ns"]):
+                resumed_files[entry["path"]] = entry
+
+        if resumed_files:
+            logger.info(f"Resuming interrupted sync, {len(resumed_files)} items were already synced")
+
+        return resumed_files
+
+    def _resumed_upload_results(self):
+        return {self.local_files[f]["path"]: entry["remote"] for f, entry in self.resumed_files.items()
+                if entry["op"] == "upload"}
+
+    def _finish_resumed_sync(self):
+        # Nothing left to transfer, the interrupted sync is complete.
+        if self.resume and not self.dry_run:
+            self.journal.close(remove=True)
+
+    def _on_file_uploaded(self, file_path, result):
+        file = self._upload_file_names[file_path]
+        # keeps the remote files up to date for --watch, which does not list the Cloudinary folder again
+        self.recovered_remote_files[file] = RemoteFile(
+            asset_id=result.get("asset_id"),
+            public_id=result.get("public_id"),
+            type=result.get("type"),
+            resource_type=result.get("resource_type"),
+            etag=result.get("etag"),
+            bytes=result.get("bytes"),
+        )
+        self.journal.record({
+            "op": "upload",
+            "path": file,
+            # signature of the local file taken before the upload, a file modified since is uploaded again on resume
+            "size": self.local_files[file]["size"],
+            "mtime_ns": self.local_files[file]["mtime_ns"],
+            "etag": result.get("etag"),
+            # upload_file stores the remote path of the upload before calling back
+            "remote": self._upload_results[file_path]
+        })
+
+    def _on_file_downloaded(self, remote_file, local_path):
+        file = remote_file["normalized_unique_path"]
+        signature = file_signature(local_path)
+        if remote_file.get("etag"):
+            # download_file verified the content against the etag, no need to hash the file again
+            self.hash_cache[file] = (*signature, remote_file["etag"])
+        self.journal.record({
+            "op": "download",
+            "path": file,
+            "size": signature[0],
+            "mtime_ns": signature[1],
+            "etag": remote_file["etag"],
+        })
+
+    def _query_remote_files(self):
+        """
+        Lists the Cloudinary folder.
+
+        In incremental listing mode, the assets found by the previous sync are kept in the remote manifest file, and
+        only assets uploaded or updated after the latest change seen (the watermark) are listed and merged into it.
+        Remote deletions (and assets moved out of the folder) are not visible to the incremental listing, those are
+        caught by a full listing, performed on demand (--full-reconcile) or when the manifest gets old.
+
+        :return: dict of asset ids to asset details.
+        """
+        if not self.incremental_listing:
+            return query_cld_folder(self.remote_dir, self.folder_mode, self.status,
+                                    listing_workers=self.listing_workers)
+
+        manifest = None if self.full_reconcile else self._load_remote_manifest()
+        if manifest is None:
+            logger.info(f"Listing the whole Cloudinary folder '{self.user_friendly_remote_dir}'")
+            self.remote_manifest = {
+                "version": _REMOTE_MANIFEST_VERSION,
+                "remote_folder": self.remote_dir,
+                "folder_mode": self.folder_mode,
+                "status": self.status,
+                "reconciled_at": datetime.now(timezone.utc).isoformat(),
+                "assets": query_cld_folder(self.remote_dir, self.folder_mode, self.status,
+                                           listing_workers=self.listing_workers)
+            }
+            return self.remote_manifest["assets"]
+
+        self.remote_manifest = manifest
+        remote_files = manifest["assets"] = {asset_id: RemoteFile(**remote_file)
+                                             for asset_id, remote_file in manifest["assets"].items()}
+        for remote_file in remote_files.values():
+            # unique names are calculated again on each run
+            remote_file["normalized_unique_path"] = remote_file["normalized_path"]
+
+        watermark = _remote_manifest_watermark(remote_files)
+        changed_files = query_cld_folder(self.remote_dir, self.folder_mode, self.status, updated_since=watermark,
+                                         listing_workers=self.listing_workers)
+        logger.info(f"Found {len(changed_files)} items changed since {watermark} "
+                    f"in Cloudinary folder '{self.user_friendly_remote_dir}'")
+        remote_files.update(changed_files)
+
+        return remote_files
+
+    def _load_remote_manifest(self):
+        try:
+            manifest = read_json_from_file(self.remote_manifest_file, does_not_exist_ok=True)
+        except Exception as e:
+            logger.warning(f"Failed reading '{self.remote_manifest_file}' file: {e}")
+            return None
+
+        if (manifest.get("version") != _REMOTE_MANIFEST_VERSION
+                or manifest.get("remote_folder") != self.remote_dir
+                or manifest.get("folder_mode") != self.folder_mode
+                or manifest.get("status") != self.status):
+            logger.debug(f"Remote manifest '{self.remote_manifest_file}' does not match the current sync")
+            return None
+
+        if datetime.now(timezone.utc) - parse_timestamp(manifest["reconciled_at"]) > _REMOTE_MANIFEST_MAX_AGE:
+            logger.info(f"Remote manifest is older than {_REMOTE_MANIFEST_MAX_AGE.days} days, reconciling")
+            return None
+
+        return manifest
+
+    def _save_remote_manifest(self):
+        if self.remote_manifest is None or self.dry_run:
+            return
+
+        try:
+            logger.debug(f"Updating '{self.remote_manifest_file}' file")
+            makedirs(self.local_dir, exist_ok=True)
+            write_json_to_file(self.remote_manifest, self.remote_manifest_file, indent=None, atomic=True,
+                               default=Record.to_dict)
+        except Exception as e:
+            # Remote manifest is an optimization only, in case we cannot write it, we just log a warning
+            logger.warning(f"Failed updating '{self.remote_manifest_file}' file: {e}")
+
     def _normalize_remote_file_names(self, remote_files, local_files):
         """
         When multiple remote files have duplicate display name, we save them locally by appending index at the end
@@ -272,9 +808,16 @@ class SyncDir:
         :return:
         """
         duplicate_ids = duplicate_values(remote_files, "normalized_path")
+        if not duplicate_ids:
+            return {dt["normalized_unique_path"]: dt for dt in remote_files.values()}
+
+        candidate_names = self._local_candidate_names(duplicate_ids.keys())
+        self._populate_local_etags([f for names in candidate_names.values() for f in names])
+
+        unique_paths = Counter(v["normalized_unique_path"] for v in remote_files.values())
         for duplicate_name, asset_ids in duplicate_ids.items():
             duplicate_dts = sorted([remote_files[asset_id] for asset_id in asset_ids], key=lambda f: f['created_at'])
-            local_candidates = self._local_candidates(duplicate_name)
+            local_candidates = self._local_candidates(candidate_names[duplicate_name])
             remainng_duplicate_dts = []
             for duplicate_dt in duplicate_dts:
                 matched_name = next((f for f in local_candidates.keys() if local_candidates[f] == duplicate_dt["etag"]),
@@ -283,30 +826,55 @@ class SyncDir:
                     remainng_duplicate_dts.append(duplicate_dt)
                     continue
                 # found local synced file.
-                remote_files[duplicate_dt["asset_id"]]["normalized_unique_path"] = matched_name
+                _update_unique_path(remote_files[duplicate_dt["asset_id"]], matched_name, unique_paths)
                 local_candidates.pop(matched_name)
 
-            unique_paths = {v["normalized_unique_path"] for v in remote_files.values()}
             curr_index = 0
             for dup in remainng_duplicate_dts:
                 # here we check for collisions with other existing files.
                 # remote file can have both "Image.jpg" and "Image (1).jpg", which are valid names, skip those.
                 candidate_path = populate_duplicate_name(dup['normalized_path'], curr_index)
-                while candidate_path in unique_paths:
+                while unique_paths[candidate_path] > 0:
                     curr_index += 1
                     candidate_path = populate_duplicate_name(dup['normalized_path'], curr_index)
-                remote_files[dup["asset_id"]]["normalized_unique_path"] = candidate_path
+                _update_unique_path(remote_files[dup["asset_id"]], candidate_path, unique_paths)
                 curr_index += 1
 
         return {dt["normalized_unique_path"]: dt for dt in remote_files.values()}
 
-    def _local_candidates(self, candidate_path):
-        filename, extension = path.splitext(candidate_path)
-        r = re.compile(f"({candidate_path}|{filename} \\(\\d+\\){extension})")
+    def _local_candidate_names(self, duplicate_names):
+        """
+        Finds the local files that can be synced with the remote files of the duplicate names.
+
+        Those are the local files with the same name, or with an index added to it, e.g. Image.jpg, Image (1).jpg.
+        Local files are indexed by their name without the index once, instead of scanning them per duplicate name.
+
+        :param duplicate_names: Duplicate remote file names.
+        :return: dict of duplicate names to the names of the local candidates.
+        """
+        duplicate_names = set(duplicate_names)
+        candidate_names = {name: [] for name in duplicate_names}
+        for f in self._local_file_names_of(duplicate_names):
+            if f in duplicate_names:
+                candidate_names[f].append(f)
+            base_name = strip_duplicate_name_index(f)
+            if base_name != f and base_name in duplicate_names:
+                candidate_names[base_name].append(f)
+
+        return candidate_names
+
+    def _local_file_names_of(self, duplicate_names):
+        return self.local_files.keys()
+
+    def _local_candidates(self, candidate_names):
         # sort local files by base name (without ext) for accurate results.
-        return dict(sorted({f: self.local_files[f]["etag"] for f in filter(r.match, self.local_files.keys())}.items(),
+        return dict(sorted({f: self.local_files[f]["etag"] for f in candidate_names}.items(),
                            key=lambda f: path.splitext(f[0])[0]))
 
+    def _populate_local_etags(self, file_names, local_files=None):
+        populate_etags(self.local_files if local_files is None else local_files, file_names, self.hash_cache,
+                       self.hash_workers)
+
     def _print_duplicate_file_names(self):
         if (len(self.remote_duplicate_names) > 0):
             logger.warning(f"Cloudinary folder '{self.user_friendly_remote_dir}' "
@@ -314,14 +882,18 @@ class SyncDir:
             for normalized_path, asset_ids in self.remote_duplicate_names.items():
                 logger.debug(f"Duplicate name: '{normalized_path}', asset ids: {', '.join(asset_ids)}")
 
-    def _print_sync_status(self, success, errors):
+    def _print_sync_status(self, success_count, errors_count):
         logger.info("==Sync Status==")
         logger.info("===============")
         logger.info(f"In Sync| {self.synced_files_count}")
-        logger.info(f"Synced | {len(success)}")
-        logger.info(f"Failed | {len(errors)}")
+        logger.info(f"Synced | {success_count}")
+        logger.info(f"Failed | {errors_count}")
         logger.info("===============")
 
+    def _read_sync_meta_file(self):
+        diverse_file_names = read_json_from_file(self.sync_meta_file, does_not_exist_ok=True)
+        return dict((normalize_file_extension(k), normalize_file_extension(v)) for k, v in diverse_file_names.items())
+
     def _save_sync_meta_file(self, upload_results):
         diverse_filenames = {}
         for local_path, remote_res in upload_results.items():
@@ -336,6 +908,7 @@ class SyncDir:
 
         if diverse_filenames or current_diverse_files != self.diverse_file_names:
             current_diverse_files.update(diverse_filenames)
+            self.diverse_file_names = current_diverse_files
             try:
                 logger.debug(f"Updating '{self.sync_meta_file}' file")
                 write_json_to_file(current_diverse_files, self.sync_meta_file, atomic=True)
@@ -344,6 +917,20 @@ class SyncDir:
                 # Meta file is not critical for the sync itself, in case we cannot write it, we just log a warning
                 logger.warning(f"Failed updating '{self.sync_meta_file}' file: {e}")
 
+    def _save_hash_cache(self):
+        if self.dry_run:
+            return
+
+        try:
+            logger.debug(f"Updating '{self.hash_cache_file}' file")
+            write_hash_cache(self._hash_cache_items(), self.hash_cache_file)
+        except Exception as e:
+            # Hash cache is an optimization only, in case we cannot write it, we just log a warning
+            logger.warning(f"Failed updating '{self.hash_cache_file}' file: {e}")
+
+    def _hash_cache_items(self):
+        return self.hash_cache
+
     def _handle_unique_remote_files(self):
         """
         Handles remote files (on Cloudinary servers) that do not exist in the local folder.
@@ -351,50 +938,103 @@ class SyncDir:
 
         :return: True if successful, otherwise False
         """
-        handled = self._handle_files_deletion(len(self.unique_remote_file_names), "remote")
+        # Renamed remote files are removed under their previous names as well.
+        handled = self._handle_files_deletion(len(self.unique_remote_file_names) + len(self.renamed_file_names),
+                                              "remote")
         if handled is not None:
             return handled
+        self.keep_renamed_sources = False
+
+        file_names_to_delete = set(self.unique_remote_file_names)
+        if self._has_upload_options():
+            # Renamed files are uploaded with the upload options, their previous remote files are deleted instead.
+            file_names_to_delete |= set(self.renamed_file_names.values())
+        if not file_names_to_delete:
+            return True
 
-        logger.info(f"Deleting {len(self.unique_remote_file_names)} resources "
+        logger.info(f"Deleting {len(file_names_to_delete)} resources "
                     f"from Cloudinary folder '{self.user_friendly_remote_dir}'")
-        files_to_delete_from_cloudinary = list(map(lambda x: self.remote_files[x], self.unique_remote_file_names))
+        files_to_delete_from_cloudinary = list(map(lambda x: self.remote_files[x], file_names_to_delete))
+        self._delete_remote_files(files_to_delete_from_cloudinary)
+
+        return True
 
+    def _delete_remote_files(self, files_to_delete_from_cloudinary):
         # We group files into batches by resource_type and type to reduce the number of API calls.
-        batches = groupby(files_to_delete_from_cloudinary, lambda file: (file["resource_type"], file["type"]))
-        for attrs, batch_iter in batches:
-            batch = [file["public_id"] for file in batch_iter]
+        batch_key = itemgetter("resource_type", "type")
+        deletions = []
+        for attrs, batch_iter in groupby(sorted(files_to_delete_from_cloudinary, key=batch_key), batch_key):
+            batch_asset_ids = {file["public_id"]: file["asset_id"] for file in batch_iter}
+            batch = list(batch_asset_ids.keys())
             logger.info("Deleting {} resources with resource_type '{}' and type '{}'".format(len(batch), *attrs))
 
             # Each batch is further chunked by a deletion batch size that can be specified by the user.
             for deletion_batch in chunker(batch, self.deletion_batch_size):
                 if self.dry_run:
                     logger.info(f"Dry run mode enabled. Would delete {len(deletion_batch)} resources:\n" +
-                                                "\n".join(deletion_batch))
+                                "\n".join(deletion_batch))
                     continue
-                res = call_api(api.delete_resources, deletion_batch, invalidate=True,
-                               resource_type=attrs[0], type=attrs[1])
-                num_deleted = Counter(res['deleted'].values())["deleted"]
-                if self.verbose:
-                    print_json(res)
-                if num_deleted != len(deletion_batch):
-                    # This should not happen in reality, unless some terrible race condition happens with the folder.
-                    failed = [f"{file}: {reason}" for file, reason in res['deleted'].items() if reason != "deleted"]
-                    logger.error("Failed deletes:\n{}".format("\n".join(failed)))
-                else:
-                    logger.info(style(f"Deleted {num_deleted} resources", fg="green"))
+                deletions.append((deletion_batch, attrs, batch_asset_ids))
+
+        if deletions:
+            throttle = RateLimitThrottle(reserve=max_workers(self.concurrent_workers))
+            run_tasks_concurrently(self._delete_remote_batch,
+                                   [(*deletion, throttle) for deletion in deletions],
+                                   min(max_workers(self.concurrent_workers), len(deletions)))
+
+        self._save_remote_manifest()
+
+    def _delete_remote_batch(self, deletion_batch, attrs, batch_asset_ids, throttle):
+        throttle.wait()
+        res = call_api(api.delete_resources, deletion_batch, invalidate=True, resource_type=attrs[0], type=attrs[1])
+        throttle.update(res)
+        num_deleted = Counter(res['deleted'].values())["deleted"]
+        if self.verbose:
+            print_json(res)
+        if self.remote_manifest is not None:
+            self._forget_remote_files(batch_asset_ids.get(public_id) for public_id, reason in
+                                      res['deleted'].items() if reason in ("deleted", "not_found"))
+        if num_deleted != len(deletion_batch):
+            # This should not happen in reality, unless some terrible race condition happens with the folder.
+            failed = [f"{file}: {reason}" for file, reason in res['deleted'].items() if reason != "deleted"]
+            logger.error("Failed deletes:\n{}".format("\n".join(failed)))
+        else:
+            logger.info(style(f"Deleted {num_deleted} resources", fg="green"))
 
-        return True
+    def _forget_remote_files(self, asset_ids):
+        for asset_id in asset_ids:
+            self.remote_manifest["assets"].pop(asset_id, None)
+
+    def _get_out_of_sync_file_names(self, common_file_names, local_files=None):
+        """
+        Compares the common files.
 
-    def _get_out_of_sync_file_names(self, common_file_names):
+        :param common_file_names:   The names of the files that exist on both sides.
+        :param local_files:         Optional dict of the common local files, by default they are self.local_files.
+        :return: set of the names of the out of sync files.
+        """
         logger.debug("\nCalculating differences...\n")
+        local_files = self.local_files if local_files is None else local_files
         out_of_sync_file_names = set()
+
+        # Files of different sizes are out of sync, only files of the same size need to be hashed and compared.
+        same_size_file_names = []
         for f in common_file_names:
-            local_etag = self.local_files[f]['etag']
+            local_size = local_files[f]['size']
+            remote_size = self.recovered_remote_files[f].get('bytes')
+            if remote_size is not None and local_size != remote_size:
+                self._log_out_of_sync_file(f, f"Local size: {local_size}. Remote size: {remote_size}")
+                out_of_sync_file_names.add(f)
+                continue
+            same_size_file_names.append(f)
+
+        self._populate_local_etags(same_size_file_names, local_files)
+
+        for f in same_size_file_names:
+            local_etag = local_files[f]['etag']
             remote_etag = self.recovered_remote_files[f]['etag']
             if local_etag != remote_etag:
-                logger.warning(f"'{f}' is out of sync" +
-                               (f" with '{self.diverse_file_names[f]}'" if f in self.diverse_file_names else ""))
-                logger.debug(f"Local etag: {local_etag}. Remote etag: {remote_etag}")
+                self._log_out_of_sync_file(f, f"Local etag: {local_etag}. Remote etag: {remote_etag}")
                 out_of_sync_file_names.add(f)
                 continue
             logger.debug(f"'{f}' is in sync" +
@@ -405,6 +1045,11 @@ class SyncDir:
 
         return out_of_sync_file_names
 
+    def _log_out_of_sync_file(self, f, details):
+        logger.warning(f"'{f}' is out of sync" +
+                       (f" with '{self.diverse_file_names[f]}'" if f in self.diverse_file_names else ""))
+        logger.debug(details)
+
     def _handle_unique_local_files(self):
         """
         Handles local files that do not exist on the Cloudinary server.
@@ -412,9 +1057,14 @@ class SyncDir:
 
         :return: True if successful, otherwise False
         """
-        handled = self._handle_files_deletion(len(self.unique_local_file_names), "local")
+        # Renamed local files are moved away from their previous names as well.
+        handled = self._handle_files_deletion(len(self.unique_local_file_names) + len(self.renamed_file_names),
+                                              "local")
         if handled is not None:
             return handled
+        self.keep_renamed_sources = False
+        if not self.unique_local_file_names:
+            return True
 
         logger.info(f"Deleting {len(self.unique_local_file_names)} local files...")
         for file in self.unique_local_file_names:
@@ -465,3 +1115,427 @@ class SyncDir:
         )
 
         return decision
+
+
+class PipelinedSyncDir(SyncDir):
+    """
+    Pushes the local folder subtree by subtree, each subtree as soon as it is listed.
+
+    The Cloudinary folder is listed by subtrees (the immediate subfolders and the assets directly in the folder) in
+    the background, while the local folder is walked. Each listed subtree is compared with its local files and its
+    files are queued for uploading, while the rest of the subtrees are still being listed, hashed and compared.
+    Local subtrees that do not exist in the Cloudinary folder are uploaded right away.
+
+    Renamed files are not detected, and remote files of deleted local files are handled once all the files are
+    uploaded. Incremental listing is not supported in this mode.
+    """
+
+    def _compare(self):
+        self.cld_folder_exists = cld_folder_exists(self.remote_dir)
+        if self.cld_folder_exists and self.remote_dir:
+            self.remote_subtree_names = set(list_cld_subtree_names(self.remote_dir))
+            shards = list(chunker(sorted(self.remote_subtree_names), _PIPELINE_SUBTREES_PER_SHARD))
+        else:
+            # The root folder cannot be listed by subtrees, it is listed as a whole.
+            self.remote_subtree_names = None
+            shards = [None]
+
+        # The listing starts right away, the listed subtrees are consumed by push.
+        self._listing_pool = pool.ThreadPool(max(1, min(self.listing_workers, len(shards))))
+        self._listed_subtrees = self._listing_pool.imap_unordered(self._list_subtrees, shards)
+
+        self._walk_local_dir()
+        self.diverse_file_names = self._read_sync_meta_file()
+        self.resumed_files = self._replay_journal() if self.resume else {}
+        self.renamed_file_names = {}
+        self._init_diff()
+
+    def push(self):
+        """
+        Pushes changes from the local folder to the Cloudinary folder.
+        """
+        if not self.local_folder_exists:
+            logger.error(f"Cannot push a non-existent local folder '{self.local_dir}'. Aborting...")
+            self._listing_pool.terminate()
+            return False
+
+        if self.dry_run:
+            logger.info("Dry run mode enabled. The following files would be uploaded:")
+            try:
+                for file_names in self._iter_subtree_files_to_push():
+                    for file in file_names:
+                        logger.info(f"{file}")
+            finally:
+                self._listing_pool.terminate()
+            return self._handle_unique_remote_files()
+
+        logger.info(f"Uploading items to Cloudinary folder '{self.user_friendly_remote_dir}' "
+                    f"in cloud '{cloudinary.config().cloud_name}' as they are listed")
+
+        options = self._upload_options()
+        upload_results = self._upload_results = {}
+        upload_errors = {}
+        self._upload_file_names = {}
+        completed = False
+        self.journal.open(append=self.resume)
+        try:
+            run_tasks_concurrently(upload_file, self._iter_upload_tasks(options, upload_results, upload_errors),
+                                   self.concurrent_workers)
+            completed = not upload_errors
+        finally:
+            self._listing_pool.terminate()
+            self.journal.close(remove=completed)
+            self._print_sync_status(len(upload_results), len(upload_errors))
+            self._save_sync_meta_file({**self._resumed_upload_results(), **upload_results})
+            self._save_hash_cache()
+
+        self._print_duplicate_file_names()
+        if upload_errors:
+            raise Exception("Sync did not finish successfully")
+
+        # Deletions wait for the whole folder to be listed, the number of files to delete is known only then.
+        if not self._handle_unique_remote_files():
+            logger.info("Aborting...")
+            return False
+
+    def _iter_upload_tasks(self, options, upload_results, upload_errors):
+        for file_names in self._iter_subtree_files_to_push():
+            for file in file_names:
+                file_path = self.local_files[file]['path']
+                folder_options = get_destination_folder_options(file, self.remote_dir, self.folder_mode)
+                self._upload_file_names[file_path] = file
+                yield file_path, {**options, **folder_options}, upload_results, upload_errors, self._on_file_uploaded
+
+    def _iter_subtree_files_to_push(self):
+        """
+        Compares the subtrees in the order they are listed.
+
+        :return: generator of sets of local file names to push, one per subtree.
+        """
+        local_subtrees = {}
+        for f in self.local_files.keys():
+            local_subtrees.setdefault(_subtree_name(self.diverse_file_names.get(f, f)), set()).add(f)
+
+        if self.remote_subtree_names is not None:
+            # Local subtrees that do not exist in the Cloudinary folder do not wait for the listing.
+            for subtree_name in local_subtrees.keys() - self.remote_subtree_names:
+                logger.debug(f"Subtree '{subtree_name}' does not exist in the Cloudinary folder")
+                yield self._diff(local_subtrees.pop(subtree_name), {})
+
+        for subtree_names, raw_remote_files in self._listed_subtrees:
+            if subtree_names is None:
+                subtree_names = list(local_subtrees.keys())
+            logger.debug(f"Listed {len(raw_remote_files)} items in subtrees: {', '.join(subtree_names)}")
+            yield self._diff(set().union(*(local_subtrees.pop(name, set()) for name in subtree_names)),
+                             raw_remote_files)
+
+    def _list_subtrees(self, subtree_names):
+        if subtree_names is not None:
+            return subtree_names, query_cld_subtrees(self.remote_dir, self.folder_mode, subtree_names, self.status)
+
+        if not self.cld_folder_exists:
+            return None, {}
+
+        return None, query_cld_folder(self.remote_dir, self.folder_mode, self.status,
+                                      listing_workers=self.listing_workers)
+
+
+class ExternalSyncDir(SyncDir):
+    """
+    Syncs folders too large to be compared in memory.
+
+    The local and the remote files are spilled to an on-disk store (see SyncDiffStore) and compared there.
+    The differences are streamed from the store in chunks and the files are transferred as they are found, with a
+    bounded number of pending transfers, so the memory usage does not depend on the number of files.
+
+    Renamed files are not detected, and incremental listing, resume and watch are not supported in this mode.
+    """
+
+    def _compare(self):
+        self.store = SyncDiffStore()
+        self.local_files = self.store.local_files
+        self.hash_cache = None
+        self.resumed_files = {}
+        self.renamed_file_names = {}
+        self.synced_files_count = 0
+
+        self.diverse_file_names = self._read_sync_meta_file()
+        inverted_diverse_file_names = invert_dict(self.diverse_file_names)
+
+        self.local_folder_exists = os.path.isdir(path.abspath(self.local_dir))
+        if not self.local_folder_exists:
+            logger.info(f"Local folder '{self.local_dir}' does not exist.")
+        else:
+            try:
+                self.store.add_hash_cache(iter_hash_cache(self.hash_cache_file))
+            except (OSError, ValueError) as e:
+                # The cache is an optimization only, when it cannot be read, all files are hashed.
+                logger.warning(f"Failed reading hash cache file '{self.hash_cache_file}': {e}")
+            self.store.add_local_files((f, self.diverse_file_names.get(f, f), full_path, signature)
+                                       for f, full_path, signature in iter_dir(path.abspath(self.local_dir),
+                                                                               self.include_hidden)
+                                       if not _is_internal_file(f))
+            num_local_files = self.store.count_local_files()
+            if num_local_files:
+                logger.info(f"Found {num_local_files} items in local folder '{self.local_dir}'")
+            else:
+                logger.info(f"Local folder '{self.local_dir}' is empty.")
+
+        self.cld_folder_exists = cld_folder_exists(self.remote_dir)
+        if not self.cld_folder_exists:
+            logger.info(f"Cloudinary folder '{self.user_friendly_remote_dir}' does not exist "
+                        f"({self.folder_mode} folder mode).")
+        else:
+            self.store.add_remote_files(iter_cld_folder(self.remote_dir, self.folder_mode, self.status),
+                                        inverted_diverse_file_names)
+            num_remote_files = self.store.count_remote_files()
+            if num_remote_files:
+                logger.info(f"Found {num_remote_files} items in Cloudinary folder '{self.user_friendly_remote_dir}' "
+                            f"({self.folder_mode} folder mode).")
+            else:
+                logger.info(f"Cloudinary folder '{self.user_friendly_remote_dir}' is empty. "
+                            f"({self.folder_mode} folder mode)")
+
+        self.store.create_indexes()
+
+        self.remote_duplicate_names = self.store.duplicate_remote_names()
+        self._print_duplicate_file_names()
+        if self.remote_duplicate_names:
+            # Only the remote files that might collide with the duplicates are loaded for normalizing their names.
+            remote_files = self.store.remote_files_by_base_names(self.remote_duplicate_names.keys())
+            self._normalize_remote_file_names(remote_files, self.local_files)
+            self.store.update_unique_names(remote_files.values(), inverted_diverse_file_names)
+
+    def push(self):
+        """
+        Pushes changes from the local folder to the Cloudinary folder.
+        """
+        if not self.local_folder_exists:
+            logger.error(f"Cannot push a non-existent local folder '{self.local_dir}'. Aborting...")
+            self.store.close()
+            return False
+
+        upload_count = 0
+        upload_errors = {}
+        try:
+            if not self._handle_unique_remote_files():
+                logger.info("Aborting...")
+                return False
+
+            if self.dry_run:
+                logger.info("Dry run mode enabled. The following files would be uploaded:")
+            else:
+                logger.info(f"Uploading items to Cloudinary folder '{self.user_friendly_remote_dir}' "
+                            f"in cloud '{cloudinary.config().cloud_name}'")
+
+            options = self._upload_options()
+            if self.dry_run:
+                for file, _ in self._iter_files_to_push():
+                    logger.info(f"{file}")
+                return True
+
+            # The files are uploaded as they are compared, the results are saved in chunks.
+            upload_results = {}
+            uploads = ((upload_file, local_file['path'],
+                        {**options, **get_destination_folder_options(file, self.remote_dir, self.folder_mode)},
+                        upload_errors) for file, local_file in self._iter_files_to_push())
+            for results in iter_tasks_concurrently(_transfer_file, uploads, self.concurrent_workers):
+                upload_results.update(results)
+                if len(upload_results) >= _EXTERNAL_DIFF_CHUNK_SIZE:
+                    upload_count += len(upload_results)
+                    self._save_sync_meta_file(upload_results)
+                    upload_results = {}
+            upload_count += len(upload_results)
+            self._save_sync_meta_file(upload_results)
+        finally:
+            self._close()
+
+        self._print_sync_status(upload_count, len(upload_errors))
+        if upload_errors:
+            raise Exception("Sync did not finish successfully")
+
+    def pull(self):
+        """
+        Pulls changes from the Cloudinary folder to the local folder.
+        """
+        if not self.cld_folder_exists:
+            logger.error(f"Cannot pull from a non-existent Cloudinary folder '{self.user_friendly_remote_dir}' "
+                         f"({self.folder_mode} folder mode). Aborting...")
+            self.store.close()
+            return False
+
+        download_count = 0
+        download_errors = {}
+        try:
+            if not self._handle_unique_local_files():
+                return False
+
+            if self.dry_run:
+                logger.info("Dry run mode enabled. The following files would be downloaded:")
+                for remote_file in self._iter_files_to_pull():
+                    logger.info(f"{remote_file['normalized_unique_path']}")
+                return True
+
+            logger.info(f"Downloading files from Cloudinary folder '{self.user_friendly_remote_dir}'")
+            makedirs(self.local_dir, exist_ok=True)
+            configure_http_pool(max_workers(self.concurrent_workers))
+
+            # The files are downloaded as they are compared.
+            downloads = ((download_file, remote_file,
+                          path.abspath(path.join(self.local_dir, remote_file['normalized_unique_path'])),
+                          download_errors, self._on_file_downloaded, self.ranged_download_threshold)
+                         for remote_file in self._iter_files_to_pull())
+            for results in iter_tasks_concurrently(_transfer_file, downloads, self.concurrent_workers):
+                download_count += len(results)
+        finally:
+            self._close()
+
+        self._print_sync_status(download_count, len(download_errors))
+        if download_errors:
+            raise Exception("Sync did not finish successfully")
+
+    def _iter_files_to_push(self):
+        yield from self.store.iter_unique_local_files()
+        for file, local_file, _ in self._iter_out_of_sync_files():
+            yield file, local_file
+
+    def _iter_files_to_pull(self):
+        # Out of sync files go first, downloaded files are added to the store and are not compared again.
+        for _, _, remote_file in self._iter_out_of_sync_files():
+            yield remote_file
+        yield from self.store.iter_unique_remote_files()
+
+    def _iter_out_of_sync_files(self):
+        """
+        Compares the common files chunk by chunk.
+
+        :return: generator of (name, local file, remote file) tuples of the out of sync files.
+        """
+        for common_files in iter_chunks(self.store.iter_common_files(), _EXTERNAL_DIFF_CHUNK_SIZE):
+            self.recovered_remote_files = {file: remote_file for file, _, remote_file in common_files}
+            # The local files come with the remote files from a single join, they are not looked up one by one.
+            local_files = {file: local_file for file, local_file, _ in common_files}
+            out_of_sync_file_names = self._get_out_of_sync_file_names(self.recovered_remote_files.keys(), local_files)
+            self.synced_files_count += len(common_files) - len(out_of_sync_file_names)
+            for file, local_file, remote_file in common_files:
+                if file in out_of_sync_file_names:
+                    yield file, local_file, remote_file
+
+        self.recovered_remote_files = {}
+
+    def _handle_unique_remote_files(self):
+        num_files = self.store.count_unique_remote_files()
+        handled = self._handle_files_deletion(num_files, "remote")
+        if handled is not None:
+            return handled
+
+        logger.info(f"Deleting {num_files} resources from Cloudinary folder '{self.user_friendly_remote_dir}'")
+        for files in iter_chunks(self.store.iter_unique_remote_files(), _EXTERNAL_DIFF_CHUNK_SIZE):
+            self._delete_remote_files(files)
+
+        return True
+
+    def _handle_unique_local_files(self):
+        num_files = self.store.count_unique_local_files()
+        handled = self._handle_files_deletion(num_files, "local")
+        if handled is not None:
+            return handled
+
+        logger.info(f"Deleting {num_files} local files...")
+        for files in iter_chunks(self.store.iter_unique_local_files(), _EXTERNAL_DIFF_CHUNK_SIZE):
+            for file, local_file in files:
+                full_path = path.abspath(local_file['path'])
+                if self.dry_run:
+                    logger.info(f"Dry run mode enabled. Would delete '{full_path}'")
+                    continue
+                remove(full_path)
+                logger.info(f"Deleted '{full_path}'")
+            if not self.dry_run:
+                self.store.remove_local_files(file for file, _ in files)
+
+        logger.info("Deleting empty folders...")
+        delete_empty_dirs(self.local_dir)
+
+        return True
+
+    def _on_file_downloaded(self, remote_file, local_path):
+        file = remote_file["normalized_unique_path"]
+        # download_file verified the content against the etag, no need to hash the file again
+        self.store.put_local_file(file, self.diverse_file_names.get(file, file), local_path,
+                                  file_signature(local_path), remote_file.get("etag") or None)
+
+    def _local_file_names_of(self, duplicate_names):
+        return self.store.local_file_names_by_base_names(duplicate_names)
+
+    def _populate_local_etags(self, file_names, local_files=None):
+        files = local_files if local_files is not None else {f: self.local_files[f] for f in file_names}
+        populate_etags(files, file_names, hash_workers=self.hash_workers)
+        self.store.set_etags((f, files[f]["etag"]) for f in file_names)
+
+    def _hash_cache_items(self):
+        return self.store.iter_hash_cache()
+
+    def _close(self):
+        self._save_hash_cache()
+        self.store.close()
+
+
+def _transfer_file(transfer_func, source, destination, failed, on_success=None, *args):
+    """
+    Runs upload_file or download_file with a results dict of its own, so that the results are collected by the thread
+    consuming the completed tasks.
+
+    :return: dict of the results of the transfer, empty when it failed.
+    """
+    results = {}
+    transfer_func(source, destination, results, failed, on_success, *args)
+    return results
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _internal_file_names(file_names):
+    """
+    Returns the sync bookkeeping files and the partial downloads, which are never synced themselves.
+
+    :param file_names: Local file names.
+    :return: list of internal file names.
+    """
+    return [f for f in file_names if _is_internal_file(f)]
+
+
+def _is_internal_file(file_name):
+    return file_name in _SYNC_INTERNAL_FILES or file_name.endswith((PARTIAL_DOWNLOAD_SUFFIX,
+                                                                   PARTIAL_DOWNLOAD_JOURNAL_SUFFIX))
+
+
+def _update_unique_path(remote_file, unique_path, unique_paths):
+    unique_paths[remote_file["normalized_unique_path"]] -= 1
+    unique_paths[unique_path] += 1
+    remote_file["normalized_unique_path"] = unique_path
+
+
+def _subtree_name(file_name):
+    return file_name.split("/", 1)[0] if "/" in file_name else ""
+
+
+def _file_state(local_file):
+    return local_file["size"], local_file["mtime_ns"]
+
+
+def _remote_manifest_watermark(remote_files):
+    """
+    Returns the timestamp of the latest change seen in the remote files, minus a safety margin.
+
+    :param remote_files: dict of asset ids to asset details.
+    :return: ISO 8601 timestamp for the search expression.
+    """
+    timestamps = [parse_timestamp(f["updated_at"]) for f in remote_files.values() if f.get("updated_at")]
+    watermark = max(timestamps) if timestamps else datetime.fromtimestamp(0, timezone.utc)
+
+    return (watermark - _REMOTE_MANIFEST_WATERMARK_MARGIN).strftime("%Y-%m-%dT%H:%M:%SZ")
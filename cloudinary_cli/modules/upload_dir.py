@@ -1,13 +1,26 @@
+import json
+import os
+import threading
+from hashlib import md5
 from os import getcwd
 from os.path import dirname, join as path_join
 from pathlib import Path
 
+import cloudinary
 from click import command, argument, option, style, launch, Choice
 
 from cloudinary_cli.utils.api_utils import upload_file, get_default_upload_options, get_folder_mode, \
-    get_destination_folder_options
-from cloudinary_cli.utils.file_utils import get_destination_folder, is_hidden_path
-from cloudinary_cli.utils.utils import parse_option_value, logger, run_tasks_concurrently, group_params
+    get_destination_folder_options, query_cld_etags, asset_source
+from cloudinary_cli.utils.file_utils import get_destination_folder, is_hidden_path, posix_rel_path, hash_files
+from cloudinary_cli.utils.concurrency_utils import CONCURRENCY, max_workers
+from cloudinary_cli.utils.http_utils import configure_sdk_pool
+from cloudinary_cli.utils.journal_utils import Journal
+from cloudinary_cli.utils.utils import parse_option_value, logger, run_tasks_concurrently, group_params, iter_chunks
+
+_UPLOAD_MANIFEST_FILE = '.cld-upload-manifest'
+_DEFAULT_HASH_WORKERS = os.cpu_count() or 1
+# Files are hashed and looked up in the cloud in batches (see query_cld_etags).
+_DEDUPE_BATCH_SIZE = 100
 
 
 @command("upload_dir", help="""Upload a folder of assets, maintaining the folder structure.""")
@@ -31,10 +44,20 @@ from cloudinary_cli.utils.utils import parse_option_value, logger, run_tasks_con
 @option("-e", "--exclude-dir-name", is_flag=True, default=False,
         help="When this option is used, the contents of the parent directory are uploaded but not the parent "
              "directory itself.")
-@option("-w", "--concurrent_workers", type=int, default=30, help="Specify the number of concurrent network threads.")
+@option("-w", "--concurrent_workers", type=CONCURRENCY, default=30,
+        help="Specify the number of concurrent network threads, "
+             "or 'auto' to adapt it to the observed latency, errors and rate limits.")
+@option("-i", "--incremental", is_flag=True,
+        help="Skip the files uploaded by a previous incremental run to the same folder, unless modified since. "
+             f"The uploaded files are recorded in the {_UPLOAD_MANIFEST_FILE} file in the directory.")
+@option("-D", "--dedupe", is_flag=True,
+        help="Skip the files whose content already exists anywhere in the cloud, reporting the existing assets.")
+@option("-hw", "--hash-workers", type=int, default=_DEFAULT_HASH_WORKERS,
+        help="Specify the number of threads used for hashing files when using --dedupe.")
 @option("-d", "--doc", is_flag=True, help="Open upload_dir command documentation page.")
 def upload_dir(directory, glob_pattern, include_hidden, optional_parameter, optional_parameter_parsed, transformation,
-               folder, folder_mode, preset, concurrent_workers, exclude_dir_name, doc):
+               folder, folder_mode, preset, concurrent_workers, exclude_dir_name, incremental, dedupe, hash_workers,
+               doc):
     items, skipped = {}, {}
 
     if doc:
@@ -69,22 +92,162 @@ def upload_dir(directory, glob_pattern, include_hidden, optional_parameter, opti
         **group_params(optional_parameter, ((k, parse_option_value(v)) for k, v in optional_parameter_parsed)),
     }
 
-    uploads = []
-
-    for file_path in dir_to_upload.glob(glob_pattern):
-        if file_path.is_file():
-            if not include_hidden and is_hidden_path(file_path):
-                continue
-
-            folder_options = get_destination_folder_options(str(file_path), folder, folder_mode, parent)
-            uploads.append((file_path, {**options, **folder_options}, items, skipped))
-
-    run_tasks_concurrently(upload_file, uploads, concurrent_workers)
+    file_paths = (file_path for file_path in dir_to_upload.glob(glob_pattern)
+                  if file_path.is_file() and (include_hidden or not is_hidden_path(file_path))
+                  and file_path.name != _UPLOAD_MANIFEST_FILE)
+
+    manifest = None
+    if incremental:
+        manifest = UploadManifest(dir_to_upload, {"cloud_name": cloudinary.config().cloud_name, "folder": folder,
+                                                  "folder_mode": folder_mode, "exclude_dir_name": exclude_dir_name,
+                                                  "upload_options": _options_hash(options)})
+        file_paths = (file_path for file_path in file_paths if not manifest.is_unchanged(file_path))
+
+    duplicates = {}
+    if dedupe:
+        file_paths = _skip_existing_content(file_paths, hash_workers, duplicates)
+
+    # Files are uploaded as they are found, while the directory is still being walked.
+    uploads = ((file_path, {**options, **get_destination_folder_options(str(file_path), folder, folder_mode, parent)},
+                items, skipped, manifest.record if manifest else None)
+               for file_path in file_paths)
+
+    configure_sdk_pool(max_workers(concurrent_workers))
+    if manifest:
+        manifest.open()
+    try:
+        run_tasks_concurrently(upload_file, uploads, concurrent_workers)
+    finally:
+        if manifest:
+            manifest.close()
 
     logger.info(style("{} resources uploaded".format(len(items)), fg="green"))
+    if manifest and manifest.unchanged_count:
+        logger.info(f"{manifest.unchanged_count} unchanged files skipped")
+    if duplicates:
+        logger.info(f"{len(duplicates)} files skipped, their content already exists in the cloud")
 
     if skipped:
         logger.warning("{} items skipped".format(len(skipped)))
         return False
 
     return True
+
+
+def _options_hash(options):
+    """
+    Hashes the upload options, so that changing them (preset, transformation, -o/-O) invalidates the upload manifest.
+
+    :param options: The upload options.
+    :return: The MD5 hex digest of the options.
+    """
+    return md5(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _skip_existing_content(file_paths, hash_workers, duplicates):
+    """
+    Filters out the files whose content already exists in the cloud.
+
+    The files are hashed in batches, using concurrent threads, and each batch of etags is looked up with a single
+    search.
+
+    :param file_paths:      iterable of file paths.
+    :param hash_workers:    The number of threads used for hashing files.
+    :param duplicates:      dict, updated with the skipped files and the public IDs of the existing assets.
+    :return: generator of the file paths to upload.
+    """
+    for file_paths_batch in iter_chunks(file_paths, _DEDUPE_BATCH_SIZE):
+        etags = hash_files([str(file_path) for file_path in file_paths_batch], hash_workers)
+        existing_assets = query_cld_etags(etags)
+        for file_path, file_etag in zip(file_paths_batch, etags):
+            asset = existing_assets.get(file_etag)
+            if asset is None:
+                yield file_path
+                continue
+
+            duplicates[file_path] = asset['public_id']
+            logger.info(f"Skipping {file_path}, its content already exists as {asset_source(asset)} "
+                        f"({asset['resource_type']}/{asset['type']})")
+
+
+class UploadManifest:
+    """
+    Manifest of the files uploaded from a directory, used for skipping the unchanged files on the next upload.
+
+    The manifest is a journal (see Journal) in the directory, with an entry per uploaded file: the relative path, the
+    size and the modification time of the file, and the etag, the public ID and the version of the upload. Each
+    entry is recorded as soon as the file is uploaded, so an interrupted upload is continued by the next run.
+
+    A file is unchanged when its size and modification time match its entry, so the files are not hashed.
+    """
+
+    def __init__(self, directory, header):
+        """
+        :param directory:   The uploaded directory.
+        :param header:      dict that identifies the upload destination, the manifest of another destination is ignored.
+        """
+        self.directory = directory
+        self.journal = Journal(path_join(directory, _UPLOAD_MANIFEST_FILE), header)
+        self.entries = {}
+        self.unchanged_count = 0
+        self._superseded_count = 0
+        self._file_stats = {}
+        self._lock = threading.Lock()
+
+        for entry in self.journal.replay():
+            if entry["path"] in self.entries:
+                self._superseded_count += 1
+            self.entries[entry["path"]] = entry
+
+    def is_unchanged(self, file_path):
+        """
+        Checks whether the file is unchanged since it was uploaded.
+
+        :param file_path: The path of the file.
+        :return: True when the file is unchanged.
+        """
+        file_stat = file_path.stat()
+        entry = self.entries.get(self._rel_path(file_path))
+        if entry and entry["size"] == file_stat.st_size and entry["mtime_ns"] == file_stat.st_mtime_ns:
+            self.unchanged_count += 1
+            return True
+
+        # The file is recorded as it was before the upload, a modification during the upload is uploaded next time.
+        with self._lock:
+            self._file_stats[file_path] = file_stat
+        return False
+
+    def open(self):
+        self.journal.open(append=True)
+
+    def record(self, file_path, result):
+        """
+        Records the uploaded file, upload_file callback. Thread-safe.
+
+        :param file_path:   The path of the file.
+        :param result:      The upload result.
+        """
+        if "batch_id" in result:
+            return  # an asynchronous upload is not known to succeed
+
+        with self._lock:
+            file_stat = self._file_stats.pop(file_path)
+            rel_path = self._rel_path(file_path)
+            if rel_path in self.entries:
+                self._superseded_count += 1
+            entry = self.entries[rel_path] = {
+                "path": rel_path, "size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns,
+                "etag": result.get("etag"), "public_id": result.get("public_id"), "version": result.get("version")}
+
+        self.journal.record(entry)
+
+    def close(self):
+        """
+        Closes the manifest, dropping the superseded entries of the modified files.
+        """
+        self.journal.close()
+        if self._superseded_count:
+            self.journal.rewrite(self.entries.values())
+
+    def _rel_path(self, file_path):
+        return posix_rel_path(str(file_path), str(self.directory))
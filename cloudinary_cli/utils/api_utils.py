@@ -1,4 +1,11 @@
+import calendar
 import logging
+import os
+import sys
+import threading
+import time
+from hashlib import md5
+from multiprocessing import pool
 from os import path, makedirs
 
 import cloudinary
@@ -6,20 +13,53 @@ import requests
 from click import style, launch
 from cloudinary import Search, SearchFolders, uploader, api
 from cloudinary.exceptions import AuthorizationRequired
-from cloudinary.utils import cloudinary_url
+from cloudinary.utils import cloudinary_url, random_public_id
 
 from cloudinary_cli.defaults import logger
+from cloudinary_cli.utils.concurrency_utils import report_congestion, report_task_size
 from cloudinary_cli.utils.config_utils import is_valid_cloudinary_config, user_config_names
 from cloudinary_cli.utils.file_utils import (normalize_file_extension, posix_rel_path, get_destination_folder,
-                                             populate_duplicate_name)
+                                             populate_duplicate_name, atomic_write)
+from cloudinary_cli.utils.http_utils import http_get
+from cloudinary_cli.utils.journal_utils import Journal
+from cloudinary_cli.utils.retry_utils import call_with_retries, call_non_idempotent_with_retries, \
+    parse_retry_after
 from cloudinary_cli.utils.json_utils import print_json, write_json_to_file
 from cloudinary_cli.utils.utils import log_exception, confirm_action, get_command_params, merge_responses, \
-    normalize_list_params, ConfigurationError, print_api_help, duplicate_values, should_dump_responses
+    normalize_list_params, ConfigurationError, print_api_help, duplicate_values, should_dump_responses, chunker, \
+    parse_timestamp, etag, Record
 import re
 from cloudinary.utils import is_remote_url
 
 PAGINATION_MAX_RESULTS = 500
 
+RESOURCE_TYPES = ("image", "video", "raw")
+
+# Assets are looked up by content in batches of etags, OR-ed in a single search expression.
+_ETAGS_PER_SEARCH = 100
+
+# Sharded folder listing: aim for a few shards per worker for balance, but keep the search expressions short.
+_SHARDS_PER_WORKER = 4
+_MAX_SUBFOLDERS_PER_SHARD = 20
+
+# Downloads are streamed to the disk in chunks, so memory usage does not depend on the asset size.
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Large files are downloaded in ranges of this size, using a few concurrent connections per file.
+_DOWNLOAD_RANGE_SIZE = 16 * 1024 * 1024
+_DOWNLOAD_RANGE_WORKERS = 4
+
+# Files larger than the chunk size (the "chunk_size" upload option, 20 MB by default) are uploaded in chunks, using a
+# few concurrent connections per file. The number of chunks read into memory at once is capped across all the files.
+_UPLOAD_CHUNK_WORKERS = 4
+_MAX_CONCURRENT_UPLOAD_CHUNKS = 16
+_upload_chunk_slots = threading.BoundedSemaphore(_MAX_CONCURRENT_UPLOAD_CHUNKS)
+
+PARTIAL_DOWNLOAD_SUFFIX = ".cld-part"
+PARTIAL_DOWNLOAD_JOURNAL_SUFFIX = ".cld-part-journal"
+
+# Adaptive concurrency backs off once less than this share of the Admin API rate limit remains.
+_RATE_LIMIT_LOW_RATIO = 0.1
+
 _cursor_fields = {"resource": "derived_next_cursor"}
 
 # Selector-style destructive bulk Admin API methods.
@@ -40,6 +80,19 @@ PUBLIC_API_METHODS = {
     "provisioning": {"create_agent_account"},
 }
 
+# API methods that are not retried on transient errors, since a failed call might still have been carried out.
+NON_RETRYABLE_API_METHODS = {"create_agent_account"}
+
+# Idempotent API methods: carrying them out twice has the same effect as once, so they are retried after any transient
+# error, including the failures that might happen after the request was carried out. Reads (including the Search API
+# execute), deletions and updates. Other methods (create, add, rename...) are retried on rate limits and server errors
+# only. Uploads are idempotent when the public ID is set, see _is_idempotent_upload.
+IDEMPOTENT_API_METHOD_PREFIXES = ("resource", "root_folders", "subfolders", "tags", "transformation", "upload_preset",
+                                  "upload_mapping", "list_", "get_", "metadata_field_by_field_id", "triggers",
+                                  "notifications", "usage", "ping", "config", "visual_search", "execute",
+                                  "delete_", "destroy", "remove_", "update")
+UPLOAD_API_METHODS = {"upload", "upload_image", "upload_resource", "unsigned_upload"}
+
 
 def is_public_api_method(api_name, method_name):
     return method_name in PUBLIC_API_METHODS.get(api_name, set())
@@ -63,16 +116,151 @@ def confirm_destructive_bulk_api_method(api_name, method_name, force=False):
     return True
 
 
-def query_cld_folder(folder, folder_mode, status=None):
+def query_cld_folder(folder, folder_mode, status=None, updated_since=None, listing_workers=1):
+    """
+    Lists all assets in the Cloudinary folder (recursively).
+
+    :param folder:          The Cloudinary folder.
+    :param folder_mode:     The folder mode of the cloud, "fixed" or "dynamic".
+    :param status:          Optional asset status filter: "all", "active" or "pending".
+    :param updated_since:   Optional ISO 8601 timestamp, when specified only assets uploaded or updated after it
+                            are listed.
+    :param listing_workers: The number of concurrent search requests. When greater than 1, the folder is split into
+                            disjoint shards (see _folder_shards) that are listed concurrently.
+    :return: dict of asset ids to asset details.
+    """
+    folder = folder.strip('/')  # omit redundant leading slash and duplicate trailing slashes in query
+    folder_key = "asset_folder" if folder_mode == "dynamic" else "folder"
+    filter_query = _filter_query(status, updated_since)
+
+    if listing_workers <= 1:
+        return _query_cld_expression(_folder_expression(folder, folder_key) + filter_query, folder, folder_mode)
+
+    expressions = [f"{shard}{filter_query}"
+                   for shard in _folder_shards(folder, folder_key, listing_workers)]
+    logger.debug(f"Listing {len(expressions)} shards of folder '{folder}' using {listing_workers} threads")
+
     files = {}
+    with pool.ThreadPool(min(listing_workers, len(expressions))) as thread_pool:
+        for shard_files in thread_pool.imap_unordered(
+                lambda expression: _query_cld_expression(expression, folder, folder_mode), expressions):
+            files.update(shard_files)
 
-    folder = folder.strip('/')  # omit redundant leading slash and duplicate trailing slashes in query
+    return files
+
+
+def iter_cld_folder(folder, folder_mode, status=None):
+    """
+    Lists all assets in the Cloudinary folder (recursively) page by page, without keeping them in memory.
+
+    :param folder:      The Cloudinary folder.
+    :param folder_mode: The folder mode of the cloud, "fixed" or "dynamic".
+    :param status:      Optional asset status filter: "all", "active" or "pending".
+    :return: generator of asset details, as returned by query_cld_folder.
+    """
+    folder = folder.strip('/')
     folder_key = "asset_folder" if folder_mode == "dynamic" else "folder"
+    return _iter_cld_expression(_folder_expression(folder, folder_key) + _filter_query(status), folder, folder_mode)
+
+
+def _folder_expression(folder, folder_key):
     folder_query = f"{folder}/*" if folder else "*"
+    return f"{folder_key}:\"{folder_query}\""
+
+
+def _filter_query(status=None, updated_since=None):
     status_value = "(active OR pending)" if status == "all" else status
     status_query = f" AND status:{status_value}" if status_value else ""
+    updated_query = f" AND (uploaded_at>\"{updated_since}\" OR last_updated.updated_at>\"{updated_since}\")" \
+        if updated_since else ""
+    return status_query + updated_query
+
+
+def _folder_shards(folder, folder_key, listing_workers):
+    """
+    Splits the folder into disjoint search expressions that together match all assets in the folder.
 
-    search = Search().expression(f"{folder_key}:\"{folder_query}\"{status_query}").with_field("image_analysis").max_results(500)
+    The assets directly in the folder form one shard and the immediate subfolders (recursively) form the rest.
+    Subfolders are grouped, so a folder with thousands of subfolders does not turn into thousands of requests.
+    When there are fewer shards than workers, each shard is further split by resource type.
+
+    :param folder:          The Cloudinary folder.
+    :param folder_key:      The search field of the folder ("folder" or "asset_folder").
+    :param listing_workers: The number of concurrent search requests.
+    :return: list of search expressions.
+    """
+    if not folder:
+        # Root assets cannot be matched separately from the subfolders, split by resource type only.
+        shards = [f"{folder_key}:\"*\""]
+    else:
+        subfolders = _list_subfolders(folder)
+        group_size = max(1, -(-len(subfolders) // (listing_workers * _SHARDS_PER_WORKER)))
+        shards = [f"{folder_key}=\"{folder}\""] + [
+            "(" + " OR ".join(f"{folder_key}:\"{subfolder}/*\"" for subfolder in group) + ")"
+            for group in chunker(subfolders, min(group_size, _MAX_SUBFOLDERS_PER_SHARD))]
+
+    if len(shards) < listing_workers:
+        shards = [f"{shard} AND resource_type:{resource_type}" for shard in shards for resource_type in RESOURCE_TYPES]
+
+    return shards
+
+
+def query_cld_subtrees(folder, folder_mode, subtree_names, status=None):
+    """
+    Lists the assets of the subtrees of the Cloudinary folder.
+
+    :param folder:          The Cloudinary folder.
+    :param folder_mode:     The folder mode of the cloud, "fixed" or "dynamic".
+    :param subtree_names:   The names of the immediate subfolders to list (recursively), "" stands for the assets
+                            directly in the folder.
+    :param status:          Optional asset status filter: "all", "active" or "pending".
+    :return: dict of asset ids to asset details, as returned by query_cld_folder.
+    """
+    folder = folder.strip('/')
+    folder_key = "asset_folder" if folder_mode == "dynamic" else "folder"
+    subtree_queries = [f"{folder_key}=\"{folder}\"" if not name else f"{folder_key}:\"{folder}/{name}/*\""
+                       for name in subtree_names]
+    return _query_cld_expression("(" + " OR ".join(subtree_queries) + ")" + _filter_query(status), folder,
+                                 folder_mode)
+
+
+def list_cld_subtree_names(folder):
+    """
+    Lists the names of the subtrees of the Cloudinary folder, see query_cld_subtrees.
+
+    :param folder: The Cloudinary folder.
+    :return: list of the immediate subfolder names, and "" for the assets directly in the folder.
+    """
+    folder = folder.strip('/')
+    return [""] + [posix_rel_path(subfolder, folder) for subfolder in _list_subfolders(folder)]
+
+
+def _list_subfolders(folder):
+    subfolders = []
+    next_cursor = None
+    while True:
+        res = call_api(api.subfolders, folder, max_results=PAGINATION_MAX_RESULTS, next_cursor=next_cursor)
+        subfolders += [f['path'] for f in res.get('folders', [])]
+        next_cursor = res.get('next_cursor')
+        if not next_cursor:
+            return subfolders
+
+
+class RemoteFile(Record):
+    """
+    Remote file details used for syncing, as returned by query_cld_folder.
+    """
+    __slots__ = ("asset_id", "normalized_path", "normalized_unique_path", "type", "resource_type", "public_id",
+                 "format", "etag", "bytes", "relative_path", "access_mode", "created_at", "updated_at")
+
+
+def _query_cld_expression(expression, folder, folder_mode):
+    return {remote_file['asset_id']: remote_file
+            for remote_file in _iter_cld_expression(expression, folder, folder_mode)}
+
+
+def _iter_cld_expression(expression, folder, folder_mode):
+    search = Search().expression(expression).with_field("image_analysis").max_results(PAGINATION_MAX_RESULTS)
 
     logger.debug(f"Search expression: {search.to_json()}")
 
@@ -85,28 +273,59 @@ def query_cld_folder(folder, folder_mode, status=None):
             rel_display_path = _relative_display_path(asset, folder)
             path_key = rel_display_path if folder_mode == "dynamic" else rel_path
             normalized_path_key = normalize_file_extension(path_key)
-            files[asset["asset_id"]] = {
-                "asset_id": asset['asset_id'],
-                "normalized_path": normalized_path_key,
-                "normalized_unique_path": normalized_path_key,
-                "type": asset['type'],
-                "resource_type": asset['resource_type'],
-                "public_id": asset['public_id'],
-                "format": asset['format'],
-                "etag": asset.get('etag', '0'),
-                "relative_path": rel_path,  # save for inner use
-                "access_mode": asset.get('access_mode', 'public'),
-                "created_at": asset.get('created_at'),
-                # dynamic folder mode fields
-                "asset_folder": asset.get('asset_folder'),
-                "display_name": asset.get('display_name'),
-                "relative_display_path": rel_display_path
-            }
+            # Values shared by many assets are interned, so all the records reference a single copy.
+            yield RemoteFile(
+                asset_id=asset['asset_id'],
+                normalized_path=normalized_path_key,
+                normalized_unique_path=normalized_path_key,
+                type=sys.intern(asset['type']),
+                resource_type=sys.intern(asset['resource_type']),
+                public_id=asset['public_id'],
+                format=sys.intern(asset['format']),
+                etag=asset.get('etag'),  # None when unknown, then the downloads are not verified
+                bytes=asset.get('bytes'),
+                relative_path=rel_path,  # save for inner use
+                access_mode=sys.intern(asset.get('access_mode', 'public')),
+                created_at=asset.get('created_at'),
+                updated_at=(asset.get('last_updated') or {}).get('updated_at') or asset.get('uploaded_at'),
+            )
         # use := when switch to python 3.8
         next_cursor = res.get('next_cursor')
         search.next_cursor(next_cursor)
 
-    return files
+
+def query_cld_etags(etags):
+    """
+    Looks up the assets with the given content in the whole cloud.
+
+    :param etags: iterable of etags (MD5 hashes of the content).
+    :return: dict of etags to the details of an asset with that content (public_id, resource_type, type, format).
+    """
+    assets = {}
+    for asset in iter_cld_assets_by_etags(etags):
+        assets.setdefault(asset['etag'], asset)
+
+    return assets
+
+
+def iter_cld_assets_by_etags(etags, **options):
+    """
+    Finds all the assets with the given content, searching a batch of etags per request.
+
+    :param etags:   iterable of etags (MD5 hashes of the content).
+    :param options: The API options, for example the credentials of another product environment.
+    :return: generator of the details of the assets (public_id, etag, resource_type, type, format).
+    """
+    for etag_batch in chunker(sorted(set(etags)), _ETAGS_PER_SEARCH):
+        search = Search().expression(" OR ".join(f"etag={etag}" for etag in etag_batch)) \
+            .fields(["public_id", "etag", "resource_type", "type", "format"]).max_results(PAGINATION_MAX_RESULTS)
+
+        next_cursor = True
+        while next_cursor:
+            res = call_api(search.execute, **options)
+            yield from res['resources']
+            next_cursor = res.get('next_cursor')
+            search.next_cursor(next_cursor)
 
 
 def cld_folder_exists(folder):
@@ -166,18 +385,19 @@ def regen_derived_version(public_id, delivery_type, res_type,
         log_exception(e, error_msg)
 
 
-def upload_file(file_path, options, uploaded=None, failed=None):
+def upload_file(file_path, options, uploaded=None, failed=None, on_success=None):
     uploaded = uploaded if uploaded is not None else {}
     failed = failed if failed is not None else {}
     verbose = should_dump_responses()
 
     try:
         size = 0 if is_remote_url(file_path) else path.getsize(file_path)
-        # Fresh options copy: upload_large mutates it (sets public_id), so a retry stays independent.
-        if size > 20000000:
-            # upload_large recovers from a token 401 per chunk (SDK oauth_token_refresh_callback),
-            # resuming the upload; a whole-file retry here would restart from byte 0.
-            result = uploader.upload_large(file_path, **dict(options))
+        if size:
+            report_task_size(size)
+        # Raw optional parameters (-o) are strings.
+        chunk_size = int(options.get("chunk_size") or uploader.UPLOAD_LARGE_CHUNK_SIZE)
+        if size > chunk_size:
+            result = _upload_chunks(file_path, size, chunk_size, options)
         else:
             result = call_api(uploader.upload, file_path, **dict(options))
         disp_path = _display_path(result)
@@ -192,11 +412,97 @@ def upload_file(file_path, options, uploaded=None, failed=None):
         if verbose:
             print_json(result)
         uploaded[file_path] = {"path": asset_source(result), "display_path": disp_path}
+        if on_success is not None:
+            on_success(file_path, result)
     except Exception as e:
         log_exception(e, f"Failed uploading {file_path}")
         failed[file_path] = str(e)
 
 
+def _upload_chunks(file_path, size, chunk_size, options):
+    """
+    Uploads the file in chunks sharing a unique upload ID, uploading several chunks concurrently.
+
+    The first chunk is uploaded alone, since its response determines the public ID of the rest, as in
+    uploader.upload_large. The last chunk, which completes the upload, is uploaded once all the others are uploaded.
+    Each chunk is an API call of its own: it recovers from an OAuth 401 and is retried on transient errors without
+    restarting the upload. Like a single upload, an upload without a set public ID is not retried on failures that
+    might happen after the chunk was carried out (see call_api).
+
+    :param file_path:   The path of the file, str or Path.
+    :param size:        The size of the file.
+    :param chunk_size:  The size of the chunks.
+    :param options:     The upload options.
+    :return: The upload result.
+    """
+    upload_id = random_public_id()
+    options = {key: value for key, value in options.items() if key != "chunk_size"}
+    # The file name of the multipart field, which must be a str, as in uploader.upload_large.
+    file_name = options.get("filename", str(file_path))
+    offsets = range(0, size, chunk_size)
+    retrying = call_with_retries if _is_idempotent_upload(options) else call_non_idempotent_with_retries
+
+    def upload_chunk(offset, chunk_options):
+        end = min(offset + chunk_size, size)
+        headers = {"Content-Range": f"bytes {offset}-{end - 1}/{size}", "X-Unique-Upload-Id": upload_id}
+        with _upload_chunk_slots:
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(end - offset)
+            # Not through call_api, which would log the content of the chunk on failure.
+            return retrying(_call_api, uploader.upload_large_part, ((file_name, chunk),),
+                            dict(chunk_options, http_headers=headers))
+
+    result = upload_chunk(offsets[0], options)
+    if len(offsets) == 1:
+        return result
+
+    options["public_id"] = result.get("public_id")
+    middle_offsets = offsets[1:-1]
+    if middle_offsets:
+        with pool.ThreadPool(min(_UPLOAD_CHUNK_WORKERS, len(middle_offsets))) as thread_pool:
+            thread_pool.map(lambda offset: upload_chunk(offset, options), middle_offsets)
+
+    return upload_chunk(offsets[-1], options)
+
+
+def rename_asset(remote_file, file_path, folder_options, folder_mode, renamed=None, failed=None):
+    """
+    Renames (moves) the remote file to match the name of the local file, without uploading it again.
+
+    In fixed folder mode the public ID is renamed, in dynamic folder mode the asset folder and the display name are
+    updated.
+
+    :param remote_file:     The remote file details, as returned by query_cld_folder.
+    :param file_path:       The path of the local file.
+    :param folder_options:  The destination folder options, see get_destination_folder_options.
+    :param folder_mode:     The folder mode.
+    :param renamed:         Optional dict, updated with the renamed files, in the same format as upload_file.
+    :param failed:          Optional dict, updated with the failed renames.
+    """
+    renamed = renamed if renamed is not None else {}
+    failed = failed if failed is not None else {}
+    file_name, _ = path.splitext(path.basename(file_path))
+
+    try:
+        if folder_mode == "dynamic":
+            result = call_api(api.update, remote_file['public_id'], resource_type=remote_file['resource_type'],
+                              type=remote_file['type'], display_name=file_name, **folder_options)
+        else:
+            if remote_file['resource_type'] == "raw":
+                file_name = path.basename(file_path)
+            to_public_id = "/".join(filter(None, [folder_options['folder'], file_name]))
+            result = call_api(uploader.rename, remote_file['public_id'], to_public_id,
+                              resource_type=remote_file['resource_type'], type=remote_file['type'], invalidate=True)
+        disp_path = _display_path(result)
+        logger.info(style(f"Renamed {remote_file['relative_path']} to match {file_path} as "
+                          f"{disp_path or result['public_id']}", fg="green"))
+        renamed[file_path] = {"path": asset_source(result), "display_path": disp_path}
+    except Exception as e:
+        log_exception(e, f"Failed renaming {remote_file['relative_path']} to match {file_path}")
+        failed[file_path] = str(e)
+
+
 def get_default_upload_options(folder_mode):
     options = {
         'resource_type': 'auto'
@@ -228,10 +534,25 @@ def get_destination_folder_options(file, remote_dir, folder_mode, parent=None):
     return {"folder": destination_folder}
 
 
-def download_file(remote_file, local_path, downloaded=None, failed=None):
+def download_file(remote_file, local_path, downloaded=None, failed=None, on_success=None,
+                  ranged_download_threshold=None):
+    """
+    Downloads the remote file to the local path.
+
+    The content is verified against the remote etag and replaces the local file only once fully downloaded.
+
+    :param remote_file:                 The remote file details, as returned by query_cld_folder.
+    :param local_path:                  The local path.
+    :param downloaded:                  Optional dict, updated with the downloaded files.
+    :param failed:                      Optional dict, updated with the failed downloads.
+    :param on_success:                  Optional callback, called with the remote file and the local path.
+    :param ranged_download_threshold:   Files larger than this number of bytes are downloaded in concurrent ranges.
+    """
     downloaded = downloaded if downloaded is not None else {}
     failed = failed if failed is not None else {}
     makedirs(path.dirname(local_path), exist_ok=True)
+    if remote_file.get('bytes'):
+        report_task_size(remote_file['bytes'])
 
     if remote_file['type'] in ("private", "authenticated") or remote_file['access_mode'] == "authenticated":
         sign_url = True
@@ -241,24 +562,157 @@ def download_file(remote_file, local_path, downloaded=None, failed=None):
     download_url = cloudinary_url(asset_source(remote_file), resource_type=remote_file['resource_type'],
                                   type=remote_file['type'], sign_url=sign_url)[0]
 
-    result = requests.get(download_url)
-
-    if result.status_code != 200:
-        err = result.headers.get('x-cld-error')
-        msg = f"Failed downloading: {download_url}, status code: {result.status_code}, " \
-              f"details: {err}"
-        logger.error(msg)
-        failed[download_url] = err
+    try:
+        if ranged_download_threshold and (remote_file.get('bytes') or 0) > ranged_download_threshold:
+            _download_ranges(download_url, remote_file, local_path)
+        else:
+            call_with_retries(_download, download_url, remote_file, local_path)
+    except (requests.RequestException, DownloadError) as e:
+        log_exception(e, f"Failed downloading: {download_url}")
+        failed[download_url] = str(e)
         return
 
-    with open(local_path, "wb") as f:
-        f.write(result.content)
+    # The local file gets the modification time of the remote file, instead of the time of the download.
+    modified_at = remote_file.get('updated_at') or remote_file.get('created_at')
+    if modified_at:
+        mtime_ns = int(parse_timestamp(modified_at).timestamp()) * 1_000_000_000
+        os.utime(local_path, ns=(mtime_ns, mtime_ns))
 
     downloaded[remote_file['relative_path']] = local_path
+    if on_success is not None:
+        on_success(remote_file, local_path)
 
     logger.info(style("Downloaded '{}' to '{}'".format(remote_file['relative_path'], local_path), fg="green"))
 
 
+class DownloadError(Exception):
+    def __init__(self, message, status_code=None, retry_after=None):
+        """
+        :param message:     The error message.
+        :param status_code: The HTTP status code of the failed request, if any.
+        :param retry_after: The number of seconds to wait before retrying, as requested by the server.
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RangeNotSatisfiedError(DownloadError):
+    """
+    The server responded to a range request with a different range, or with the whole file.
+    """
+
+
+def _download(download_url, remote_file, local_path):
+    with http_get(download_url, stream=True) as result:
+        _check_download_status(result, 200)
+
+        def write_content(file):
+            file_hash = md5()
+            for chunk in result.iter_content(chunk_size=_DOWNLOAD_CHUNK_SIZE):
+                file_hash.update(chunk)
+                file.write(chunk)
+            _verify_etag(remote_file, file_hash.hexdigest())
+
+        # The file is written to a temp file, and replaces the local file only once downloaded and verified.
+        atomic_write(local_path, write_content, binary=True)
+
+
+def _download_ranges(download_url, remote_file, local_path):
+    """
+    Downloads the file in ranges, fetched concurrently and written at their offsets of a preallocated partial file.
+
+    Completed ranges are recorded in a journal next to the partial file, so an interrupted download is resumed
+    from the missing ranges. Once all ranges are downloaded, the partial file is verified and replaces the local file.
+    """
+    size = remote_file['bytes']
+    part_path = local_path + PARTIAL_DOWNLOAD_SUFFIX
+    journal = Journal(local_path + PARTIAL_DOWNLOAD_JOURNAL_SUFFIX, {"etag": remote_file.get('etag'), "bytes": size})
+
+    completed_offsets = {entry["offset"] for entry in journal.replay()}
+    if completed_offsets and path.exists(part_path) and path.getsize(part_path) == size:
+        logger.info(f"Resuming download of '{remote_file['relative_path']}'")
+    else:
+        completed_offsets = set()
+        with open(part_path, "wb") as part_file:
+            part_file.truncate(size)
+
+    ranges = [(offset, min(offset + _DOWNLOAD_RANGE_SIZE, size) - 1)
+              for offset in range(0, size, _DOWNLOAD_RANGE_SIZE) if offset not in completed_offsets]
+
+    journal.open(append=bool(completed_offsets))
+    try:
+        # All the ranges end before the journal is closed, the ranges downloaded despite a failed one are resumed.
+        with pool.ThreadPool(min(_DOWNLOAD_RANGE_WORKERS, len(ranges)) or 1) as thread_pool:
+            errors = [e for e in thread_pool.starmap(_download_range_task,
+                                                     [(download_url, part_path, start, end, journal)
+                                                      for start, end in ranges]) if e is not None]
+        if errors:
+            raise next((e for e in errors if isinstance(e, RangeNotSatisfiedError)), errors[0])
+    except RangeNotSatisfiedError as e:
+        logger.debug(f"{e}, downloading '{remote_file['relative_path']}' in a single request")
+        journal.close(remove=True)
+        os.remove(part_path)
+        call_with_retries(_download, download_url, remote_file, local_path)
+        return
+    finally:
+        journal.close()
+
+    try:
+        _verify_etag(remote_file, etag(part_path))
+    except DownloadError:
+        # There is nothing to resume, the next download starts over.
+        journal.close(remove=True)
+        os.remove(part_path)
+        raise
+    os.replace(part_path, local_path)
+    journal.close(remove=True)
+
+
+def _download_range_task(download_url, part_path, start, end, journal):
+    """
+    Downloads the range with retries.
+
+    :return: The error of the range, if it failed, instead of raising it.
+    """
+    try:
+        call_with_retries(_download_range, download_url, part_path, start, end, journal)
+    except Exception as e:
+        return e
+    return None
+
+
+def _download_range(download_url, part_path, start, end, journal):
+    with http_get(download_url, headers={"Range": f"bytes={start}-{end}"}, stream=True) as result:
+        if result.status_code == 200:
+            # The server (or a CDN or proxy on the way) ignored the Range header and sends the whole file.
+            raise RangeNotSatisfiedError(f"Range {start}-{end} not supported, received the whole file")
+        _check_download_status(result, 206)
+        content_range = result.headers.get('Content-Range', '')
+        if not content_range.startswith(f"bytes {start}-{end}/"):
+            raise RangeNotSatisfiedError(f"Range {start}-{end} not supported, received range '{content_range}'")
+        with open(part_path, "r+b") as part_file:
+            part_file.seek(start)
+            for chunk in result.iter_content(chunk_size=_DOWNLOAD_CHUNK_SIZE):
+                part_file.write(chunk)
+            if part_file.tell() != end + 1:
+                raise DownloadError(f"Incomplete range {start}-{end}, received {part_file.tell() - start} bytes")
+
+    journal.record({"offset": start})
+
+
+def _check_download_status(result, expected_status_code):
+    if result.status_code != expected_status_code:
+        raise DownloadError(f"status code: {result.status_code}, details: {result.headers.get('x-cld-error')}",
+                            result.status_code, parse_retry_after(result.headers.get('Retry-After')))
+
+
+def _verify_etag(remote_file, actual_etag):
+    expected_etag = remote_file.get('etag')
+    if expected_etag and actual_etag != expected_etag:
+        raise DownloadError(f"Checksum mismatch, expected etag: {expected_etag}, actual: {actual_etag}")
+
+
 def asset_source(asset_details):
     """
     Public ID of the transformable file (image/video) does not include file extension.
@@ -305,23 +759,108 @@ def get_folder_mode():
 def call_api(func, *args, **kwargs):
     """
     Run an SDK call (function-style API or Search().execute), retrying once on an OAuth 401 after
-    invalidating the rejected token, then log at debug and re-raise on failure.
+    invalidating the rejected token, and on transient errors according to the retry policy (see RetryPolicy),
+    then log at debug and re-raise on failure.
     """
+    try:
+        method_name = getattr(func, "__name__", None)
+        if method_name in NON_RETRYABLE_API_METHODS:
+            result = _call_api(func, args, kwargs)
+        elif _is_idempotent_api_call(method_name, kwargs):
+            result = call_with_retries(_call_api, func, args, kwargs)
+        else:
+            result = call_non_idempotent_with_retries(_call_api, func, args, kwargs)
+        _report_rate_limit(result)
+        return result
+    except Exception:
+        logger.debug(f"Failed calling '{func.__name__}' with args: {args} and optional args {kwargs}", exc_info=True)
+        raise
+
+
+def _is_idempotent_api_call(method_name, kwargs):
+    if method_name in UPLOAD_API_METHODS:
+        return _is_idempotent_upload(kwargs)
+
+    return method_name is not None and method_name.startswith(IDEMPOTENT_API_METHOD_PREFIXES)
+
+
+def _is_idempotent_upload(options):
+    """
+    An upload is idempotent when it overwrites an asset with a set public ID. Otherwise, uploading the file twice
+    creates two assets with random public IDs (or does not overwrite the first upload).
+    """
+    public_id_is_set = bool(options.get("public_id")) or (_upload_flag(options, "use_filename", False) and
+                                                          not _upload_flag(options, "unique_filename", True))
+
+    return public_id_is_set and _upload_flag(options, "overwrite", True)
+
+
+def _upload_flag(options, name, default):
+    # The option is either a bool, or a string when passed as a raw -o option.
+    return str(options.get(name, default)).lower() in ("true", "1")
+
+
+def _call_api(func, args, kwargs):
     config = cloudinary.config()
     token = getattr(config, "oauth_token", None)  # the token this request will carry
     # Pin the token so the value sent is provably the value handed to invalidate_token: without it the
     # SDK re-reads the self-refreshing oauth_token and a peer rotation between reads breaks the decision.
     pinned = dict(kwargs, oauth_token=token) if token else kwargs
     try:
-        try:
-            return func(*args, **pinned)
-        except AuthorizationRequired:
-            if not getattr(config, "has_oauth", False) or not config.invalidate_token(token):
-                raise
-            return func(*args, **kwargs)  # retry unpinned: the SDK re-reads the freshly rotated token
-    except Exception:
-        logger.debug(f"Failed calling '{func.__name__}' with args: {args} and optional args {kwargs}", exc_info=True)
-        raise
+        return func(*args, **pinned)
+    except AuthorizationRequired:
+        if not getattr(config, "has_oauth", False) or not config.invalidate_token(token):
+            raise
+        return func(*args, **kwargs)  # retry unpinned: the SDK re-reads the freshly rotated token
+
+
+def _report_rate_limit(response):
+    remaining = getattr(response, "rate_limit_remaining", None)
+    allowed = getattr(response, "rate_limit_allowed", None)
+    if isinstance(remaining, int) and isinstance(allowed, int) and remaining < allowed * _RATE_LIMIT_LOW_RATIO:
+        report_congestion(throttled=True)
+
+
+class RateLimitThrottle:
+    """
+    Throttles concurrent Admin API calls by the rate limit reported in the API responses.
+
+    Once the remaining number of calls drops to the reserve (the calls that might be in flight), the callers
+    wait until the rate limit is reset, instead of failing with a rate limit error.
+    """
+
+    def __init__(self, reserve=1):
+        """
+        :param reserve: Number of calls to keep in reserve, usually the number of concurrent workers.
+        """
+        self.reserve = reserve
+        self._resume_at = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until the next call can be made.
+        """
+        with self._lock:
+            delay = self._resume_at - time.time()
+
+        if delay > 0:
+            logger.warning(f"Admin API rate limit is almost exhausted, waiting {int(delay)} seconds for it to reset")
+            time.sleep(delay)
+
+    def update(self, response):
+        """
+        Updates the throttle by the rate limit of the API response.
+
+        :param response: Admin API response.
+        """
+        remaining = getattr(response, "rate_limit_remaining", None)
+        reset_at = getattr(response, "rate_limit_reset_at", None)
+        if remaining is None or reset_at is None or remaining > self.reserve:
+            return
+
+        with self._lock:
+            self._resume_at = max(self._resume_at, calendar.timegm(reset_at))
 
 
 def handle_command(
@@ -0,0 +1,205 @@
+import math
+import threading
+import time
+
+import click
+
+from cloudinary_cli.defaults import logger
+
+AUTO_CONCURRENCY = "auto"
+
+_ADAPTIVE_INITIAL_WORKERS = 8
+_ADAPTIVE_MAX_WORKERS = 64
+# Smoothing factors of the short-term and the long-term task latency averages.
+_SHORT_LATENCY_WEIGHT = 0.3
+_LONG_LATENCY_WEIGHT = 0.02
+# The limit is decreased when the short-term latency exceeds the long-term latency by this factor.
+_LATENCY_TOLERANCE = 2.0
+_DECREASE_FACTOR = 0.5
+# Tasks reporting their size (see report_task_size) are grouped in classes of sizes within this factor of each other.
+_SIZE_CLASS_FACTOR = 4
+
+_task_state = threading.local()
+
+
+class AdaptiveConcurrency:
+    """
+    Adapts the number of concurrent tasks to the observed latency, errors and rate limits, using AIMD
+    (additive increase, multiplicative decrease).
+
+    While the tasks go well, the limit grows by about one task per round of completed tasks. The limit is halved
+    when a task reports congestion (a timeout, a server error or a rate limit, see report_congestion), or when the
+    short-term task latency grows well beyond the long-term one. The limit is decreased at most once per round trip,
+    since the tasks already in flight still report the congestion caused by the previous limit.
+
+    The latency of a task depends on the size of the file it transfers, so the latencies are averaged per class of
+    tasks of a similar size (see report_task_size): a burst of large files completing is not mistaken for congestion.
+    Tasks that do not report a size (API calls) form a class of their own.
+    """
+
+    def __init__(self, initial=_ADAPTIVE_INITIAL_WORKERS, minimum=1, maximum=_ADAPTIVE_MAX_WORKERS):
+        """
+        :param initial: The initial number of concurrent tasks.
+        :param minimum: The minimal number of concurrent tasks.
+        :param maximum: The maximal number of concurrent tasks, the size of the thread pool.
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self._in_flight = 0
+        self._round_trip = None
+        # size class -> [short-term latency, long-term latency]
+        self._latencies = {}
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def max_workers(self):
+        return self.maximum
+
+    def run(self, func, args):
+        """
+        Runs the task once the number of tasks in flight is below the limit.
+
+        :param func: The task function.
+        :param args: The task arguments.
+        :return: The result of the task.
+        """
+        self._acquire()
+        _task_state.controller = self
+        _task_state.size = None
+        started_at = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            size, _task_state.controller, _task_state.size = _task_state.size, None, None
+            self._release(time.monotonic() - started_at, _size_class(size))
+
+    def congested(self, throttled=False):
+        """
+        Decreases the limit on congestion.
+
+        :param throttled: Whether the congestion is a rate limit.
+        """
+        with self._condition:
+            self._decrease("rate limited" if throttled else "congestion")
+
+    def _acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def _release(self, latency, size_class=None):
+        with self._condition:
+            self._in_flight -= 1
+            if self._round_trip is None:
+                self._round_trip = latency
+            else:
+                self._round_trip += _SHORT_LATENCY_WEIGHT * (latency - self._round_trip)
+
+            latencies = self._latencies.get(size_class)
+            if latencies is None:
+                latencies = self._latencies[size_class] = [latency, latency]
+            else:
+                latencies[0] += _SHORT_LATENCY_WEIGHT * (latency - latencies[0])
+                latencies[1] += _LONG_LATENCY_WEIGHT * (latency - latencies[1])
+
+            short_latency, long_latency = latencies
+            if short_latency > long_latency * _LATENCY_TOLERANCE:
+                self._decrease("latency")
+            elif self._in_flight + 1 >= int(self.limit):
+                # The limit grows only while it is fully used.
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now - self._decreased_at < (self._round_trip or 0):
+            return
+
+        self._decreased_at = now
+        self.limit = max(self.minimum, self.limit * _DECREASE_FACTOR)
+        logger.debug(f"Decreased concurrency to {int(self.limit)} ({reason})")
+
+
+def _size_class(size):
+    if size is None:
+        return None
+
+    return int(math.log(max(size, 1), _SIZE_CLASS_FACTOR))
+
+
+class ConcurrencyParamType(click.ParamType):
+    """
+    Click parameter type of the number of concurrent workers: a positive integer, or "auto" for AdaptiveConcurrency.
+    """
+    name = "INTEGER|auto"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, (int, AdaptiveConcurrency)):
+            return value
+
+        if str(value).strip().lower() == AUTO_CONCURRENCY:
+            return AdaptiveConcurrency()
+
+        try:
+            workers = int(value)
+        except ValueError:
+            self.fail(f"'{value}' is not a valid integer or '{AUTO_CONCURRENCY}'", param, ctx)
+
+        if workers < 1:
+            self.fail(f"{workers} is smaller than the minimum of 1", param, ctx)
+
+        return workers
+
+
+CONCURRENCY = ConcurrencyParamType()
+
+
+def max_workers(concurrent_workers):
+    """
+    Returns the maximal number of concurrent workers.
+
+    :param concurrent_workers: The number of concurrent workers, or AdaptiveConcurrency.
+    :return: int
+    """
+    if isinstance(concurrent_workers, AdaptiveConcurrency):
+        return concurrent_workers.max_workers
+
+    return concurrent_workers
+
+
+def run_task(func, args, concurrent_workers):
+    """
+    Runs a single task of run_tasks_concurrently, under the adaptive concurrency limit when used.
+    """
+    if isinstance(concurrent_workers, AdaptiveConcurrency):
+        return concurrent_workers.run(func, args)
+
+    return func(*args)
+
+
+def report_congestion(throttled=False):
+    """
+    Reports a timeout, a server error or a rate limit (throttled) of the current task to the adaptive concurrency
+    controller running it. Does nothing outside of adaptive concurrency.
+
+    :param throttled: Whether the congestion is a rate limit.
+    """
+    controller = getattr(_task_state, "controller", None)
+    if controller is not None:
+        controller.congested(throttled)
+
+
+def report_task_size(size):
+    """
+    Reports the size (in bytes) of the file transferred by the current task to the adaptive concurrency controller
+    running it, so that its latency is compared with the latency of tasks of a similar size. Does nothing outside of
+    adaptive concurrency.
+
+    :param size: The size of the file.
+    """
+    if getattr(_task_state, "controller", None) is not None:
+        _task_state.size = size
@@ -0,0 +1,318 @@
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Mapping
+from os import path
+
+from cloudinary_cli.utils.api_utils import RemoteFile
+from cloudinary_cli.utils.file_utils import LocalFile, strip_duplicate_name_index
+
+# Queries are paged, only a single page of rows is held in memory at a time.
+_PAGE_SIZE = 1000
+# Upper bound of the SQLite page cache, in KiB.
+_CACHE_SIZE_KB = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE local (
+    name TEXT PRIMARY KEY,
+    remote_name TEXT NOT NULL,
+    base_name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    etag TEXT
+);
+CREATE TABLE remote (
+    asset_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    base_name TEXT NOT NULL,
+    unique_name TEXT NOT NULL,
+    recovered_name TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE TABLE hash_cache (
+    name TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    etag TEXT
+);
+CREATE TEMP TABLE names (name TEXT PRIMARY KEY);
+"""
+
+# Indexes are created once the tables are filled, which is much faster than maintaining them on each insert.
+_INDEXES = """
+CREATE INDEX local_remote_name ON local (remote_name);
+CREATE INDEX local_base_name ON local (base_name);
+CREATE INDEX remote_name ON remote (name);
+CREATE INDEX remote_base_name ON remote (base_name);
+CREATE INDEX remote_unique_name ON remote (unique_name);
+CREATE INDEX remote_recovered_name ON remote (recovered_name);
+"""
+
+_LOCAL_COLUMNS = "local.rowid, local.name, local.path, local.size, local.mtime_ns, local.etag"
+
+
+class SyncDiffStore:
+    """
+    On-disk store of the local and the remote files of a sync, used for diffing folders that do not fit in memory.
+
+    Both sides are spilled to an SQLite database in a temporary directory. The differences (unique local files,
+    unique remote files and common files) are computed by joins on indexed names and streamed page by page, so the
+    memory usage does not depend on the number of files.
+
+    Local files are keyed by their normalized relative path (name) and by the name of the remote file they are synced
+    with (remote_name), see SyncDir for the diverse file names. Remote files are keyed by their unique name and by the
+    name of the local file they are synced with (recovered_name).
+    """
+
+    def __init__(self):
+        self._dir = tempfile.mkdtemp(prefix="cld-sync-")
+        # The connection is shared by the worker threads (download callbacks), access is serialized by the lock.
+        self._conn = sqlite3.connect(path.join(self._dir, "diff.db"), check_same_thread=False)
+        self._lock = threading.RLock()
+        # The database is a temporary scratch space, durability is not needed.
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(f"PRAGMA cache_size=-{_CACHE_SIZE_KB}")
+        self._conn.executescript(_SCHEMA)
+        self.local_files = LocalFilesView(self)
+
+    def close(self):
+        """
+        Closes the store and removes the database.
+        """
+        with self._lock:
+            self._conn.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def add_local_files(self, files):
+        """
+        Adds local files.
+
+        :param files: iterable of (name, remote name, path, (size, mtime_ns, inode)) tuples.
+        """
+        self._executemany("INSERT OR REPLACE INTO local VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+                          ((name, remote_name, strip_duplicate_name_index(name), file_path, *signature)
+                           for name, remote_name, file_path, signature in files))
+
+    def add_hash_cache(self, hash_cache):
+        """
+        Adds hash cache entries, the etags of unchanged local files are taken from them by create_indexes.
+
+        :param hash_cache: iterable of (name, (size, mtime_ns, inode, etag)) tuples, see iter_hash_cache.
+        """
+        self._executemany("INSERT OR REPLACE INTO hash_cache VALUES (?, ?, ?, ?, ?)",
+                          ((name, *entry) for name, entry in hash_cache))
+
+    def add_remote_files(self, remote_files, recovered_names):
+        """
+        Adds remote files.
+
+        :param remote_files:    iterable of remote files, as returned by iter_cld_folder.
+        :param recovered_names: dict of remote file names to the names of local files with diverse names.
+        """
+        self._executemany("INSERT OR REPLACE INTO remote VALUES (?, ?, ?, ?, ?, ?)",
+                          ((f["asset_id"], f["normalized_path"], strip_duplicate_name_index(f["normalized_path"]),
+                            f["normalized_unique_path"],
+                            recovered_names.get(f["normalized_unique_path"], f["normalized_unique_path"]),
+                            json.dumps(f.to_dict())) for f in remote_files))
+
+    def create_indexes(self):
+        """
+        Indexes the files once added, and takes the etags of unchanged local files from the hash cache.
+        """
+        with self._lock:
+            self._conn.executescript(_INDEXES)
+            self._conn.execute("""
+                UPDATE local SET etag = (
+                    SELECT h.etag FROM hash_cache h
+                    WHERE h.name = local.name AND h.size = local.size AND h.mtime_ns = local.mtime_ns
+                        AND h.inode = local.inode)
+            """)
+            self._conn.execute("DELETE FROM hash_cache")
+            self._conn.commit()
+
+    def count_local_files(self):
+        return self._scalar("SELECT COUNT(*) FROM local")
+
+    def count_remote_files(self):
+        return self._scalar("SELECT COUNT(*) FROM remote")
+
+    def count_unique_local_files(self):
+        return self._scalar("SELECT COUNT(*) FROM local "
+                            "WHERE NOT EXISTS (SELECT 1 FROM remote WHERE remote.recovered_name = local.name)")
+
+    def count_unique_remote_files(self):
+        return self._scalar("SELECT COUNT(*) FROM remote "
+                            "WHERE NOT EXISTS (SELECT 1 FROM local WHERE local.remote_name = remote.unique_name)")
+
+    def duplicate_remote_names(self):
+        """
+        :return: dict of remote file names shared by multiple remote files to their asset ids.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT name, GROUP_CONCAT(asset_id, char(9)) FROM remote "
+                                      "GROUP BY name HAVING COUNT(*) > 1").fetchall()
+        return {name: set(asset_ids.split("\t")) for name, asset_ids in rows}
+
+    def remote_files_by_base_names(self, names):
+        """
+        Returns the remote files with the names, or with an index added to them, e.g. Image.jpg, Image (1).jpg.
+
+        :param names: Remote file names.
+        :return: dict of asset ids to remote files.
+        """
+        rows = self._select_by_names("SELECT record FROM remote JOIN names ON remote.base_name = names.name "
+                                     "UNION SELECT record FROM remote JOIN names ON remote.name = names.name", names)
+        remote_files = (RemoteFile(**json.loads(record)) for record, in rows)
+        return {f["asset_id"]: f for f in remote_files}
+
+    def local_file_names_by_base_names(self, names):
+        """
+        Returns the names of the local files with the names, or with an index added to them.
+
+        :param names: Local file names.
+        :return: list of local file names.
+        """
+        rows = self._select_by_names("SELECT local.name FROM local JOIN names ON local.base_name = names.name "
+                                     "UNION SELECT local.name FROM local JOIN names ON local.name = names.name", names)
+        return [name for name, in rows]
+
+    def update_unique_names(self, remote_files, recovered_names):
+        """
+        Updates the unique names of the remote files, once the duplicate names are resolved.
+
+        :param remote_files:    iterable of remote files.
+        :param recovered_names: dict of remote file names to the names of local files with diverse names.
+        """
+        self._executemany("UPDATE remote SET unique_name = ?, recovered_name = ?, record = ? WHERE asset_id = ?",
+                          ((f["normalized_unique_path"],
+                            recovered_names.get(f["normalized_unique_path"], f["normalized_unique_path"]),
+                            json.dumps(f.to_dict()), f["asset_id"]) for f in remote_files))
+
+    def set_etags(self, etags):
+        """
+        :param etags: iterable of (local file name, etag) tuples.
+        """
+        self._executemany("UPDATE local SET etag = ? WHERE name = ?", ((etag, name) for name, etag in etags))
+
+    def put_local_file(self, name, remote_name, file_path, signature, etag):
+        """
+        Adds or replaces a single local file, keeping its position in the ongoing queries.
+        """
+        with self._lock:
+            updated = self._conn.execute("UPDATE local SET path = ?, size = ?, mtime_ns = ?, inode = ?, etag = ? "
+                                         "WHERE name = ?", (file_path, *signature, etag, name)).rowcount
+            if not updated:
+                self._conn.execute("INSERT INTO local VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (name, remote_name, strip_duplicate_name_index(name), file_path, *signature, etag))
+            self._conn.commit()
+
+    def remove_local_files(self, names):
+        self._executemany("DELETE FROM local WHERE name = ?", ((name,) for name in names))
+
+    def iter_unique_local_files(self):
+        """
+        :return: generator of (name, local file) tuples of the local files that do not exist remotely.
+        """
+        for row in self._iter_pages(f"SELECT {_LOCAL_COLUMNS} FROM local "
+                                    "WHERE NOT EXISTS (SELECT 1 FROM remote WHERE remote.recovered_name = local.name) "
+                                    "AND local.rowid > ? ORDER BY local.rowid LIMIT ?"):
+            yield row[1], _local_file(row)
+
+    def iter_unique_remote_files(self):
+        """
+        :return: generator of remote files that do not exist locally.
+        """
+        for _, record in self._iter_pages(
+                "SELECT remote.rowid, remote.record FROM remote "
+                "WHERE NOT EXISTS (SELECT 1 FROM local WHERE local.remote_name = remote.unique_name) "
+                "AND remote.rowid > ? ORDER BY remote.rowid LIMIT ?"):
+            yield RemoteFile(**json.loads(record))
+
+    def iter_common_files(self):
+        """
+        :return: generator of (name, local file, remote file) tuples of the files that exist on both sides.
+        """
+        for row in self._iter_pages(f"SELECT {_LOCAL_COLUMNS}, remote.record FROM local "
+                                    "JOIN remote ON remote.recovered_name = local.name "
+                                    "WHERE local.rowid > ? ORDER BY local.rowid LIMIT ?"):
+            yield row[1], _local_file(row), RemoteFile(**json.loads(row[-1]))
+
+    def iter_local_file_names(self):
+        for _, name in self._iter_pages("SELECT rowid, name FROM local WHERE rowid > ? ORDER BY rowid LIMIT ?"):
+            yield name
+
+    def iter_hash_cache(self):
+        """
+        :return: generator of hash cache entries of the local files with known etags, see write_hash_cache.
+        """
+        for _, name, size, mtime_ns, inode, etag in self._iter_pages(
+                "SELECT rowid, name, size, mtime_ns, inode, etag FROM local "
+                "WHERE etag IS NOT NULL AND rowid > ? ORDER BY rowid LIMIT ?"):
+            yield name, (size, mtime_ns, inode, etag)
+
+    def get_local_file(self, name):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_LOCAL_COLUMNS} FROM local WHERE name = ?", (name,)).fetchone()
+        return _local_file(row) if row is not None else None
+
+    def _iter_pages(self, query):
+        """
+        Runs a paged query. The query takes the last seen rowid and the page size as parameters.
+
+        The database can be modified between the pages, rows are never visited twice.
+        """
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(query, (last_rowid, _PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            yield from rows
+
+    def _select_by_names(self, query, names):
+        with self._lock:
+            self._conn.execute("DELETE FROM names")
+            self._conn.executemany("INSERT OR IGNORE INTO names VALUES (?)", ((name,) for name in names))
+            return self._conn.execute(query).fetchall()
+
+    def _executemany(self, query, rows):
+        with self._lock:
+            self._conn.executemany(query, rows)
+            self._conn.commit()
+
+    def _scalar(self, query):
+        with self._lock:
+            return self._conn.execute(query).fetchone()[0]
+
+
+class LocalFilesView(Mapping):
+    """
+    Read-only dict-like view of the local files in the store, so the local files can be looked up by name as usual.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, name):
+        local_file = self._store.get_local_file(name)
+        if local_file is None:
+            raise KeyError(name)
+        return local_file
+
+    def __iter__(self):
+        return self._store.iter_local_file_names()
+
+    def __len__(self):
+        return self._store.count_local_files()
+
+
+def _local_file(row):
+    _, _, file_path, size, mtime_ns, etag = row[:6]
+    return LocalFile(path=file_path, size=size, mtime_ns=mtime_ns, etag=etag)
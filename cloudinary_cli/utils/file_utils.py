@@ -1,12 +1,14 @@
 import os
+import re
 import stat
 import tempfile
 from os import walk, path, listdir, rmdir, sep
+from multiprocessing import pool
 from os.path import split, relpath, abspath
 from pathlib import PurePath
 
 from cloudinary_cli.defaults import logger
-from cloudinary_cli.utils.utils import etag
+from cloudinary_cli.utils.utils import etag, Record
 
 FORMAT_ALIASES = {
     'jpeg': 'jpg',
@@ -40,7 +42,7 @@ FORMAT_ALIASES = {
 }
 
 
-def atomic_write(filename, write_fn, mode=None):
+def atomic_write(filename, write_fn, mode=None, encoding=None, binary=False):
     """
     Writes via a temp file in the same directory, then atomically replaces the target, so a
     concurrent reader never sees a half-written file and an interleaved write can't truncate it.
@@ -51,11 +53,13 @@ def atomic_write(filename, write_fn, mode=None):
                      this mode before the replace, so the destination is never momentarily wider
                      (mkstemp creates it 0600, so a secret file is never world-readable mid-write).
                      When omitted, normalize to the process umask default like a plain open().
+    :param encoding: Text encoding of the temp file. Defaults to the platform encoding, like open().
+    :param binary:   When True, the temp file is opened in binary mode.
     """
     directory = path.dirname(filename) or "."
     fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
     try:
-        with os.fdopen(fd, 'w') as file:
+        with os.fdopen(fd, 'wb' if binary else 'w', encoding=encoding) as file:
             write_fn(file)
         if mode is not None:
             os.chmod(tmp_path, mode)
@@ -83,8 +87,60 @@ def _apply_umask_permissions(file):
         logger.debug(f"Could not normalize permissions on {file}: {e}")
 
 
-def walk_dir(root_dir, include_hidden=False):
+HASH_CACHE_HEADER = "# cld-hash-cache v1"
+
+# Small files are handed to the hashing threads in chunks to amortize the dispatch overhead.
+_HASH_CHUNK_SIZE = 8
+
+
+class LocalFile(Record):
+    """
+    Local file details, as returned by walk_dir.
+    """
+    __slots__ = ("path", "size", "mtime_ns", "etag")
+
+
+def walk_dir(root_dir, include_hidden=False, hash_cache=None, hash_workers=1, lazy_etags=False):
+    """
+    Walks the directory and collects sizes and etags of all files.
+
+    :param root_dir:        The directory to walk.
+    :param include_hidden:  Whether to include hidden files and folders.
+    :param hash_cache:      Optional hash cache (see read_hash_cache). Files whose stat signature matches their
+                            cached entry are not hashed again. The cache is updated in place to match the tree.
+    :param hash_workers:    The number of threads used for hashing files.
+    :param lazy_etags:      When True, only cached etags are filled in, the rest are left as None to be calculated
+                            on demand using populate_etags.
+    :return: dict of normalized relative file paths to file details.
+    """
     all_files = {}
+    for normalized_relative_file_path, full_path, signature in iter_dir(root_dir, include_hidden):
+        cached = hash_cache.get(normalized_relative_file_path) if hash_cache is not None else None
+        all_files[normalized_relative_file_path] = LocalFile(
+            path=full_path,
+            size=signature[0],
+            mtime_ns=signature[1],
+            etag=cached[3] if cached is not None and cached[:3] == signature else None
+        )
+
+    if hash_cache is not None:
+        for stale_file in hash_cache.keys() - all_files.keys():
+            del hash_cache[stale_file]
+
+    if not lazy_etags:
+        populate_etags(all_files, all_files.keys(), hash_cache, hash_workers)
+
+    return all_files
+
+
+def iter_dir(root_dir, include_hidden=False):
+    """
+    Walks the directory, yielding the files one by one.
+
+    :param root_dir:        The directory to walk.
+    :param include_hidden:  Whether to include hidden files and folders.
+    :return: generator of (normalized relative file path, full path, stat signature) tuples.
+    """
     for root, dirs, files in walk(root_dir):
         if not include_hidden:
             files = [f for f in files if not is_hidden(root, f)]
@@ -94,12 +150,117 @@ def walk_dir(root_dir, include_hidden=False):
         for file in files:
             full_path = path.join(root, file)
             relative_file_path = "/".join(p for p in [relative_path, file] if p)
-            normalized_relative_file_path = normalize_file_extension(relative_file_path)
-            all_files[normalized_relative_file_path] = {
-                "path": full_path,
-                "etag": etag(full_path)
-            }
-    return all_files
+            yield normalize_file_extension(relative_file_path), full_path, file_signature(full_path)
+
+
+def populate_etags(files, file_names, hash_cache=None, hash_workers=1):
+    """
+    Calculates missing etags of the specified files (as returned by walk_dir).
+
+    :param files:           dict of file names to file details, updated in place.
+    :param file_names:      The names of the files that need etags.
+    :param hash_cache:      Optional hash cache, updated in place with the calculated etags.
+    :param hash_workers:    The number of threads used for hashing files.
+    """
+    files_to_hash = [file_name for file_name in file_names if files[file_name]["etag"] is None]
+    if not files_to_hash:
+        return
+
+    # The signature is taken before hashing, so a file modified while hashed is hashed again next time.
+    signatures = [file_signature(files[f]["path"]) for f in files_to_hash] if hash_cache is not None else None
+    file_etags = hash_files([files[f]["path"] for f in files_to_hash], hash_workers)
+    for index, (file_name, file_etag) in enumerate(zip(files_to_hash, file_etags)):
+        files[file_name]["etag"] = file_etag
+        if hash_cache is not None:
+            hash_cache[file_name] = (*signatures[index], file_etag)
+
+
+def file_signature(full_path):
+    """
+    Returns the stat signature of the file, a file is considered unchanged while its signature is the same.
+
+    :param full_path: The path of the file.
+    :return: (size, mtime_ns, inode) tuple.
+    """
+    st = os.stat(full_path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def hash_files(file_paths, hash_workers=1):
+    """
+    Calculates etags of the files, optionally in parallel.
+
+    :param file_paths:   The paths of the files to hash.
+    :param hash_workers: The number of threads used for hashing.
+    :return: list of etags, in the order of file_paths.
+    """
+    hash_workers = min(hash_workers or 1, len(file_paths))
+    if hash_workers <= 1:
+        return [etag(file_path) for file_path in file_paths]
+
+    logger.debug(f"Hashing {len(file_paths)} files using {hash_workers} threads")
+    with pool.ThreadPool(hash_workers) as thread_pool:
+        return thread_pool.map(etag, file_paths, chunksize=_HASH_CHUNK_SIZE)
+
+
+def read_hash_cache(filename):
+    """
+    Reads the hash cache file.
+
+    The file starts with a header line, followed by a single tab separated line per file:
+    size, mtime_ns, inode, etag and the normalized relative path (last, so it can contain tabs).
+
+    :param filename: The hash cache file.
+    :return: dict of normalized relative file paths to (size, mtime_ns, inode, etag) tuples.
+    """
+    try:
+        return dict(iter_hash_cache(filename))
+    except (OSError, ValueError) as e:
+        # The cache is an optimization only, when it cannot be read, all files are hashed.
+        logger.warning(f"Failed reading hash cache file '{filename}': {e}")
+        return {}
+
+
+def iter_hash_cache(filename):
+    """
+    Reads the hash cache file entry by entry. See read_hash_cache for the format.
+
+    :param filename: The hash cache file.
+    :return: generator of (normalized relative file path, (size, mtime_ns, inode, etag)) tuples.
+    """
+    if not path.exists(filename):
+        return
+
+    with open(filename, 'r', encoding='utf-8') as file:
+        if file.readline().rstrip('\n') != HASH_CACHE_HEADER:
+            logger.debug(f"Ignoring hash cache file '{filename}' with unknown format")
+            return
+        for line in file:
+            fields = line.rstrip('\n').split('\t', 4)
+            if len(fields) != 5:
+                continue
+            size, mtime_ns, inode, file_etag, relative_path = fields
+            yield relative_path, (int(size), int(mtime_ns), int(inode), file_etag)
+
+
+def write_hash_cache(hash_cache, filename):
+    """
+    Atomically writes the hash cache file. See read_hash_cache for the format.
+
+    :param hash_cache: dict of normalized relative file paths to (size, mtime_ns, inode, etag) tuples,
+                       or an iterable of (normalized relative file path, tuple) items.
+    :param filename:   The hash cache file.
+    """
+    items = hash_cache.items() if isinstance(hash_cache, dict) else hash_cache
+
+    def dump(file):
+        file.write(HASH_CACHE_HEADER + "\n")
+        for relative_path, (size, mtime_ns, inode, file_etag) in items:
+            if "\n" in relative_path:
+                continue  # cannot be represented in a line based format, will be hashed on each run.
+            file.write(f"{size}\t{mtime_ns}\t{inode}\t{file_etag}\t{relative_path}\n")
+
+    atomic_write(filename, dump, encoding='utf-8')
 
 
 def is_hidden(root, relative_path):
@@ -189,6 +350,28 @@ def populate_duplicate_name(filename, index=0):
     return ".".join([p for p in [filename, extension[1:]] if p])
 
 
+_DUPLICATE_INDEX_RE = re.compile(r"^(.*) \(\d+\)$", re.DOTALL)
+
+
+def strip_duplicate_name_index(filename):
+    """
+    Removes the index added by populate_duplicate_name from the filename.
+
+    :param filename: The file name, e.g. 'Image (2).jpg'.
+    :return: The file name without the index, e.g. 'Image.jpg'.
+    """
+    if " (" not in filename:
+        # Most file names have no index, skip splitting them.
+        return filename
+
+    base_name, extension = os.path.splitext(filename)
+    match = _DUPLICATE_INDEX_RE.match(base_name)
+    if not match:
+        return filename
+
+    return ".".join([p for p in [match.group(1), extension[1:]] if p])
+
+
 def posix_rel_path(end, start) -> str:
     """
     Returns a relative path in posix style on any system.
@@ -0,0 +1,106 @@
+"""Shared HTTP transport for plain HTTP requests (asset downloads, delivery URL probes), as opposed to API calls
+that go through the SDK. A single requests.Session keeps connections alive between requests, so consecutive
+requests to the same host do not pay for a new TCP and TLS handshake each time.
+
+The connection pool of the SDK, used by the API calls, is sized the same way (see configure_sdk_pool)."""
+import threading
+
+import cloudinary
+import requests
+from cloudinary import uploader
+from cloudinary.api_client import call_api as api_client
+from cloudinary.utils import get_http_connector
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager, Retry
+
+from cloudinary_cli.defaults import HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS
+
+DEFAULT_POOL_SIZE = 10
+# A single reconnect when a connection fails before the request is sent, instead of the 3 retries of urllib3 by
+# default. Failures after the request is sent are left to the retry policy, which knows whether the call is idempotent,
+# so the retries of urllib3 and of the retry policy do not multiply (see RetryPolicy).
+_SDK_RETRIES = Retry(total=None, connect=1, read=0, status=0, other=0, redirect=3)
+
+_session = None
+_pool_size = DEFAULT_POOL_SIZE
+_sdk_pool_size = None
+_lock = threading.Lock()
+
+
+def configure_http_pool(pool_size):
+    """
+    Sizes the connection pool of the shared session, usually to the number of concurrent workers, so that each
+    worker keeps its connection alive instead of having it discarded by a full pool.
+
+    :param pool_size: Number of connections kept alive per host.
+    """
+    global _session, _pool_size
+    with _lock:
+        if pool_size == _pool_size and _session is not None:
+            return
+        _pool_size = pool_size
+        _session = None
+
+
+def configure_sdk_pool(pool_size):
+    """
+    Replaces the connection pools of the SDK with a single pool shared by the Admin, Search and Upload API calls,
+    keeping up to pool_size connections alive per host.
+
+    The SDK pools keep a single connection per host, so with concurrent workers most connections are discarded after
+    a single request, and each request pays for a new TCP and TLS handshake. Requests beyond the pool size still get
+    a connection, which is closed once used.
+
+    :param pool_size: Number of connections kept alive per host, usually the number of concurrent workers.
+    """
+    global _sdk_pool_size
+    with _lock:
+        pool_size = max(pool_size, DEFAULT_POOL_SIZE)
+        if pool_size == _sdk_pool_size:
+            return
+
+        # Another kind of connector (App Engine) is left as is.
+        if not isinstance(uploader._http, PoolManager) or not isinstance(api_client._http, PoolManager):
+            return
+
+        # Created the same way as the SDK does, honoring api_proxy and disable_tcp_keep_alive.
+        connector = get_http_connector(cloudinary.config(),
+                                       dict(cloudinary.CERT_KWARGS, maxsize=pool_size, retries=_SDK_RETRIES))
+        uploader._http = api_client._http = connector
+        _sdk_pool_size = pool_size
+
+
+def http_session():
+    """
+    Returns the shared session, created on the first use.
+
+    :return: requests.Session
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _create_session(_pool_size)
+        return _session
+
+
+def http_get(url, **kwargs):
+    """requests.get over the shared session, with default connect and read timeouts."""
+    return http_session().get(url, **_with_timeout(kwargs))
+
+
+def http_head(url, **kwargs):
+    """requests.head over the shared session, with default connect and read timeouts."""
+    return http_session().head(url, **_with_timeout(kwargs))
+
+
+def _create_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _with_timeout(kwargs):
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS))
+    return kwargs
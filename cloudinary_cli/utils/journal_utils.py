@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+from os import path
+
+from cloudinary_cli.defaults import logger
+from cloudinary_cli.utils.file_utils import atomic_write
+
+
+class Journal:
+    """
+    Append-only journal of completed operations, used for resuming interrupted long-running commands.
+
+    The journal is a JSON lines file. The first line is a header that identifies the operation, the rest are entries,
+    each one written and flushed as soon as the operation it describes completes. A crash can only tear the last line,
+    which is skipped on replay.
+    """
+
+    def __init__(self, filename, header):
+        """
+        :param filename: The journal file.
+        :param header:   dict that identifies the operation, a journal with a different header is not replayed.
+        """
+        self.filename = filename
+        self.header = header
+        self._file = None
+        self._lock = threading.Lock()
+
+    def replay(self):
+        """
+        Reads the entries of the journal.
+
+        :return: list of entries, empty when the journal does not exist or belongs to a different operation.
+        """
+        if not path.exists(self.filename):
+            return []
+
+        entries = []
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                if self._read_header(file) != self.header:
+                    logger.warning(f"Journal '{self.filename}' belongs to a different operation, ignoring it")
+                    return []
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        logger.debug(f"Skipping a torn journal line: {line!r}")
+        except OSError as e:
+            logger.warning(f"Failed reading journal '{self.filename}': {e}")
+            return []
+
+        return entries
+
+    def open(self, append=False):
+        """
+        Opens the journal for recording.
+
+        :param append: When True, new entries are appended to the existing journal of the same operation.
+                       Otherwise (or when there is no such journal), a new journal is started.
+        """
+        if append and path.exists(self.filename) and self._header_matches():
+            self._file = open(self.filename, 'a', encoding='utf-8')
+            return
+
+        self._file = open(self.filename, 'w', encoding='utf-8')
+        self._write_line(self.header)
+
+    def record(self, entry):
+        """
+        Records a completed operation. Thread-safe.
+
+        :param entry: JSON serializable dict.
+        """
+        with self._lock:
+            self._write_line(entry)
+
+    def rewrite(self, entries):
+        """
+        Atomically replaces the entries of a closed journal, for example dropping the superseded ones.
+
+        :param entries: iterable of JSON serializable dicts.
+        """
+        def write_entries(file):
+            for obj in [self.header, *entries]:
+                file.write(json.dumps(obj) + "\n")
+
+        atomic_write(self.filename, write_entries, encoding='utf-8')
+
+    def close(self, remove=False):
+        """
+        Closes the journal.
+
+        :param remove: When True, the journal is removed, since there is nothing to resume.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+        if remove and path.exists(self.filename):
+            os.remove(self.filename)
+
+    def _write_line(self, obj):
+        self._file.write(json.dumps(obj) + "\n")
+        # Flushed to the OS on each entry, so the entry survives a crash or a kill of the process.
+        self._file.flush()
+
+    def _header_matches(self):
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                return self._read_header(file) == self.header
+        except OSError:
+            return False
+
+    @staticmethod
+    def _read_header(file):
+        try:
+            return json.loads(file.readline())
+        except ValueError:
+            return None
@@ -0,0 +1,240 @@
+import email.utils
+import random
+import re
+import threading
+import time
+
+import requests
+from cloudinary.exceptions import Error, GeneralError, RateLimited
+
+from cloudinary_cli.defaults import logger, RETRY_MAX_ATTEMPTS, RETRY_BUDGET_RATIO
+from cloudinary_cli.utils.concurrency_utils import report_congestion
+
+RETRYABLE_STATUS_CODES = frozenset((408, 420, 429, 500, 502, 503, 504))
+_THROTTLED_STATUS_CODES = (420, 429)
+
+_BASE_DELAY_SECONDS = 0.5
+_MAX_DELAY_SECONDS = 30
+# A Retry-After longer than this is not waited for, the failure is raised instead.
+_MAX_RETRY_AFTER_SECONDS = 120
+# Retries always allowed per run, on top of the share of the calls (see RetryPolicy).
+_MIN_RETRY_BUDGET = 10
+
+# The SDK reports connection failures and unparsable (proxy) error pages by the message only.
+_SDK_CONNECTION_ERROR = re.compile(r"^(Unexpected error|Socket error)", re.IGNORECASE)
+_SDK_STATUS_CODE = re.compile(r"^Error (\d{3}) - |server response \((\d{3})\)")
+
+
+class RetryPolicy:
+    """
+    Retries calls failing with a transient error (a connection error, a timeout, a rate limit or a server error),
+    using exponential backoff with full jitter, or the delay requested by the server (Retry-After).
+
+    The retries of a run are limited by a budget: a share of the calls made so far, in addition to a small number of
+    retries that are always allowed. So a few transient failures among many calls are retried, while an outage does
+    not multiply the load by the number of attempts.
+
+    A connection error, or a server error without details, might happen after the server has carried out the request
+    (see is_ambiguous_failure). Such failures are retried only for idempotent calls, a retry of another call could
+    carry it out twice (create a duplicate asset, for example).
+
+    The retries are on top of the retries of urllib3 (used by the SDK), which by default reconnects a few times when
+    a connection fails before the request is sent. configure_sdk_pool limits these to a single reconnect, and leaves
+    the failures after the request is sent to the retry policy.
+    """
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=_BASE_DELAY_SECONDS, max_delay=_MAX_DELAY_SECONDS,
+                 budget_ratio=RETRY_BUDGET_RATIO, min_budget=_MIN_RETRY_BUDGET):
+        """
+        :param max_attempts: The maximal number of attempts of a call, including the first one.
+        :param base_delay:   The delay before the first retry, doubled on each further retry.
+        :param max_delay:    The maximal delay between the attempts.
+        :param budget_ratio: The share of the calls that can be retried.
+        :param min_budget:   The number of retries allowed regardless of the number of calls.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self._calls = 0
+        self._retries = 0
+        self._budget_exhausted = False
+        self._lock = threading.Lock()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls the idempotent function, retrying it on transient errors.
+
+        :param func: The function.
+        :return: The result of the function.
+        """
+        return self._call(func, args, kwargs, idempotent=True)
+
+    def call_non_idempotent(self, func, *args, **kwargs):
+        """
+        Calls the function that is not idempotent, retrying it only on transient errors that are known to leave the
+        request undone (rate limits and server errors).
+
+        :param func: The function.
+        :return: The result of the function.
+        """
+        return self._call(func, args, kwargs, idempotent=False)
+
+    def _call(self, func, args, kwargs, idempotent):
+        with self._lock:
+            self._calls += 1
+
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, idempotent)
+                if delay is None:
+                    raise
+
+                logger.warning(f"{e}, retrying in {delay:.1f} seconds (attempt {attempt + 1} of {self.max_attempts})")
+                time.sleep(delay)
+                attempt += 1
+
+    def backoff(self, attempt):
+        """
+        Returns the delay before the retry following the attempt: a random delay up to the exponential backoff.
+
+        :param attempt: The number of the failed attempt, starting at 1.
+        :return: float
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _retry_delay(self, error, attempt, idempotent):
+        status_code = transient_status_code(error)
+        if status_code is None:
+            return None
+
+        # Transient failures are caused by overload, the adaptive concurrency backs off.
+        report_congestion(throttled=status_code in _THROTTLED_STATUS_CODES)
+        if attempt >= self.max_attempts:
+            return None
+
+        if not idempotent and is_ambiguous_failure(error):
+            return None
+
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None and retry_after > _MAX_RETRY_AFTER_SECONDS:
+            return None
+
+        if not self._take_retry():
+            return None
+
+        return max(retry_after or 0, self.backoff(attempt))
+
+    def _take_retry(self):
+        with self._lock:
+            if self._retries >= self.min_budget + self.budget_ratio * self._calls:
+                if not self._budget_exhausted:
+                    self._budget_exhausted = True
+                    logger.warning("Too many failures, the failed requests are not retried anymore")
+                return False
+
+            self._retries += 1
+            return True
+
+
+def transient_status_code(error):
+    """
+    Classifies the error as transient (worth retrying) or not.
+
+    :param error: The exception.
+    :return: The HTTP status code of a transient error, 0 for a transient connection error, None when not transient.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code if status_code in RETRYABLE_STATUS_CODES else None
+
+    if isinstance(error, RateLimited):
+        return 429
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return 0
+
+    # Only the exact SDK error classes: their subclasses stand for specific client errors (BadRequest, NotFound...).
+    if type(error) not in (Error, GeneralError):
+        return None
+
+    message = str(error)
+    if _SDK_CONNECTION_ERROR.match(message):
+        return 0
+
+    match = _SDK_STATUS_CODE.search(message)
+    if match:
+        status_code = int(match.group(1) or match.group(2))
+        return status_code if status_code in RETRYABLE_STATUS_CODES else None
+
+    # Admin API server errors without details.
+    return 500 if type(error) is GeneralError else None
+
+
+def is_ambiguous_failure(error):
+    """
+    Checks whether the request might have been carried out despite the transient error: the connection failed (while
+    sending the request or waiting for the response), or the server error does not tell its status.
+
+    :param error: The exception.
+    :return: True when the request might have been carried out.
+    """
+    status_code = transient_status_code(error)
+    if status_code == 0:
+        return True
+
+    # Admin API server errors without details (see transient_status_code).
+    return status_code == 500 and type(error) is GeneralError and not _SDK_STATUS_CODE.search(str(error))
+
+
+def parse_retry_after(value):
+    """
+    Parses the Retry-After header, either a number of seconds or an HTTP date.
+
+    :param value: The header value.
+    :return: The number of seconds to wait, or None.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0, retry_at.timestamp() - time.time())
+
+
+_policy = RetryPolicy()
+
+
+def retry_policy():
+    """
+    Returns the retry policy of the run.
+
+    :return: RetryPolicy
+    """
+    return _policy
+
+
+def call_with_retries(func, *args, **kwargs):
+    """
+    Calls the idempotent function, retrying it on transient errors according to the retry policy of the run.
+    """
+    return _policy.call(func, *args, **kwargs)
+
+
+def call_non_idempotent_with_retries(func, *args, **kwargs):
+    """
+    Calls the function that is not idempotent, retrying it on rate limits and server errors according to the retry
+    policy of the run.
+    """
+    return _policy.call_non_idempotent(func, *args, **kwargs)
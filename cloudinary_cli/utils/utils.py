@@ -2,7 +2,9 @@
 import builtins
 import json
 import logging
+import mmap
 import os
+import queue
 import sys
 from collections import OrderedDict
 from csv import DictWriter
@@ -10,6 +12,7 @@ from datetime import datetime, timezone
 from functools import reduce
 from hashlib import md5
 from inspect import signature, getfullargspec
+from itertools import islice
 from typing import get_type_hints
 from multiprocessing import pool
 
@@ -18,6 +21,7 @@ import cloudinary
 from jinja2 import Environment, FileSystemLoader
 from docstring_parser import parse
 from cloudinary_cli.defaults import logger, TEMPLATE_FOLDER
+from cloudinary_cli.utils.concurrency_utils import max_workers, run_task
 from cloudinary.utils import build_array
 
 not_callable = ('is_appengine_sandbox', 'call_tags_api', 'call_context_api', 'call_cacheable_api', 'call_api',
@@ -25,19 +29,75 @@ not_callable = ('is_appengine_sandbox', 'call_tags_api', 'call_context_api', 'ca
                 'reset_config', 'upload_large_part', 'upload_image', 'upload_resource', 'build_eager')
 
 BLOCK_SIZE = 65536
+LARGE_BLOCK_SIZE = 1024 * 1024  # bigger reads for bigger files, hashlib releases the GIL while hashing them
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# iter_tasks_concurrently keeps this many tasks per worker submitted, so the workers never wait for the producer.
+_PENDING_TASKS_PER_WORKER = 4
 
 
 class ConfigurationError(Exception):
     pass
 
 
+class Record:
+    """
+    Compact record with dict-like access to its fields, for collections of millions of items (e.g. synced files).
+
+    Subclasses list their fields in __slots__, so a record takes a fraction of the memory of the equivalent dict.
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
 def etag(fi):
-    file_hash = md5()
     with open(fi, 'rb') as f:
-        fb = f.read(BLOCK_SIZE)
-        while len(fb) > 0:
-            file_hash.update(fb)
-            fb = f.read(BLOCK_SIZE)
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            try:
+                # Hash the memory mapped file directly, no intermediate buffers are copied.
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    return md5(mapped_file).hexdigest()
+            except (OSError, ValueError) as e:
+                logger.debug(f"Failed memory mapping file '{fi}', falling back to buffered reads: {e}")
+
+        file_hash = md5()
+        buffer = bytearray(LARGE_BLOCK_SIZE if size > LARGE_BLOCK_SIZE else BLOCK_SIZE)
+        view = memoryview(buffer)
+        read_size = f.readinto(buffer)
+        while read_size:
+            file_hash.update(view[:read_size])
+            read_size = f.readinto(buffer)
 
     return file_hash.hexdigest()
 
@@ -87,6 +147,16 @@ def expiry_hint(epoch):
         return str(epoch)
 
 
+def parse_timestamp(timestamp):
+    """
+    Parses ISO 8601 timestamp returned by the API, e.g. '2024-01-01T00:00:00Z'.
+
+    :param timestamp: The timestamp.
+    :return: Timezone aware datetime.
+    """
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
 def log_exception(e, message=None, debug_message=None):
     message = f"{message}, error: {str(e)}" if message is not None else str(e)
     debug_message = debug_message or message
@@ -211,8 +281,57 @@ def write_json_list_to_csv(json_list, filename, fields_to_keep=()):
 
 
 def run_tasks_concurrently(func, tasks, concurrent_workers):
-    with pool.ThreadPool(concurrent_workers) as thread_pool:
-        thread_pool.starmap(func, tasks)
+    """
+    Runs the tasks in a thread pool, see iter_tasks_concurrently.
+
+    :param func:                The task function.
+    :param tasks:               iterable of task arguments tuples, can be a generator.
+    :param concurrent_workers:  The number of concurrent workers, or AdaptiveConcurrency for adapting it.
+    """
+    for _ in iter_tasks_concurrently(func, tasks, concurrent_workers):
+        pass
+
+
+def iter_tasks_concurrently(func, tasks, concurrent_workers, max_pending=None):
+    """
+    Runs the tasks in a thread pool, yielding the results in the order the tasks complete.
+
+    The tasks are read lazily: a task is submitted only when there are fewer than max_pending tasks submitted and
+    not yet completed. So a generator of tasks (a directory walk, search result pages) is consumed as fast as the
+    tasks run, the first task starts right away, and neither the tasks nor the results pile up in memory.
+
+    :param func:                The task function.
+    :param tasks:               iterable of task arguments tuples, can be a generator.
+    :param concurrent_workers:  The number of concurrent workers, or AdaptiveConcurrency for adapting it.
+    :param max_pending:         The maximal number of pending tasks. Default: a few tasks per worker.
+    :return: generator of task results. An exception raised by a task is raised by the generator.
+    """
+    workers = max_workers(concurrent_workers)
+    max_pending = max_pending or workers * _PENDING_TASKS_PER_WORKER
+    completed = queue.Queue()
+    pending = 0
+
+    with pool.ThreadPool(workers) as thread_pool:
+        for args in tasks:
+            while pending >= max_pending or not completed.empty():
+                yield _task_result(completed.get())
+                pending -= 1
+
+            thread_pool.apply_async(run_task, (func, args, concurrent_workers),
+                                    callback=lambda result: completed.put((True, result)),
+                                    error_callback=lambda e: completed.put((False, e)))
+            pending += 1
+
+        for _ in range(pending):
+            yield _task_result(completed.get())
+
+
+def _task_result(completed_task):
+    succeeded, result = completed_task
+    if not succeeded:
+        raise result
+
+    return result
 
 
 def is_interactive():
@@ -417,6 +536,22 @@ def chunker(seq, size):
     return (seq[pos:pos + size] for pos in range(0, len(seq), size))
 
 
+def iter_chunks(iterable, size):
+    """
+    Iterates any iterable (including generators) in chunks of a given size, see chunker.
+
+    :param iterable: The iterable to iterate.
+    :param size: The size of a single chunk.
+    :return: generator of lists.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def duplicate_values(items, value_key, key_of_interest=None):
     """
     Finds duplicate values in a dictionary of objects.
@@ -3,7 +3,7 @@ from unittest.mock import patch
 import pytest
 from filelock import FileLock
 
-from cloudinary_cli.utils import config_utils
+from cloudinary_cli.utils import config_utils, retry_utils
 
 
 @pytest.fixture(autouse=True)
@@ -14,3 +14,10 @@ def isolate_cli_config(tmp_path):
     with patch.object(config_utils, "CLOUDINARY_CLI_CONFIG_FILE", config_file), \
             patch.object(config_utils, "_config_lock", FileLock(config_file + ".lock")):
         yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_retry_policy():
+    """Each test gets a fresh retry budget, and transient failures are retried without waiting."""
+    with patch.object(retry_utils, "_policy", retry_utils.RetryPolicy(base_delay=0)):
+        yield
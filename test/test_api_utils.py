@@ -0,0 +1,378 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from hashlib import md5
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+from cloudinary_cli.utils import api_utils
+from cloudinary_cli.utils.api_utils import query_cld_folder, RateLimitThrottle, download_file, upload_file
+
+
+def _search_asset(asset_id, public_id, resource_type="image"):
+    return {"asset_id": asset_id, "public_id": public_id, "type": "upload", "resource_type": resource_type,
+            "format": "jpg", "etag": "etag", "bytes": 1}
+
+
+class QueryCldFolderTest(unittest.TestCase):
+    def test_folder_shards(self):
+        with patch.object(api_utils, "_list_subfolders", return_value=["f/a", "f/b", "f/c"]):
+            shards = api_utils._folder_shards("f", "folder", 2)
+
+        self.assertEqual(['folder="f"', '(folder:"f/a/*")', '(folder:"f/b/*")', '(folder:"f/c/*")'], shards)
+
+    def test_folder_shards_grouped_and_split_by_resource_type(self):
+        # 30 subfolders, 2 workers: groups of 4 subfolders (8 shards) and a shard for the direct assets.
+        with patch.object(api_utils, "_list_subfolders", return_value=[f"f/{i}" for i in range(30)]):
+            self.assertEqual(9, len(api_utils._folder_shards("f", "folder", 2)))
+
+        # Groups are capped in size, to keep the search expressions short.
+        with patch.object(api_utils, "_list_subfolders", return_value=[f"f/{i}" for i in range(1000)]):
+            self.assertEqual(51, len(api_utils._folder_shards("f", "folder", 2)))
+
+        with patch.object(api_utils, "_list_subfolders", return_value=[]):
+            shards = api_utils._folder_shards("f", "asset_folder", 8)
+
+        self.assertEqual(['asset_folder="f" AND resource_type:image', 'asset_folder="f" AND resource_type:video',
+                          'asset_folder="f" AND resource_type:raw'], shards)
+
+    def test_sharded_listing_merges_shards(self):
+        shard_results = {
+            'folder="f" AND status:active': {"resources": [_search_asset("1", "f/x")]},
+            '(folder:"f/a/*") AND status:active': {"resources": [_search_asset("2", "f/a/y")],
+                                                   "next_cursor": "c"},
+            '(folder:"f/a/*") AND status:active/c': {"resources": [_search_asset("3", "f/a/z")]},
+        }
+
+        def execute(self_search, **_):
+            key = self_search.query["expression"]
+            if self_search.query.get("next_cursor"):
+                key += "/" + self_search.query["next_cursor"]
+            return shard_results[key]
+
+        with patch.object(api_utils, "_list_subfolders", return_value=["f/a"]), \
+                patch("cloudinary.Search.execute", autospec=True, side_effect=execute):
+            files = query_cld_folder("f", "fixed", "active", listing_workers=2)
+
+        self.assertEqual({"1", "2", "3"}, set(files.keys()))
+        self.assertEqual("a/z.jpg", files["3"]["normalized_path"])
+
+    def test_asset_without_etag(self):
+        asset = _search_asset("1", "f/x")
+        del asset["etag"]
+
+        with patch.object(api_utils, "_list_subfolders", return_value=[]), \
+                patch("cloudinary.Search.execute", return_value={"resources": [asset]}):
+            files = query_cld_folder("f", "fixed", "active")
+
+        self.assertIsNone(files["1"]["etag"])
+
+    def test_query_subtrees(self):
+        def execute(self_search, **_):
+            self.assertEqual('(folder="f" OR folder:"f/a/*") AND status:active', self_search.query["expression"])
+            return {"resources": [_search_asset("1", "f/x"), _search_asset("2", "f/a/y")]}
+
+        with patch.object(api_utils, "_list_subfolders", return_value=["f/a", "f/b"]):
+            self.assertEqual(["", "a", "b"], api_utils.list_cld_subtree_names("f"))
+
+        with patch("cloudinary.Search.execute", autospec=True, side_effect=execute):
+            files = api_utils.query_cld_subtrees("f", "fixed", ["", "a"], "active")
+
+        self.assertEqual({"x.jpg", "a/y.jpg"}, {f["normalized_path"] for f in files.values()})
+
+    def test_query_etags(self):
+        def execute(self_search, **_):
+            self.assertEqual("etag=aaa OR etag=bbb OR etag=ccc", self_search.query["expression"])
+            if not self_search.query.get("next_cursor"):
+                return {"resources": [{"public_id": "x", "etag": "aaa"}, {"public_id": "y", "etag": "aaa"}],
+                        "next_cursor": "c"}
+            return {"resources": [{"public_id": "z", "etag": "ccc"}]}
+
+        with patch("cloudinary.Search.execute", autospec=True, side_effect=execute):
+            assets = api_utils.query_cld_etags(["ccc", "aaa", "bbb", "aaa"])
+
+        self.assertEqual({"aaa": "x", "ccc": "z"}, {etag: asset["public_id"] for etag, asset in assets.items()})
+
+
+class RateLimitThrottleTest(unittest.TestCase):
+    @staticmethod
+    def _response(remaining, reset_in):
+        return MagicMock(rate_limit_remaining=remaining, rate_limit_reset_at=time.gmtime(time.time() + reset_in))
+
+    def test_waits_for_reset_when_exhausted(self):
+        throttle = RateLimitThrottle(reserve=2)
+        throttle.update(self._response(2, 60))
+
+        with patch("time.sleep") as sleep_mock:
+            throttle.wait()
+
+        self.assertAlmostEqual(60, sleep_mock.call_args[0][0], delta=2)
+
+    def test_does_not_wait_with_calls_remaining(self):
+        throttle = RateLimitThrottle(reserve=2)
+        throttle.update(self._response(3, 60))
+        throttle.update({"deleted": {}})
+
+        with patch("time.sleep") as sleep_mock:
+            throttle.wait()
+
+        sleep_mock.assert_not_called()
+
+
+class UploadFileTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def _file(self, content):
+        file_path = os.path.join(self.dir, "file.bin")
+        with open(file_path, "wb") as f:
+            f.write(content)
+        return file_path
+
+    def test_upload_file_in_chunks(self):
+        content = os.urandom(5 * 1024 + 100)
+        file_path = self._file(content)
+        chunks = []
+        lock = threading.Lock()
+
+        def upload_large_part(file, http_headers=None, **options):
+            with lock:
+                chunks.append((file, http_headers, options))
+            return {"public_id": "file", "asset_id": "1", "type": "upload", "resource_type": "raw"}
+
+        uploaded, failed = {}, {}
+        with patch.object(api_utils.uploader, "upload_large_part", side_effect=upload_large_part), \
+                patch.object(api_utils.uploader, "upload") as upload_mock:
+            upload_file(file_path, {"resource_type": "auto", "chunk_size": 1024}, uploaded, failed)
+
+        upload_mock.assert_not_called()
+        self.assertEqual({}, failed)
+        self.assertIn(file_path, uploaded)
+        self.assertEqual(6, len(chunks))
+        self.assertEqual(1, len({headers["X-Unique-Upload-Id"] for _, headers, _ in chunks}))
+
+        # the first chunk determines the public ID, the last one completes the upload
+        self.assertEqual("bytes 0-1023/5220", chunks[0][1]["Content-Range"])
+        self.assertNotIn("public_id", chunks[0][2])
+        self.assertEqual("bytes 5120-5219/5220", chunks[-1][1]["Content-Range"])
+        self.assertTrue(all(options["public_id"] == "file" for _, _, options in chunks[1:]))
+        self.assertTrue(all("chunk_size" not in options for _, _, options in chunks))
+
+        received = {int(headers["Content-Range"].split()[1].split("-")[0]): data for (_, data), headers, _ in chunks}
+        self.assertEqual(content, b"".join(received[offset] for offset in sorted(received)))
+
+    def test_upload_file_path_in_chunks(self):
+        file_path = self._file(os.urandom(2 * 1024))
+
+        with patch.object(api_utils.uploader, "upload_large_part",
+                          return_value={"public_id": "file", "type": "upload",
+                                        "resource_type": "raw"}) as upload_large_part_mock:
+            uploaded, failed = {}, {}
+            upload_file(Path(file_path), {"chunk_size": 1024}, uploaded, failed)
+
+        self.assertEqual({}, failed)
+        self.assertEqual(2, upload_large_part_mock.call_count)
+        self.assertTrue(all(c.args[0][0] == file_path for c in upload_large_part_mock.call_args_list))
+
+    def test_upload_file_chunk_size_option_string(self):
+        file_path = self._file(os.urandom(2 * 1024))
+
+        with patch.object(api_utils.uploader, "upload_large_part",
+                          return_value={"public_id": "file", "type": "upload",
+                                        "resource_type": "raw"}) as upload_large_part_mock:
+            uploaded, failed = {}, {}
+            upload_file(file_path, {"chunk_size": "1024"}, uploaded, failed)
+
+        self.assertEqual({}, failed)
+        self.assertEqual(2, upload_large_part_mock.call_count)
+
+    def test_small_file_is_uploaded_at_once(self):
+        file_path = self._file(b"content")
+
+        with patch.object(api_utils.uploader, "upload", return_value={"public_id": "file", "type": "upload",
+                                                                      "resource_type": "raw"}) as upload_mock, \
+                patch.object(api_utils.uploader, "upload_large_part") as upload_large_part_mock:
+            upload_file(file_path, {"chunk_size": 1024})
+
+        upload_mock.assert_called_once()
+        upload_large_part_mock.assert_not_called()
+
+
+class DownloadFileTest(unittest.TestCase):
+    CONTENT = b"0123456789" * 1000
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.local_path = os.path.join(self.dir, "sub", "file.jpg")
+
+    def _remote_file(self, content=CONTENT):
+        return {"public_id": "file", "format": "jpg", "type": "upload", "resource_type": "image",
+                "access_mode": "public", "relative_path": "file.jpg", "etag": md5(content).hexdigest(),
+                "updated_at": "2024-01-01T00:00:00Z"}
+
+    def _download(self, remote_file):
+        response = MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_content.side_effect = lambda chunk_size: (self.CONTENT[i:i + 4096]
+                                                                for i in range(0, len(self.CONTENT), 4096))
+        downloaded, failed = {}, {}
+        with patch.object(api_utils, "http_get", return_value=response) as get_mock:
+            download_file(remote_file, self.local_path, downloaded, failed)
+
+        self.assertTrue(get_mock.call_args.kwargs["stream"])
+        return downloaded, failed
+
+    def test_download_file_streamed_and_verified(self):
+        downloaded, failed = self._download(self._remote_file())
+
+        self.assertEqual({"file.jpg": self.local_path}, downloaded)
+        self.assertEqual({}, failed)
+        with open(self.local_path, "rb") as f:
+            self.assertEqual(self.CONTENT, f.read())
+        self.assertEqual(1704067200, os.stat(self.local_path).st_mtime)
+
+    def test_download_file_retried_on_server_error(self):
+        unavailable = MagicMock(status_code=503, headers={"Retry-After": "0"})
+        unavailable.__enter__.return_value = unavailable
+        response = MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [self.CONTENT]
+
+        downloaded, failed = {}, {}
+        with patch.object(api_utils, "http_get", side_effect=[unavailable, response]) as get_mock:
+            download_file(self._remote_file(), self.local_path, downloaded, failed)
+
+        self.assertEqual(2, get_mock.call_count)
+        self.assertEqual({"file.jpg": self.local_path}, downloaded)
+        self.assertEqual({}, failed)
+
+    def test_download_file_without_etag(self):
+        downloaded, failed = self._download(dict(self._remote_file(), etag=None))
+
+        self.assertEqual({"file.jpg": self.local_path}, downloaded)
+        self.assertEqual({}, failed)
+
+    def test_download_file_checksum_mismatch(self):
+        downloaded, failed = self._download(self._remote_file(b"other"))
+
+        self.assertEqual({}, downloaded)
+        self.assertEqual(1, len(failed))
+        self.assertEqual([], os.listdir(os.path.dirname(self.local_path)))
+
+    def _range_response(self, content, ranges_supported=True):
+        def response_for(url, headers=None, stream=False):
+            if not ranges_supported or not headers:
+                response = MagicMock(status_code=200, headers={})
+                response.iter_content.return_value = [content]
+            else:
+                start, end = map(int, headers["Range"][len("bytes="):].split("-"))
+                response = MagicMock(status_code=206, headers={"Content-Range": f"bytes {start}-{end}/{len(content)}"})
+                response.iter_content.return_value = [content[start:end + 1]]
+            response.__enter__.return_value = response
+            return response
+
+        return response_for
+
+    def test_download_file_in_ranges(self):
+        content = os.urandom(5 * 1024)
+        remote_file = dict(self._remote_file(content), bytes=len(content))
+        downloaded, failed = {}, {}
+
+        with patch.object(api_utils, "_DOWNLOAD_RANGE_SIZE", 1024), \
+                patch.object(api_utils, "http_get", side_effect=self._range_response(content)) as get_mock:
+            download_file(remote_file, self.local_path, downloaded, failed, ranged_download_threshold=1024)
+
+        self.assertEqual(5, get_mock.call_count)
+        self.assertEqual({}, failed)
+        with open(self.local_path, "rb") as f:
+            self.assertEqual(content, f.read())
+        self.assertEqual(["file.jpg"], os.listdir(os.path.dirname(self.local_path)))
+
+    def test_download_file_in_ranges_not_supported(self):
+        content = os.urandom(5 * 1024)
+        remote_file = dict(self._remote_file(content), bytes=len(content))
+        downloaded, failed = {}, {}
+
+        with patch.object(api_utils, "_DOWNLOAD_RANGE_SIZE", 1024), \
+                patch.object(api_utils, "http_get",
+                             side_effect=self._range_response(content, ranges_supported=False)) as get_mock:
+            download_file(remote_file, self.local_path, downloaded, failed, ranged_download_threshold=1024)
+
+        self.assertEqual({}, failed)
+        self.assertNotIn("headers", get_mock.call_args.kwargs)
+        with open(self.local_path, "rb") as f:
+            self.assertEqual(content, f.read())
+        self.assertEqual(["file.jpg"], os.listdir(os.path.dirname(self.local_path)))
+
+    def test_download_file_in_ranges_checksum_mismatch_starts_over(self):
+        content = os.urandom(5 * 1024)
+        remote_file = dict(self._remote_file(content), bytes=len(content))
+
+        with patch.object(api_utils, "_DOWNLOAD_RANGE_SIZE", 1024):
+            failed = {}
+            with patch.object(api_utils, "http_get", side_effect=self._range_response(os.urandom(5 * 1024))):
+                download_file(remote_file, self.local_path, failed=failed, ranged_download_threshold=1024)
+            self.assertEqual(1, len(failed))
+            self.assertEqual([], os.listdir(os.path.dirname(self.local_path)))
+
+            with patch.object(api_utils, "http_get", side_effect=self._range_response(content)) as get_mock:
+                download_file(remote_file, self.local_path, ranged_download_threshold=1024)
+
+        self.assertEqual(5, get_mock.call_count)
+        with open(self.local_path, "rb") as f:
+            self.assertEqual(content, f.read())
+
+    def test_download_file_in_ranges_failed_range_waits_for_others(self):
+        content = os.urandom(5 * 1024)
+        remote_file = dict(self._remote_file(content), bytes=len(content))
+        response = self._range_response(content)
+
+        def fail_first_range(url, headers=None, stream=False):
+            if headers["Range"].startswith("bytes=0-"):
+                raise api_utils.DownloadError("not found", 404)
+            time.sleep(0.1)
+            return response(url, headers, stream)
+
+        # Fewer workers than ranges, so ranges are still queued when the first one fails.
+        with patch.object(api_utils, "_DOWNLOAD_RANGE_SIZE", 1024), \
+                patch.object(api_utils, "_DOWNLOAD_RANGE_WORKERS", 2):
+            failed = {}
+            with patch.object(api_utils, "http_get", side_effect=fail_first_range):
+                download_file(remote_file, self.local_path, failed=failed, ranged_download_threshold=1024)
+            self.assertEqual(["not found"], list(failed.values()))
+
+            with patch.object(api_utils, "http_get", side_effect=self._range_response(content)) as get_mock:
+                download_file(remote_file, self.local_path, ranged_download_threshold=1024)
+
+        get_mock.assert_called_once()
+        self.assertEqual("bytes=0-1023", get_mock.call_args.kwargs["headers"]["Range"])
+
+    def test_download_file_in_ranges_resumed(self):
+        content = os.urandom(5 * 1024)
+        remote_file = dict(self._remote_file(content), bytes=len(content))
+        failing_response = self._range_response(content)
+
+        def fail_last_range(url, headers=None, stream=False):
+            if headers["Range"].startswith("bytes=4096-"):
+                raise api_utils.requests.ConnectionError("connection reset")
+            return failing_response(url, headers, stream)
+
+        with patch.object(api_utils, "_DOWNLOAD_RANGE_SIZE", 1024):
+            failed = {}
+            with patch.object(api_utils, "http_get", side_effect=fail_last_range):
+                download_file(remote_file, self.local_path, failed=failed, ranged_download_threshold=1024)
+            self.assertEqual(1, len(failed))
+            self.assertFalse(os.path.exists(self.local_path))
+
+            with patch.object(api_utils, "http_get", side_effect=self._range_response(content)) as get_mock:
+                download_file(remote_file, self.local_path, ranged_download_threshold=1024)
+
+        get_mock.assert_called_once()
+        self.assertEqual("bytes=4096-5119", get_mock.call_args.kwargs["headers"]["Range"])
+        with open(self.local_path, "rb") as f:
+            self.assertEqual(content, f.read())
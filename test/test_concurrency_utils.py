@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+
+from unittest.mock import patch
+
+import click
+
+from cloudinary_cli.utils import concurrency_utils
+from cloudinary_cli.utils.concurrency_utils import AdaptiveConcurrency, ConcurrencyParamType, report_congestion, \
+    report_task_size
+from cloudinary_cli.utils.utils import run_tasks_concurrently
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+    def test_limit_grows_only_while_fully_used(self):
+        controller = AdaptiveConcurrency(initial=1, maximum=4)
+        for _ in range(10):
+            controller.run(lambda: None, ())
+
+        # sequential tasks use a single slot, the limit does not grow beyond it
+        self.assertEqual(2, controller.limit)
+
+        # latency spikes of a loaded test machine must not decrease the limit
+        with patch.object(concurrency_utils, "_LATENCY_TOLERANCE", float("inf")):
+            run_tasks_concurrently(time.sleep, [(0.01,)] * 50, controller)
+
+        self.assertEqual(4, controller.limit)
+
+    def test_limit_is_halved_on_congestion_once_per_round_trip(self):
+        controller = AdaptiveConcurrency(initial=16)
+        controller.run(lambda: time.sleep(0.05), ())
+
+        controller.run(report_congestion, ())
+        controller.run(report_congestion, (True,))
+
+        self.assertEqual(8, controller.limit)
+
+    def test_large_tasks_are_not_mistaken_for_congestion(self):
+        def complete(controller, latency, size):
+            controller._acquire()
+            controller._release(latency, concurrency_utils._size_class(size))
+
+        for small_size, large_size, decreased in ((1024, 100 * 1024 * 1024, False), (None, None, True)):
+            with self.subTest(decreased=decreased):
+                controller = AdaptiveConcurrency(initial=16)
+                for _ in range(20):
+                    complete(controller, 0.01, small_size)
+                for _ in range(5):
+                    complete(controller, 1.0, large_size)
+
+                self.assertEqual(decreased, controller.limit < 16)
+
+    def test_task_size_outside_of_adaptive_task_is_ignored(self):
+        report_task_size(1024)
+        self.assertIsNone(getattr(concurrency_utils._task_state, "size", None))
+
+    def test_congestion_outside_of_adaptive_task_is_ignored(self):
+        report_congestion()
+
+    def test_in_flight_tasks_are_limited(self):
+        controller = AdaptiveConcurrency(initial=2, maximum=2)
+        lock = threading.Lock()
+        in_flight = []
+        max_in_flight = []
+
+        def task(i):
+            with lock:
+                in_flight.append(i)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(i)
+
+        run_tasks_concurrently(task, [(i,) for i in range(20)], controller)
+
+        self.assertEqual(20, len(max_in_flight))
+        self.assertLessEqual(max(max_in_flight), 2)
+
+
+class ConcurrencyParamTypeTest(unittest.TestCase):
+    def test_convert(self):
+        param_type = ConcurrencyParamType()
+
+        self.assertEqual(10, param_type.convert("10", None, None))
+        self.assertIsInstance(param_type.convert("auto", None, None), AdaptiveConcurrency)
+        with self.assertRaises(click.BadParameter):
+            param_type.convert("many", None, None)
+        with self.assertRaises(click.BadParameter):
+            param_type.convert("0", None, None)
@@ -0,0 +1,66 @@
+import unittest
+
+from cloudinary_cli.utils.api_utils import RemoteFile
+from cloudinary_cli.utils.diff_store import SyncDiffStore
+
+
+def _remote_file(asset_id, name, etag="etag", size=4):
+    return RemoteFile(asset_id=asset_id, normalized_path=name, normalized_unique_path=name, type="upload",
+                      resource_type="image", public_id=name.rsplit(".", 1)[0], format="jpg", etag=etag, bytes=size,
+                      relative_path=name, access_mode="public", created_at=None, updated_at=None)
+
+
+class SyncDiffStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = SyncDiffStore()
+        self.addCleanup(self.store.close)
+
+    def _fill(self, local_files, remote_files, hash_cache=(), recovered_names=None):
+        self.store.add_hash_cache(hash_cache)
+        self.store.add_local_files((name, name, f"/local/{name}", (4, 1, 1)) for name in local_files)
+        self.store.add_remote_files(remote_files, recovered_names or {})
+        self.store.create_indexes()
+
+    def test_diff(self):
+        self._fill(["a.jpg", "b.jpg"], [_remote_file("1", "b.jpg"), _remote_file("2", "c.jpg")])
+
+        self.assertEqual(["a.jpg"], [name for name, _ in self.store.iter_unique_local_files()])
+        self.assertEqual(["2"], [f["asset_id"] for f in self.store.iter_unique_remote_files()])
+        self.assertEqual([("b.jpg", "1")], [(name, f["asset_id"]) for name, _, f in self.store.iter_common_files()])
+        self.assertEqual(1, self.store.count_unique_local_files())
+        self.assertEqual(1, self.store.count_unique_remote_files())
+
+    def test_diverse_file_names(self):
+        self.store.add_local_files([("a b.jpg", "a_b.jpg", "/local/a b.jpg", (4, 1, 1))])
+        self.store.add_remote_files([_remote_file("1", "a_b.jpg")], {"a_b.jpg": "a b.jpg"})
+        self.store.create_indexes()
+
+        self.assertEqual(["a b.jpg"], [name for name, _, _ in self.store.iter_common_files()])
+        self.assertEqual(0, self.store.count_unique_local_files())
+        self.assertEqual(0, self.store.count_unique_remote_files())
+
+    def test_etags_of_unchanged_files_are_taken_from_hash_cache(self):
+        self._fill(["a.jpg", "b.jpg"], [], hash_cache=[("a.jpg", (4, 1, 1, "cached")), ("b.jpg", (4, 2, 1, "old"))])
+
+        self.assertEqual("cached", self.store.local_files["a.jpg"]["etag"])
+        self.assertIsNone(self.store.local_files["b.jpg"]["etag"])
+        self.assertEqual([("a.jpg", (4, 1, 1, "cached"))], list(self.store.iter_hash_cache()))
+
+    def test_paging_does_not_revisit_updated_rows(self):
+        names = [f"{i}.jpg" for i in range(2500)]
+        self._fill(names, [])
+
+        visited = []
+        for name, _ in self.store.iter_unique_local_files():
+            self.store.put_local_file(name, name, f"/local/{name}", (4, 1, 1), "etag")
+            visited.append(name)
+
+        self.assertEqual(names, visited)
+
+    def test_duplicate_remote_names(self):
+        self._fill(["a.jpg", "a (1).jpg", "b.jpg"],
+                   [_remote_file("1", "a.jpg"), _remote_file("2", "a.jpg"), _remote_file("3", "a (1).jpg")])
+
+        self.assertEqual({"a.jpg": {"1", "2"}}, self.store.duplicate_remote_names())
+        self.assertEqual({"1", "2", "3"}, set(self.store.remote_files_by_base_names(["a.jpg"]).keys()))
+        self.assertEqual({"a.jpg", "a (1).jpg"}, set(self.store.local_file_names_by_base_names(["a.jpg"])))
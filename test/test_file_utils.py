@@ -11,6 +11,12 @@ from cloudinary_cli.utils.file_utils import (
     walk_dir,
     normalize_file_extension,
     atomic_write,
+    read_hash_cache,
+    write_hash_cache,
+    hash_files,
+    populate_etags,
+    populate_duplicate_name,
+    strip_duplicate_name_index,
 )
 from test.helper_test import RESOURCES_DIR
 
@@ -44,6 +50,20 @@ class FileUtilsTest(unittest.TestCase):
         }.items():
             self.assertEqual(expected, normalize_file_extension(value))
 
+    def test_strip_duplicate_name_index(self):
+        for value, expected in {
+            "sample (2).jpg": "sample.jpg",
+            "dir/sample (10).jpg": "dir/sample.jpg",
+            "sample (1)": "sample",
+            "sample (1) (2).jpg": "sample (1).jpg",
+            "sample.jpg": "sample.jpg",
+            "sample (a).jpg": "sample (a).jpg",
+            "sample(1).jpg": "sample(1).jpg",
+        }.items():
+            self.assertEqual(expected, strip_duplicate_name_index(value))
+
+        self.assertEqual("sample.jpg", strip_duplicate_name_index(populate_duplicate_name("sample.jpg", 3)))
+
 
 class AtomicWriteTest(unittest.TestCase):
     def setUp(self):
@@ -182,3 +202,73 @@ class AtomicWriteTest(unittest.TestCase):
             self.assertEqual("new", f.read())
         self.assertEqual(0o644, stat.S_IMODE(os.stat(self.path).st_mode))
         self.assertEqual([], self._leftover())
+
+
+class HashCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.dir, ".cache")
+        self.tree = os.path.join(self.dir, "tree")
+        os.makedirs(os.path.join(self.tree, "sub"))
+        for name, content in {"a.jpg": b"a", "sub/b.png": b"bb"}.items():
+            with open(os.path.join(self.tree, name), "wb") as f:
+                f.write(content)
+
+    def test_cache_round_trip(self):
+        cache = {"sub/with\ttab.jpg": (10, 123456789, 42, "etag1"), "a.jpg": (1, 2, 3, "etag2")}
+        write_hash_cache(cache, self.cache_file)
+
+        self.assertEqual(cache, read_hash_cache(self.cache_file))
+
+    def test_missing_or_unknown_cache_is_empty(self):
+        self.assertEqual({}, read_hash_cache(self.cache_file))
+
+        with open(self.cache_file, "w") as f:
+            f.write("{}")
+
+        self.assertEqual({}, read_hash_cache(self.cache_file))
+
+    def test_walk_dir_does_not_rehash_unchanged_files(self):
+        cache = {}
+        files = walk_dir(self.tree, hash_cache=cache)
+        self.assertEqual({"a.jpg", "sub/b.png"}, set(cache.keys()))
+
+        with patch("cloudinary_cli.utils.file_utils.etag") as etag_mock:
+            self.assertEqual(files, walk_dir(self.tree, hash_cache=cache))
+        etag_mock.assert_not_called()
+
+    def test_walk_dir_rehashes_changed_files_and_prunes_stale_entries(self):
+        cache = {}
+        walk_dir(self.tree, hash_cache=cache)
+
+        with open(os.path.join(self.tree, "a.jpg"), "wb") as f:
+            f.write(b"changed")
+        os.remove(os.path.join(self.tree, "sub", "b.png"))
+
+        files = walk_dir(self.tree, hash_cache=cache)
+
+        self.assertEqual({"a.jpg"}, set(cache.keys()))
+        self.assertEqual(7, cache["a.jpg"][0])
+        self.assertEqual(cache["a.jpg"][3], files["a.jpg"]["etag"])
+
+    def test_walk_dir_parallel_hashing(self):
+        self.assertEqual(walk_dir(self.tree), walk_dir(self.tree, hash_cache={}, hash_workers=4))
+
+    def test_hash_files_keeps_order(self):
+        paths = [os.path.join(self.tree, "sub", "b.png"), os.path.join(self.tree, "a.jpg")] * 10
+
+        self.assertEqual(hash_files(paths), hash_files(paths, hash_workers=4))
+
+    def test_walk_dir_lazy_etags(self):
+        with patch("cloudinary_cli.utils.file_utils.etag") as etag_mock:
+            files = walk_dir(self.tree, lazy_etags=True)
+        etag_mock.assert_not_called()
+        self.assertIsNone(files["a.jpg"]["etag"])
+        self.assertEqual(2, files["sub/b.png"]["size"])
+
+        cache = {}
+        populate_etags(files, ["a.jpg"], cache)
+
+        self.assertEqual(walk_dir(self.tree)["a.jpg"]["etag"], files["a.jpg"]["etag"])
+        self.assertIsNone(files["sub/b.png"]["etag"])
+        self.assertEqual({"a.jpg"}, set(cache.keys()))
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+
+from cloudinary_cli.defaults import HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS
+from cloudinary_cli.utils import http_utils
+from cloudinary_cli.utils.http_utils import http_session, http_get, configure_http_pool, configure_sdk_pool, \
+    DEFAULT_POOL_SIZE
+
+
+class HttpUtilsTest(unittest.TestCase):
+    def tearDown(self):
+        configure_http_pool(DEFAULT_POOL_SIZE)
+
+    def test_session_is_shared(self):
+        self.assertIs(http_session(), http_session())
+
+    def test_configure_http_pool(self):
+        configure_http_pool(DEFAULT_POOL_SIZE)
+        session = http_session()
+
+        configure_http_pool(DEFAULT_POOL_SIZE)
+        self.assertIs(session, http_session())
+
+        configure_http_pool(32)
+        resized_session = http_session()
+        self.assertIsNot(session, resized_session)
+        self.assertEqual(32, resized_session.get_adapter("https://res.cloudinary.com")._pool_maxsize)
+
+    def test_http_get_default_timeout(self):
+        with patch.object(http_utils.requests.Session, "get") as get_mock:
+            http_get("https://res.cloudinary.com/demo/image/upload/sample.jpg")
+            http_get("https://res.cloudinary.com/demo/image/upload/sample.jpg", timeout=5)
+
+        self.assertEqual((HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS),
+                         get_mock.call_args_list[0].kwargs["timeout"])
+        self.assertEqual(5, get_mock.call_args_list[1].kwargs["timeout"])
+
+    def test_configure_sdk_pool(self):
+        with patch.object(http_utils.uploader, "_http", http_utils.uploader._http), \
+                patch.object(http_utils.api_client, "_http", http_utils.api_client._http), \
+                patch.object(http_utils, "_sdk_pool_size", None):
+            configure_sdk_pool(32)
+            connector = http_utils.uploader._http
+
+            self.assertIs(connector, http_utils.api_client._http)
+            self.assertEqual(32, connector.connection_pool_kw["maxsize"])
+            # failures after the request is sent are left to the retry policy
+            self.assertEqual(0, connector.connection_pool_kw["retries"].read)
+
+            configure_sdk_pool(32)
+            self.assertIs(connector, http_utils.uploader._http)
+
+            configure_sdk_pool(1)
+            self.assertEqual(DEFAULT_POOL_SIZE, http_utils.uploader._http.connection_pool_kw["maxsize"])
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudinary_cli.utils.journal_utils import Journal
+
+
+class JournalTest(unittest.TestCase):
+    HEADER = {"remote_folder": "remote", "folder_mode": "fixed"}
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.path = os.path.join(self.dir, "journal")
+
+    def _journal(self, header=None):
+        return Journal(self.path, header or self.HEADER)
+
+    def test_replay_recorded_entries(self):
+        journal = self._journal()
+        journal.open()
+        journal.record({"path": "a"})
+        journal.record({"path": "b"})
+        journal.close()
+
+        self.assertEqual([{"path": "a"}, {"path": "b"}], self._journal().replay())
+
+    def test_replay_missing_journal(self):
+        self.assertEqual([], self._journal().replay())
+
+    def test_replay_skips_torn_line(self):
+        journal = self._journal()
+        journal.open()
+        journal.record({"path": "a"})
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"path": "b"')
+
+        self.assertEqual([{"path": "a"}], self._journal().replay())
+
+    def test_replay_ignores_journal_of_other_operation(self):
+        journal = self._journal()
+        journal.open()
+        journal.record({"path": "a"})
+        journal.close()
+
+        self.assertEqual([], self._journal({"remote_folder": "other", "folder_mode": "fixed"}).replay())
+
+    def test_open_append(self):
+        journal = self._journal()
+        journal.open()
+        journal.record({"path": "a"})
+        journal.close()
+
+        journal.open(append=True)
+        journal.record({"path": "b"})
+        journal.close()
+        self.assertEqual([{"path": "a"}, {"path": "b"}], journal.replay())
+
+        journal.open()
+        journal.close()
+        self.assertEqual([], journal.replay())
+
+    def test_close_remove(self):
+        journal = self._journal()
+        journal.open()
+        journal.close(remove=True)
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_rewrite(self):
+        journal = self._journal()
+        journal.open()
+        journal.record({"path": "a", "size": 1})
+        journal.record({"path": "a", "size": 2})
+        journal.close()
+
+        journal.rewrite([{"path": "a", "size": 2}])
+
+        self.assertEqual([{"path": "a", "size": 2}], self._journal().replay())
+        self.assertEqual(["journal"], os.listdir(self.dir))
@@ -1,5 +1,9 @@
+import os
+import shutil
+import tempfile
 import time
 import unittest
+from hashlib import md5
 from unittest.mock import patch
 
 from click.testing import CliRunner
@@ -71,3 +75,92 @@ class TestCLIUploadDir(unittest.TestCase):
 
         self.assertIn("raw/upload", get_request_url(mocker))
         self.assertTrue(get_params(mocker)['unique_filename'])
+
+
+class TestCLIUploadDirIncremental(unittest.TestCase):
+    runner = CliRunner()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.dir, "sub"))
+        for name in ("a.bin", "b.bin", os.path.join("sub", "c.bin")):
+            with open(os.path.join(self.dir, name), "w") as f:
+                f.write(name)
+
+    def _upload_dir(self, *args, folder="folder"):
+        with patch(URLLIB3_REQUEST, return_value=UPLOAD_MOCK_RESPONSE) as mocker:
+            result = self.runner.invoke(cli, ["upload_dir", self.dir, "-f", folder, "-fm", "fixed", "-i", *args])
+        self.assertEqual(0, result.exit_code, result.output)
+        return result.output, mocker.call_count
+
+    def test_upload_dir_incremental(self):
+        output, upload_count = self._upload_dir()
+        self.assertIn("3 resources uploaded", output)
+        self.assertEqual(3, upload_count)
+
+        output, upload_count = self._upload_dir()
+        self.assertIn("0 resources uploaded", output)
+        self.assertIn("3 unchanged files skipped", output)
+        self.assertEqual(0, upload_count)
+
+        with open(os.path.join(self.dir, "sub", "c.bin"), "a") as f:
+            f.write("modified")
+        with open(os.path.join(self.dir, "d.bin"), "w") as f:
+            f.write("new")
+
+        output, upload_count = self._upload_dir()
+        self.assertIn("2 resources uploaded", output)
+        self.assertIn("2 unchanged files skipped", output)
+        self.assertEqual(2, upload_count)
+
+        # the manifest is not uploaded, even with the hidden files
+        output, upload_count = self._upload_dir("-H")
+        self.assertEqual(0, upload_count)
+
+    def test_upload_dir_incremental_other_folder(self):
+        self._upload_dir()
+
+        output, upload_count = self._upload_dir(folder="other")
+        self.assertIn("3 resources uploaded", output)
+        self.assertEqual(3, upload_count)
+
+    def test_upload_dir_incremental_other_upload_options(self):
+        self._upload_dir()
+
+        output, upload_count = self._upload_dir("-t", "w_100")
+        self.assertIn("3 resources uploaded", output)
+        self.assertEqual(3, upload_count)
+
+        output, upload_count = self._upload_dir("-t", "w_100")
+        self.assertEqual(0, upload_count)
+
+
+class TestCLIUploadDirDedupe(unittest.TestCase):
+    runner = CliRunner()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        for name in ("a.bin", "b.bin", "c.bin"):
+            with open(os.path.join(self.dir, name), "w") as f:
+                f.write(name)
+
+    def test_upload_dir_dedupe(self):
+        existing_etag = md5(b"b.bin").hexdigest()
+        existing_asset = {"public_id": "copies/b.bin", "etag": existing_etag, "resource_type": "raw",
+                          "type": "upload"}
+
+        with patch("cloudinary_cli.modules.upload_dir.query_cld_etags",
+                   return_value={existing_etag: existing_asset}) as query_mock, \
+                patch(URLLIB3_REQUEST, return_value=UPLOAD_MOCK_RESPONSE) as upload_mock:
+            result = self.runner.invoke(cli, ["upload_dir", self.dir, "-f", "folder", "-fm", "fixed", "-D"])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        query_mock.assert_called_once()
+        self.assertEqual({md5(name.encode()).hexdigest() for name in ("a.bin", "b.bin", "c.bin")},
+                         set(query_mock.call_args.args[0]))
+        self.assertEqual(2, upload_mock.call_count)
+        self.assertIn("2 resources uploaded", result.output)
+        self.assertIn("its content already exists as copies/b.bin", result.output)
+        self.assertIn("1 files skipped, their content already exists in the cloud", result.output)
@@ -0,0 +1,450 @@
+import importlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from hashlib import md5
+from unittest.mock import patch, MagicMock
+
+from cloudinary import uploader
+
+sync_module = importlib.import_module('cloudinary_cli.modules.sync')
+
+
+def _remote_asset(asset_id, public_id, content, fmt="jpg"):
+    return {
+        "asset_id": asset_id,
+        "normalized_path": f"{public_id}.{fmt}",
+        "normalized_unique_path": f"{public_id}.{fmt}",
+        "type": "upload",
+        "resource_type": "image",
+        "public_id": public_id,
+        "format": fmt,
+        "etag": md5(content).hexdigest(),
+        "bytes": len(content),
+        "relative_path": f"{public_id}.{fmt}",
+        "access_mode": "public",
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-01-01T00:00:00Z",
+        "asset_folder": None,
+        "display_name": None,
+        "relative_display_path": "",
+    }
+
+
+def _md5_file(file_path):
+    with open(file_path, "rb") as f:
+        return md5(f.read()).hexdigest()
+
+
+class TestSyncDir(unittest.TestCase):
+    """SyncDir diff logic, with the Cloudinary folder listing mocked."""
+
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local_dir, ignore_errors=True)
+        self.remote_files = {}
+
+    def _write_local(self, name, content):
+        full_path = os.path.join(self.local_dir, name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(content)
+
+    def _sync_dir(self, query_mock=None, **kwargs):
+        options = dict(include_hidden=False, concurrent_workers=1, force=True, keep_deleted=False,
+                       deletion_batch_size=100, folder_mode="fixed", status=None, optional_parameter=(),
+                       optional_parameter_parsed=(), dry_run=False)
+        options.update(kwargs)
+        query_mock = query_mock or MagicMock(return_value=dict(self.remote_files))
+        with patch.object(sync_module, "cld_folder_exists", return_value=True), \
+                patch.object(sync_module, "query_cld_folder", query_mock):
+            return sync_module.SyncDir(self.local_dir, "remote", **options)
+
+    def test_size_mismatch_is_out_of_sync_without_hashing(self):
+        self._write_local("a.jpg", b"local content")
+        self.remote_files["1"] = _remote_asset("1", "a", b"remote")
+
+        with patch("cloudinary_cli.utils.file_utils.etag") as etag_mock:
+            sync_dir = self._sync_dir()
+
+        etag_mock.assert_not_called()
+        self.assertEqual({"a.jpg"}, sync_dir.out_of_sync_local_file_names)
+
+    def test_only_common_files_of_same_size_are_hashed(self):
+        self._write_local("a.jpg", b"same")
+        self._write_local("b.jpg", b"diff")
+        self._write_local("unique.jpg", b"unique")
+        self.remote_files["1"] = _remote_asset("1", "a", b"same")
+        self.remote_files["2"] = _remote_asset("2", "b", b"DIFF")
+
+        with patch("cloudinary_cli.utils.file_utils.etag", side_effect=_md5_file) as etag_mock:
+            sync_dir = self._sync_dir()
+
+        self.assertEqual(2, etag_mock.call_count)
+        self.assertEqual({"b.jpg"}, sync_dir.out_of_sync_local_file_names)
+        self.assertEqual({"unique.jpg"}, sync_dir.unique_local_file_names)
+        self.assertEqual(1, sync_dir.synced_files_count)
+
+    def test_hash_cache_is_reused(self):
+        self._write_local("a.jpg", b"same")
+        self.remote_files["1"] = _remote_asset("1", "a", b"same")
+        self._sync_dir()
+
+        with patch("cloudinary_cli.utils.file_utils.etag") as etag_mock:
+            sync_dir = self._sync_dir()
+
+        etag_mock.assert_not_called()
+        self.assertEqual(1, sync_dir.synced_files_count)
+
+    def test_incremental_listing_merges_changes_into_manifest(self):
+        self._write_local("a.jpg", b"same")
+        self.remote_files["1"] = _remote_asset("1", "a", b"same")
+        self._sync_dir(incremental_listing=True)
+
+        changed = _remote_asset("2", "b", b"new")
+        changed["updated_at"] = "2024-02-01T00:00:00Z"
+        query_mock = MagicMock(return_value={"2": changed})
+        sync_dir = self._sync_dir(query_mock, incremental_listing=True)
+
+        query_mock.assert_called_once_with("remote", "fixed", None, updated_since="2023-12-31T23:50:00Z",
+                                           listing_workers=1)
+        self.assertEqual({"a.jpg", "b.jpg"}, set(sync_dir.remote_files.keys()))
+        self.assertEqual({"1", "2"}, set(sync_dir.remote_manifest["assets"].keys()))
+
+    def test_full_reconcile_lists_whole_folder(self):
+        self.remote_files["1"] = _remote_asset("1", "a", b"same")
+        self._sync_dir(incremental_listing=True)
+        del self.remote_files["1"]
+
+        sync_dir = self._sync_dir(incremental_listing=True, full_reconcile=True)
+
+        self.assertEqual({}, sync_dir.remote_files)
+
+    def _write_journal(self, *entries):
+        journal = sync_module.Journal(os.path.join(self.local_dir, sync_module._SYNC_JOURNAL_FILE),
+                                      {"remote_folder": "remote", "folder_mode": "fixed"})
+        journal.open()
+        for entry in entries:
+            journal.record(entry)
+        journal.close()
+
+    def _upload_entry(self, name, content):
+        st = os.stat(os.path.join(self.local_dir, name))
+        return {"op": "upload", "path": name, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                "etag": md5(content).hexdigest(), "remote": {"path": f"remote/{name}", "display_path": None}}
+
+    def test_resume_skips_files_transferred_by_interrupted_sync(self):
+        self._write_local("a.jpg", b"uploaded")
+        self._write_local("b.jpg", b"not uploaded")
+        self._write_journal(self._upload_entry("a.jpg", b"uploaded"))
+
+        sync_dir = self._sync_dir(resume=True)
+
+        self.assertEqual({"b.jpg"}, sync_dir.unique_local_file_names)
+
+    def test_resume_uploads_files_modified_since_journaled(self):
+        self._write_local("a.jpg", b"uploaded")
+        entry = self._upload_entry("a.jpg", b"uploaded")
+        entry["mtime_ns"] -= 1
+        self._write_journal(entry)
+
+        sync_dir = self._sync_dir(resume=True)
+
+        self.assertEqual({"a.jpg"}, sync_dir.unique_local_file_names)
+
+    def test_journal_is_ignored_without_resume(self):
+        self._write_local("a.jpg", b"uploaded")
+        self._write_journal(self._upload_entry("a.jpg", b"uploaded"))
+
+        sync_dir = self._sync_dir()
+
+        self.assertEqual({"a.jpg"}, sync_dir.unique_local_file_names)
+
+    def test_watch_pushes_settled_changes(self):
+        self._write_local("a.jpg", b"same")
+        self.remote_files["1"] = _remote_asset("1", "a", b"same")
+        sync_dir = self._sync_dir()
+        sync_dir._start_watch()
+
+        def upload_mock(file_path, options, uploaded, failed, on_success):
+            result = {"public_id": "remote/b", "asset_id": "2", "type": "upload", "resource_type": "image",
+                      "etag": _md5_file(file_path), "bytes": os.path.getsize(file_path)}
+            uploaded[file_path] = {"path": "remote/b.jpg", "display_path": None}
+            on_success(file_path, result)
+
+        with patch.object(sync_module, "upload_file", side_effect=upload_mock) as upload_file_mock:
+            self._write_local("b.jpg", b"new")
+            sync_dir._watch_step()
+            upload_file_mock.assert_not_called()
+
+            sync_dir._watch_step()
+            upload_file_mock.assert_called_once()
+            self.assertEqual(os.path.join(os.path.abspath(self.local_dir), "b.jpg"),
+                             upload_file_mock.call_args[0][0])
+
+            sync_dir._watch_step()
+            upload_file_mock.assert_called_once()
+
+        self.assertEqual("2", sync_dir.recovered_remote_files["b.jpg"]["asset_id"])
+
+    def test_watch_deletes_remote_files_of_deleted_local_files(self):
+        self._write_local("a.jpg", b"same")
+        self.remote_files["1"] = _remote_asset("1", "a", b"same")
+        sync_dir = self._sync_dir()
+        sync_dir._start_watch()
+
+        os.remove(os.path.join(self.local_dir, "a.jpg"))
+        with patch.object(sync_module, "call_api",
+                          return_value={"deleted": {"a": "deleted"}}) as call_api_mock:
+            sync_dir._watch_step()
+
+        call_api_mock.assert_called_once_with(sync_module.api.delete_resources, ["a"], invalidate=True,
+                                              resource_type="image", type="upload")
+
+    def test_unique_remote_files_are_deleted_in_full_batches_by_type(self):
+        for i in range(250):
+            resource_type = "image" if i % 2 else "video"
+            self.remote_files[str(i)] = dict(_remote_asset(str(i), f"file{i}", b"remote"),
+                                             resource_type=resource_type)
+        sync_dir = self._sync_dir()
+
+        def delete_mock(func, public_ids, **kwargs):
+            return {"deleted": {public_id: "deleted" for public_id in public_ids}}
+
+        with patch.object(sync_module, "call_api", side_effect=delete_mock) as call_api_mock:
+            self.assertTrue(sync_dir._handle_unique_remote_files())
+
+        batches = sorted((c.kwargs["resource_type"], len(c.args[1])) for c in call_api_mock.call_args_list)
+        self.assertEqual([("image", 25), ("image", 100), ("video", 25), ("video", 100)], batches)
+
+    def test_duplicate_remote_names_are_matched_to_local_files_by_etag(self):
+        for i, content in enumerate([b"first", b"second", b"third", b"fourth"]):
+            self.remote_files[str(i)] = dict(_remote_asset(str(i), f"dup{i}", content),
+                                             normalized_path="a.jpg", normalized_unique_path="a.jpg",
+                                             created_at=f"2024-01-0{i + 1}T00:00:00Z")
+        self._write_local("a.jpg", b"second")
+        self._write_local("a (2).jpg", b"fourth")
+        self._write_local("a (7).jpg", b"other")
+        self._write_local("ab.jpg", b"first")
+
+        sync_dir = self._sync_dir()
+
+        self.assertEqual({"a.jpg": "1", "a (2).jpg": "3", "a (1).jpg": "0", "a (3).jpg": "2"},
+                         {f: dt["asset_id"] for f, dt in sync_dir.remote_files.items()})
+
+    def test_partial_downloads_are_not_synced(self):
+        self._write_local("a.jpg", b"same")
+        self._write_local("video.mp4.cld-part", b"partial")
+        self._write_local("video.mp4.cld-part-journal", b"{}")
+
+        sync_dir = self._sync_dir()
+
+        self.assertEqual({"a.jpg"}, set(sync_dir.local_files.keys()))
+
+    def test_renamed_files_are_renamed_on_push(self):
+        self._write_local("new/b.jpg", b"content")
+        self.remote_files["1"] = _remote_asset("1", "a", b"content")
+        self.remote_files["2"] = _remote_asset("2", "c", b"deleted")
+
+        sync_dir = self._sync_dir(detect_renames=True)
+
+        self.assertEqual({"new/b.jpg": "a.jpg"}, sync_dir.renamed_file_names)
+        self.assertEqual(set(), sync_dir.unique_local_file_names)
+        self.assertEqual({"c.jpg"}, sync_dir.unique_remote_file_names)
+
+        rename_result = {"public_id": "remote/new/b", "format": "jpg", "resource_type": "image", "type": "upload"}
+        with patch("cloudinary_cli.utils.api_utils.call_api", return_value=rename_result) as rename_mock, \
+                patch.object(sync_module, "call_api", return_value={"deleted": {"c": "deleted"}}):
+            sync_dir.push()
+
+        rename_mock.assert_called_once_with(uploader.rename, "a", "remote/new/b", resource_type="image",
+                                            type="upload", invalidate=True)
+
+    def test_renamed_files_are_moved_on_pull(self):
+        self._write_local("b.jpg", b"content")
+        self.remote_files["1"] = _remote_asset("1", "sub/a", b"content")
+
+        sync_dir = self._sync_dir(detect_renames=True)
+        with patch.object(sync_module, "download_file") as download_mock:
+            sync_dir.pull()
+
+        download_mock.assert_not_called()
+        self.assertFalse(os.path.exists(os.path.join(self.local_dir, "b.jpg")))
+        self.assertEqual(md5(b"content").hexdigest(), _md5_file(os.path.join(self.local_dir, "sub", "a.jpg")))
+
+    def test_renamed_files_are_uploaded_on_push_when_kept(self):
+        self._write_local("b.jpg", b"content")
+        self.remote_files["1"] = _remote_asset("1", "a", b"content")
+
+        sync_dir = self._sync_dir(force=False, detect_renames=True)
+        with patch.object(sync_module, "get_user_action", return_value=True), \
+                patch.object(sync_module, "upload_file") as upload_mock, \
+                patch.object(sync_module, "rename_asset") as rename_mock:
+            sync_dir.push()
+
+        rename_mock.assert_not_called()
+        upload_mock.assert_called_once()
+        self.assertEqual(os.path.join(os.path.abspath(self.local_dir), "b.jpg"), upload_mock.call_args[0][0])
+
+    def test_renamed_files_are_uploaded_on_push_with_upload_options(self):
+        self._write_local("b.jpg", b"content")
+        self.remote_files["1"] = _remote_asset("1", "a", b"content")
+
+        sync_dir = self._sync_dir(detect_renames=True, optional_parameter=(("tags", "renamed"),))
+        with patch.object(sync_module, "call_api", return_value={"deleted": {"a": "deleted"}}) as delete_mock, \
+                patch.object(sync_module, "upload_file") as upload_mock, \
+                patch.object(sync_module, "rename_asset") as rename_mock:
+            sync_dir.push()
+
+        rename_mock.assert_not_called()
+        upload_mock.assert_called_once()
+        self.assertEqual("renamed", upload_mock.call_args[0][1]["tags"])
+        delete_mock.assert_called_once_with(sync_module.api.delete_resources, ["a"], invalidate=True,
+                                            resource_type="image", type="upload")
+
+    def test_renamed_files_are_linked_on_pull_when_kept(self):
+        self._write_local("b.jpg", b"content")
+        self.remote_files["1"] = _remote_asset("1", "sub/a", b"content")
+
+        sync_dir = self._sync_dir(force=False, detect_renames=True)
+        with patch.object(sync_module, "get_user_action", return_value=True), \
+                patch.object(sync_module, "download_file") as download_mock:
+            sync_dir.pull()
+
+        download_mock.assert_not_called()
+        self.assertTrue(os.path.exists(os.path.join(self.local_dir, "b.jpg")))
+        self.assertEqual(md5(b"content").hexdigest(), _md5_file(os.path.join(self.local_dir, "sub", "a.jpg")))
+
+
+class TestExternalSyncDir(unittest.TestCase):
+    """ExternalSyncDir diff in the on-disk store, with the Cloudinary folder listing mocked."""
+
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local_dir, ignore_errors=True)
+        self.remote_files = []
+
+    def _write_local(self, name, content):
+        full_path = os.path.join(self.local_dir, name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(content)
+
+    def _add_remote(self, asset_id, public_id, content, **kwargs):
+        asset = dict(_remote_asset(asset_id, public_id, content), **kwargs)
+        self.remote_files.append(sync_module.RemoteFile(**{k: asset[k] for k in sync_module.RemoteFile.__slots__}))
+
+    def _sync_dir(self, **kwargs):
+        options = dict(include_hidden=False, concurrent_workers=1, force=True, keep_deleted=False,
+                       deletion_batch_size=100, folder_mode="fixed", status=None, optional_parameter=(),
+                       optional_parameter_parsed=(), dry_run=False)
+        options.update(kwargs)
+        with patch.object(sync_module, "cld_folder_exists", return_value=True), \
+                patch.object(sync_module, "iter_cld_folder", return_value=iter(self.remote_files)):
+            return sync_module.ExternalSyncDir(self.local_dir, "remote", **options)
+
+    def test_push_uploads_unique_and_out_of_sync_files(self):
+        self._write_local("same.jpg", b"same")
+        self._write_local("changed.jpg", b"local")
+        self._write_local("new.jpg", b"new")
+        self._add_remote("1", "same", b"same")
+        self._add_remote("2", "changed", b"remot")
+        self._add_remote("3", "deleted", b"deleted")
+        sync_dir = self._sync_dir()
+
+        with patch.object(sync_module, "upload_file") as upload_mock, \
+                patch.object(sync_module, "call_api", return_value={"deleted": {"deleted": "deleted"}}) as delete_mock:
+            sync_dir.push()
+
+        self.assertEqual({"changed.jpg", "new.jpg"},
+                         {os.path.basename(c.args[0]) for c in upload_mock.call_args_list})
+        delete_mock.assert_called_once_with(sync_module.api.delete_resources, ["deleted"], invalidate=True,
+                                            resource_type="image", type="upload")
+        self.assertEqual(1, sync_dir.synced_files_count)
+
+    def test_pull_downloads_files_and_updates_hash_cache(self):
+        self._write_local("same.jpg", b"same")
+        self._write_local("unique.jpg", b"unique")
+        self._add_remote("1", "same", b"same")
+        self._add_remote("2", "new", b"new")
+        sync_dir = self._sync_dir()
+
+        def download_mock(remote_file, local_path, downloaded, failed, on_success, threshold):
+            with open(local_path, "wb") as f:
+                f.write(b"new")
+            downloaded[remote_file["relative_path"]] = local_path
+            on_success(remote_file, local_path)
+
+        with patch.object(sync_module, "download_file", side_effect=download_mock) as download_mock_:
+            sync_dir.pull()
+
+        download_mock_.assert_called_once()
+        self.assertFalse(os.path.exists(os.path.join(self.local_dir, "unique.jpg")))
+        hash_cache = sync_module.read_hash_cache(os.path.join(self.local_dir, sync_module._SYNC_HASH_CACHE_FILE))
+        self.assertEqual({"same.jpg": md5(b"same").hexdigest(), "new.jpg": md5(b"new").hexdigest()},
+                         {f: entry[3] for f, entry in hash_cache.items()})
+
+    def test_duplicate_remote_names_are_matched_to_local_files_by_etag(self):
+        for i, content in enumerate([b"first", b"second", b"third"]):
+            self._add_remote(str(i), f"dup{i}", content, normalized_path="a.jpg", normalized_unique_path="a.jpg",
+                             created_at=f"2024-01-0{i + 1}T00:00:00Z")
+        self._write_local("a.jpg", b"second")
+        self._write_local("a (2).jpg", b"third")
+        sync_dir = self._sync_dir()
+
+        with patch.object(sync_module, "download_file") as download_mock:
+            sync_dir.pull()
+
+        self.assertEqual(["a (1).jpg"], [c.args[0]["normalized_unique_path"] for c in download_mock.call_args_list])
+        self.assertEqual(2, sync_dir.synced_files_count)
+
+
+class TestPipelinedSyncDir(unittest.TestCase):
+    """PipelinedSyncDir push, with the Cloudinary folder listing mocked."""
+
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local_dir, ignore_errors=True)
+
+    def _write_local(self, name, content):
+        full_path = os.path.join(self.local_dir, name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(content)
+
+    def test_subtrees_are_pushed_as_listed(self):
+        self._write_local("new/a.jpg", b"new")
+        self._write_local("old/b.jpg", b"changed")
+        self._write_local("old/c.jpg", b"same")
+        remote_files = {"1": _remote_asset("1", "old/b", b"before"), "2": _remote_asset("2", "old/c", b"same"),
+                        "3": _remote_asset("3", "old/d", b"deleted")}
+        uploaded = threading.Event()
+
+        def query_subtrees_mock(folder, folder_mode, subtree_names, status):
+            if "old" in subtree_names:
+                # the subtree that does not exist remotely is uploaded while the rest is still being listed
+                self.assertTrue(uploaded.wait(5))
+            return {asset_id: dt for asset_id, dt in remote_files.items()
+                    if dt["normalized_path"].split("/")[0] in subtree_names}
+
+        def upload_mock(file_path, options, uploaded_files, failed, on_success):
+            uploaded.set()
+
+        with patch.object(sync_module, "cld_folder_exists", return_value=True), \
+                patch.object(sync_module, "list_cld_subtree_names", return_value=["", "old"]), \
+                patch.object(sync_module, "query_cld_subtrees", side_effect=query_subtrees_mock), \
+                patch.object(sync_module, "upload_file", side_effect=upload_mock) as upload_file_mock, \
+                patch.object(sync_module, "call_api", return_value={"deleted": {"old/d": "deleted"}}) as delete_mock:
+            sync_dir = sync_module.PipelinedSyncDir(
+                self.local_dir, "remote", include_hidden=False, concurrent_workers=2, force=True,
+                keep_deleted=False, deletion_batch_size=100, folder_mode="fixed", status=None,
+                optional_parameter=(), optional_parameter_parsed=(), dry_run=False, listing_workers=2)
+            sync_dir.push()
+
+        self.assertEqual(["a.jpg", "b.jpg"], sorted(os.path.basename(c.args[0])
+                                                    for c in upload_file_mock.call_args_list))
+        delete_mock.assert_called_once_with(sync_module.api.delete_resources, ["old/d"], invalidate=True,
+                                            resource_type="image", type="upload")
+        self.assertEqual(1, sync_dir.synced_files_count)
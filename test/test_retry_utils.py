@@ -0,0 +1,153 @@
+import time
+import unittest
+from email.utils import formatdate
+from unittest.mock import patch, MagicMock
+
+import requests
+from cloudinary.exceptions import Error, GeneralError, RateLimited, BadRequest, NotFound
+
+from cloudinary_cli.utils import retry_utils
+from cloudinary_cli.utils.api_utils import call_api, DownloadError
+from cloudinary_cli.utils.retry_utils import RetryPolicy, transient_status_code, parse_retry_after, \
+    is_ambiguous_failure
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def setUp(self):
+        sleep_patcher = patch.object(retry_utils.time, "sleep")
+        self.sleep_mock = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def test_transient_error_is_retried(self):
+        func = MagicMock(side_effect=[GeneralError("Socket Error: connection reset"), "result"])
+
+        self.assertEqual("result", RetryPolicy().call(func, "arg", key="value"))
+        self.assertEqual(2, func.call_count)
+        func.assert_called_with("arg", key="value")
+
+    def test_gives_up_after_max_attempts(self):
+        func = MagicMock(side_effect=RateLimited("Error 420 - Rate Limit Exceeded"))
+
+        with self.assertRaises(RateLimited):
+            RetryPolicy(max_attempts=3).call(func)
+        self.assertEqual(3, func.call_count)
+
+    def test_permanent_error_is_not_retried(self):
+        func = MagicMock(side_effect=BadRequest("Error 400 - Invalid image file"))
+
+        with self.assertRaises(BadRequest):
+            RetryPolicy().call(func)
+        func.assert_called_once()
+
+    def test_backoff_is_exponential_with_jitter(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        for attempt, max_delay in ((1, 1), (2, 2), (3, 4), (4, 5), (10, 5)):
+            delays = [policy.backoff(attempt) for _ in range(20)]
+            self.assertTrue(all(0 <= delay <= max_delay for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_retry_after_is_honored(self):
+        func = MagicMock(side_effect=[DownloadError("status code: 503", 503, retry_after=7), "result"])
+
+        self.assertEqual("result", RetryPolicy(base_delay=1).call(func))
+        self.assertEqual(7, self.sleep_mock.call_args.args[0])
+
+    def test_long_retry_after_is_not_waited_for(self):
+        func = MagicMock(side_effect=DownloadError("status code: 429", 429, retry_after=3600))
+
+        with self.assertRaises(DownloadError):
+            RetryPolicy().call(func)
+        func.assert_called_once()
+
+    def test_non_idempotent_call_is_retried_on_clear_server_errors_only(self):
+        func = MagicMock(side_effect=[RateLimited("Error 429 - Too Many Requests"),
+                                      GeneralError("Error 503 - Service Unavailable"), "result"])
+        self.assertEqual("result", RetryPolicy().call_non_idempotent(func))
+
+        for error in (Error("Unexpected error - ProtocolError('Connection aborted.')"), GeneralError("boom")):
+            func = MagicMock(side_effect=[error, "result"])
+            with self.assertRaises(type(error)):
+                RetryPolicy().call_non_idempotent(func)
+            func.assert_called_once()
+
+    def test_retry_budget(self):
+        policy = RetryPolicy(max_attempts=2, budget_ratio=0.25, min_budget=1)
+        failing = MagicMock(side_effect=GeneralError("Error 503 - Service Unavailable"))
+
+        for _ in range(3):
+            policy.call(lambda: None)
+        for _ in range(4):
+            with self.assertRaises(GeneralError):
+                policy.call(failing)
+
+        # 1 retry always allowed, and a quarter of the calls: the last failure is not retried
+        self.assertEqual(4 + 3, failing.call_count)
+
+
+class TransientErrorTest(unittest.TestCase):
+    def test_transient_status_code(self):
+        self.assertEqual(429, transient_status_code(RateLimited("Error 429 - Too Many Requests")))
+        self.assertEqual(500, transient_status_code(GeneralError("Error 500 - Internal Server Error")))
+        self.assertEqual(502, transient_status_code(Error("Error parsing server response (502) - b'<html>'")))
+        self.assertEqual(0, transient_status_code(Error("Unexpected error - ProtocolError('Connection aborted.')")))
+        self.assertEqual(0, transient_status_code(requests.ConnectionError("connection reset")))
+        self.assertEqual(0, transient_status_code(requests.ReadTimeout("read timeout")))
+        self.assertEqual(503, transient_status_code(DownloadError("status code: 503", 503)))
+
+    def test_permanent_errors(self):
+        self.assertIsNone(transient_status_code(NotFound("Error 404 - Resource not found")))
+        self.assertIsNone(transient_status_code(Error("Invalid image file")))
+        self.assertIsNone(transient_status_code(DownloadError("status code: 404", 404)))
+        self.assertIsNone(transient_status_code(DownloadError("Checksum mismatch")))
+        self.assertIsNone(transient_status_code(ValueError("invalid")))
+
+    def test_ambiguous_failures(self):
+        self.assertTrue(is_ambiguous_failure(Error("Socket error: connection reset")))
+        self.assertTrue(is_ambiguous_failure(requests.ReadTimeout("read timeout")))
+        self.assertTrue(is_ambiguous_failure(GeneralError("Internal error")))
+        self.assertFalse(is_ambiguous_failure(GeneralError("Error 500 - Internal Server Error")))
+        self.assertFalse(is_ambiguous_failure(RateLimited("Error 429 - Too Many Requests")))
+        self.assertFalse(is_ambiguous_failure(DownloadError("status code: 503", 503)))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(120, parse_retry_after("120"))
+        self.assertAlmostEqual(60, parse_retry_after(formatdate(time.time() + 60, usegmt=True)), delta=2)
+        self.assertEqual(0, parse_retry_after(formatdate(time.time() - 60, usegmt=True)))
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class CallApiRetryTest(unittest.TestCase):
+    def test_call_api_retries_transient_errors(self):
+        func = MagicMock(__name__="resources", side_effect=[GeneralError("Error 503 - Service Unavailable"),
+                                                            {"resources": []}])
+
+        self.assertEqual({"resources": []}, call_api(func, type="upload"))
+        self.assertEqual(2, func.call_count)
+
+    def test_call_api_retries_ambiguous_failures_of_idempotent_calls_only(self):
+        connection_error = Error("Unexpected error - ProtocolError('Connection aborted.')")
+        for name, kwargs, idempotent in (("resources", {}, True),
+                                         ("delete_resources", {}, True),
+                                         ("execute", {}, True),
+                                         ("create_upload_preset", {}, False),
+                                         ("rename", {}, False),
+                                         ("upload", {}, False),
+                                         ("upload", {"public_id": "sample", "overwrite": False}, False),
+                                         ("upload", {"public_id": "sample"}, True),
+                                         ("upload", {"use_filename": True, "unique_filename": "false"}, True)):
+            with self.subTest(name=name, kwargs=kwargs):
+                func = MagicMock(__name__=name, side_effect=[connection_error, "result"])
+                if idempotent:
+                    self.assertEqual("result", call_api(func, **kwargs))
+                else:
+                    with self.assertRaises(Error):
+                        call_api(func, **kwargs)
+                self.assertEqual(2 if idempotent else 1, func.call_count)
+
+    def test_call_api_does_not_retry_non_retryable_methods(self):
+        func = MagicMock(__name__="create_agent_account", side_effect=GeneralError("Error 500 - boom"))
+
+        with self.assertRaises(GeneralError):
+            call_api(func, "you@example.com")
+        func.assert_called_once()
@@ -1,9 +1,13 @@
 import builtins
+import hashlib
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
 from cloudinary_cli.utils.utils import parse_option_value, parse_args_kwargs, whitelist_keys, merge_responses, \
-    normalize_list_params, chunker, group_params, confirm_action, get_user_action, prompt_user, is_interactive
+    normalize_list_params, chunker, group_params, confirm_action, get_user_action, prompt_user, is_interactive, etag, \
+    Record, iter_tasks_concurrently, run_tasks_concurrently
 
 
 class NonInteractiveInputTest(unittest.TestCase):
@@ -189,6 +193,33 @@ class UtilsTest(unittest.TestCase):
         groups = [group for group in chunker(animals, 3)]
         self.assertListEqual([['cat', 'dog', 'rabbit'], ['duck', 'bird', 'cow'], ['gnu', 'fish']], groups)
 
+    def test_iter_tasks_concurrently(self):
+        results = iter_tasks_concurrently(lambda x: x * x, ((i,) for i in range(5)), 2)
+        self.assertCountEqual([0, 1, 4, 9, 16], list(results))
+
+    def test_iter_tasks_concurrently_reads_tasks_lazily(self):
+        produced = []
+
+        def tasks():
+            for i in range(100):
+                produced.append(i)
+                yield (i,)
+
+        results = iter_tasks_concurrently(lambda x: x, tasks(), 2, max_pending=3)
+        next(results)
+        self.assertLessEqual(len(produced), 4)
+
+        self.assertCountEqual(range(100), [0] + list(results))
+        self.assertEqual(100, len(produced))
+
+    def test_run_tasks_concurrently_raises_task_error(self):
+        def task(x):
+            if x == 3:
+                raise ValueError("task failed")
+
+        with self.assertRaises(ValueError):
+            run_tasks_concurrently(task, ((i,) for i in range(10)), 2)
+
 
 def _no_args_test_func():
     pass
@@ -198,6 +229,60 @@ def _only_args_test_func(arg1, arg2):
     return arg1, arg2
 
 
+class _Point(Record):
+    __slots__ = ("x", "y")
+
+
+class RecordTest(unittest.TestCase):
+    def test_dict_like_access(self):
+        point = _Point(x=1)
+
+        self.assertEqual(1, point["x"])
+        self.assertIsNone(point["y"])
+        self.assertIsNone(point.get("z"))
+        self.assertTrue("y" in point)
+        self.assertFalse("z" in point)
+        with self.assertRaises(KeyError):
+            _ = point["z"]
+
+        point["y"] = 2
+        self.assertEqual({"x": 1, "y": 2}, dict(point))
+        self.assertEqual({"x": 1, "y": 2}, point.to_dict())
+        self.assertEqual(_Point(x=1, y=2), point)
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            _Point().z = 1
+
+
+class EtagTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        self.content = os.urandom(3 * 1024 * 1024 + 17)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.content)
+        self.addCleanup(os.remove, self.path)
+        self.expected = hashlib.md5(self.content).hexdigest()
+
+    def test_etag_buffered(self):
+        self.assertEqual(self.expected, etag(self.path))
+
+    def test_etag_small_blocks(self):
+        with patch("cloudinary_cli.utils.utils.LARGE_BLOCK_SIZE", 10 * 1024 * 1024):
+            self.assertEqual(self.expected, etag(self.path))
+
+    def test_etag_mmap(self):
+        with patch("cloudinary_cli.utils.utils.MMAP_THRESHOLD", 1024):
+            self.assertEqual(self.expected, etag(self.path))
+
+    def test_etag_empty_file(self):
+        fd, empty_path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, empty_path)
+        with patch("cloudinary_cli.utils.utils.MMAP_THRESHOLD", 0):
+            self.assertEqual(hashlib.md5().hexdigest(), etag(empty_path))
+
+
 def _args_kwargs_test_func(arg1, arg2=None):
     return arg1, arg2
 
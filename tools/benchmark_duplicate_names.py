@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmarks resolving duplicate remote file names (SyncDir._normalize_remote_file_names) against many local files.
+
+Generates a synthetic sync folder in memory: local files and remote files of the same names, where some of the names
+are shared by several remote files (duplicate groups), which are synced to local files with a ' (N)' index. Every
+few duplicates, one has changed, so it is not matched to a local file by etag and gets a new index. The etags are
+precomputed, so only the name resolution is measured, no files are hashed.
+
+Run it on two revisions of the tree to compare them, the workload is the same for the same arguments.
+
+Usage: python tools/benchmark_duplicate_names.py [--files 100000] [--groups 500] [--duplicates 4] [--changed 4]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from hashlib import md5
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cloudinary_cli.modules.sync import SyncDir  # noqa: E402
+from cloudinary_cli.utils.file_utils import populate_duplicate_name  # noqa: E402
+
+
+def remote_file(asset_id, name, etag, index):
+    return {
+        "asset_id": asset_id,
+        "normalized_path": name,
+        "normalized_unique_path": name,
+        "etag": etag,
+        "created_at": f"2024-01-01T00:00:{index:02d}Z",
+    }
+
+
+def generate(files, groups, duplicates, changed):
+    local_files = {}
+    remote_files = {}
+    rand = random.Random(0)
+    duplicate_names = set(rand.sample(range(files), groups))
+    asset_id = 0
+    for i in range(files):
+        name = f"folder{i % 100}/image{i}.jpg"
+        copies = duplicates if i in duplicate_names else 1
+        for index in range(copies):
+            asset_id += 1
+            etag = md5(f"{name}-{index}".encode()).hexdigest()
+            local_files[populate_duplicate_name(name, index)] = {"path": name, "size": 0, "etag": etag}
+            if copies > 1 and changed and asset_id % changed == 0:
+                # The remote file changed since it was synced.
+                etag = md5(f"{name}-{index}-changed".encode()).hexdigest()
+            remote_files[str(asset_id)] = remote_file(str(asset_id), name, etag, index)
+
+    return local_files, remote_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100000, help="Number of file names.")
+    parser.add_argument("--groups", type=int, default=500, help="Number of duplicate names.")
+    parser.add_argument("--duplicates", type=int, default=4, help="Number of remote files per duplicate name.")
+    parser.add_argument("--changed", type=int, default=4, help="Every Nth remote file has changed, 0 for none.")
+    args = parser.parse_args()
+
+    local_files, remote_files = generate(args.files, args.groups, args.duplicates, args.changed)
+    sync_dir = SyncDir.__new__(SyncDir)
+    sync_dir.local_files = local_files
+    sync_dir.hash_cache = None
+    sync_dir.hash_workers = 1
+
+    print(f"{len(local_files)} local files, {len(remote_files)} remote files, {args.groups} duplicate names "
+          f"of {args.duplicates} remote files each")
+    started_at = time.perf_counter()
+    resolved = sync_dir._normalize_remote_file_names(remote_files, local_files)
+    elapsed = time.perf_counter() - started_at
+    matched = sum(1 for name, dt in resolved.items() if local_files.get(name, {}).get("etag") == dt["etag"])
+    print(f"resolved in {elapsed:.2f}s, {matched} of {len(resolved)} remote files match their local files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmarks hashing local files with hash_files, the way sync compares files, using 1 to N hash workers.
+
+Generates two workloads in a temporary folder, many small files and fewer large files, and reports the time and the
+throughput of hashing each of them with every number of hash workers. With --cold, the files are evicted from the
+page cache (posix_fadvise) before each run, so the files are read from the disk, like on the first sync; otherwise
+they are hashed from the page cache, where only the hashing itself is measured.
+
+Usage: python tools/benchmark_hashing.py [--small-files 100000] [--small-size 4] [--large-files 1000]
+                                         [--large-size 1024] [--workers 8] [--cold]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cloudinary_cli.utils.file_utils import hash_files  # noqa: E402
+
+
+def write_files(directory, count, size):
+    os.makedirs(directory)
+    file_paths = []
+    for i in range(count):
+        # Files are spread over subfolders, like a real sync folder.
+        sub_directory = os.path.join(directory, str(i // 1000))
+        os.makedirs(sub_directory, exist_ok=True)
+        file_path = os.path.join(sub_directory, f"{i}.bin")
+        with open(file_path, "wb") as f:
+            f.write(os.urandom(size))
+        file_paths.append(file_path)
+    return file_paths
+
+
+def evict(file_paths):
+    for file_path in file_paths:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def run(name, file_paths, size, workers, cold):
+    if cold:
+        evict(file_paths)
+    started_at = time.perf_counter()
+    hash_files(file_paths, workers)
+    elapsed = time.perf_counter() - started_at
+    print(f"{name:<14}{workers:>8}{elapsed:>10.2f}s{len(file_paths) / elapsed:>12.0f}/s"
+          f"{len(file_paths) * size / elapsed / 2 ** 20:>10.1f}MB/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--small-files", type=int, default=100000)
+    parser.add_argument("--small-size", type=int, default=4, help="Size of the small files in KB.")
+    parser.add_argument("--large-files", type=int, default=1000)
+    parser.add_argument("--large-size", type=int, default=1024, help="Size of the large files in KB.")
+    parser.add_argument("--workers", type=int, default=8, help="Maximal number of hash workers.")
+    parser.add_argument("--cold", action="store_true", help="Evict the files from the page cache before each run.")
+    args = parser.parse_args()
+    workloads = [("small files", args.small_files, args.small_size * 1024),
+                 ("large files", args.large_files, args.large_size * 1024)]
+    worker_counts = sorted({1, *range(2, args.workers + 1, 2), args.workers})
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.small_files} files of {args.small_size} KB, {args.large_files} files of {args.large_size} KB, "
+              f"{os.cpu_count()} CPUs, {'cold' if args.cold else 'warm'} page cache")
+        print(f"{'':<14}{'workers':>8}{'time':>11}{'rate':>14}{'throughput':>12}")
+
+        for name, count, size in workloads:
+            file_paths = write_files(os.path.join(directory, name.replace(" ", "_")), count, size)
+            baseline = None
+            for workers in worker_counts:
+                elapsed = run(name, file_paths, size, workers, args.cold)
+                baseline = baseline or elapsed
+            print(f"{name:<14}speedup of {worker_counts[-1]} workers: {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the SDK connection pool sized by configure_sdk_pool against the default SDK pool.
+
+Runs concurrent Admin API calls (ping) against a local HTTPS stand-in server, which answers after a simulated
+latency, and reports the time, the number of connections (TCP and TLS handshakes) the server accepted and the number
+of connections discarded by a full pool. Like the tasks of the bulk commands (reading a file, saving the results),
+each task does some local work besides its request, so the workers do not release their connections in lockstep.
+
+Requires openssl for generating a self-signed certificate.
+
+Usage: python tools/benchmark_sdk_pool.py [--requests 2000] [--workers 30] [--latency 20] [--local-work 5]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cloudinary  # noqa: E402
+from cloudinary import api  # noqa: E402
+from cloudinary.api_client import call_api as api_client  # noqa: E402
+from cloudinary.utils import get_http_connector  # noqa: E402
+
+from cloudinary_cli.utils.http_utils import configure_sdk_pool  # noqa: E402
+from cloudinary_cli.utils.utils import run_tasks_concurrently  # noqa: E402
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = 0
+    latency = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+
+    def do_GET(self):
+        time.sleep(StandInHandler.latency)
+        body = json.dumps({"status": "ok"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DiscardedConnections(logging.Handler):
+    count = 0
+
+    def emit(self, record):
+        if "pool is full" in record.getMessage():
+            DiscardedConnections.count += 1
+
+
+def self_signed_certificate(directory):
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key_path, "-out", cert_path],
+                   check=True, capture_output=True)
+    return cert_path, key_path
+
+
+def start_server(cert_path, key_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def task(local_work):
+    time.sleep(random.uniform(0, local_work))
+    api.ping()
+
+
+def run(name, requests, workers, local_work):
+    StandInHandler.connections = DiscardedConnections.count = 0
+    started_at = time.perf_counter()
+    run_tasks_concurrently(task, [(local_work,)] * requests, workers)
+    elapsed = time.perf_counter() - started_at
+    print(f"{name:<22}{elapsed:>8.2f}s{requests / elapsed:>10.0f}/s{StandInHandler.connections:>13}"
+          f"{DiscardedConnections.count:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=30)
+    parser.add_argument("--latency", type=int, default=20, help="Server latency in milliseconds.")
+    parser.add_argument("--local-work", type=int, default=5, help="Maximal local work per task in milliseconds.")
+    args = parser.parse_args()
+    local_work = args.local_work / 1000
+    StandInHandler.latency = args.latency / 1000
+
+    urllib3_logger = logging.getLogger("urllib3.connectionpool")
+    urllib3_logger.addHandler(DiscardedConnections())
+    urllib3_logger.propagate = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = self_signed_certificate(directory)
+        server = start_server(cert_path, key_path)
+
+        cloudinary.reset_config()
+        cloudinary.config(cloud_name="benchmark", api_key="key", api_secret="secret",
+                          upload_prefix=f"https://127.0.0.1:{server.server_port}")
+        cloudinary.CERT_KWARGS = {"cert_reqs": "CERT_REQUIRED", "ca_certs": cert_path}
+
+        print(f"{args.requests} requests, {args.workers} workers, {args.latency} ms server latency, "
+              f"up to {args.local_work} ms local work per task")
+        print(f"{'':<22}{'time':>9}{'rate':>12}{'connections':>13}{'discarded':>11}")
+
+        # The connector the SDK creates by default.
+        api_client._http = get_http_connector(cloudinary.config(), cloudinary.CERT_KWARGS)
+        run("default SDK pool", args.requests, args.workers, local_work)
+
+        configure_sdk_pool(args.workers)
+        run("configure_sdk_pool", args.requests, args.workers, local_work)
+
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()